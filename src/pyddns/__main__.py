@@ -0,0 +1,354 @@
+"""
+Command Line Interface
+
+Runs a reconciliation cycle for every service configured in py_ddns.ini.
+
+    python -m pyddns [--config py_ddns.ini] [--dry-run] [--interval SECONDS]
+    python -m pyddns --seed
+    python -m pyddns --export-snapshot FILE | --import-snapshot FILE
+    python -m pyddns --profile N [--profile-dir DIR]
+    python -m pyddns --interval SECONDS --status-listen [HOST:]PORT
+"""
+
+import argparse
+from contextlib import nullcontext
+from dataclasses import replace
+import logging
+import time
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+
+from pyddns.client import DDNSClient
+from pyddns.config import Config, ConfigSnapshot
+from pyddns.damping import FlapDamper
+from pyddns.deadline import Deadline
+from pyddns.propagation import PropagationTracker
+from pyddns.reconcile import Reconciler
+from pyddns.scheduler import CheckScheduler
+from pyddns.status import StatusBoard, StatusServer, parse_listen
+from pyddns.tracing import LogExporter, Profiler, set_fallback_exporter
+from pyddns.storage import Storage
+from pyddns.services.cloudflare_service import CloudflareDNS
+from pyddns.services.duckdns_service import DuckDNS
+from pyddns.watcher import ConfigWatcher
+
+
+def build_clients(config: Config) -> List[DDNSClient]:
+    """Instantiates a client for every service section in the config."""
+
+    clients: List[DDNSClient] = []
+    if config.has_section("Cloudflare"):
+        clients.append(CloudflareDNS())
+    if config.has_section("Duckdns"):
+        clients.append(DuckDNS())
+    return clients
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parses command line arguments."""
+
+    parser = argparse.ArgumentParser(
+        prog="pyddns",
+        description="Keeps DNS records in sync with the current public IP.",
+    )
+    parser.add_argument(
+        "--config",
+        default="py_ddns.ini",
+        help="Path to the configuration file (default: py_ddns.ini).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the planned changes without applying them.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Keep running and reconcile every SECONDS seconds.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Write cProfile and tracemalloc snapshots of the first N "
+        "cycles, and trace them if no trace_exporter is configured.",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="pyddns-profile",
+        metavar="DIR",
+        help="Directory for --profile output (default: pyddns-profile).",
+    )
+    status = parser.add_mutually_exclusive_group()
+    status.add_argument(
+        "--status-listen",
+        metavar="[HOST:]PORT",
+        help="With --interval, serve /health and /status as JSON on "
+        "HOST:PORT (default host 127.0.0.1).",
+    )
+    status.add_argument(
+        "--status-socket",
+        metavar="PATH",
+        help="With --interval, serve /health and /status on a Unix socket.",
+    )
+    state = parser.add_mutually_exclusive_group()
+    state.add_argument(
+        "--seed",
+        action="store_true",
+        help="Import all A records of the zone and the configured DuckDNS "
+        "domains into the database, then exit.",
+    )
+    state.add_argument(
+        "--export-snapshot",
+        metavar="FILE",
+        help="Write the database records to FILE as JSON lines, then exit.",
+    )
+    state.add_argument(
+        "--import-snapshot",
+        metavar="FILE",
+        help="Load records from a JSON lines FILE, then exit.",
+    )
+    args = parser.parse_args(argv)
+
+    # Fail loudly instead of running a service without its endpoint.
+    if (args.status_listen or args.status_socket) and not args.interval:
+        parser.error("--status-listen and --status-socket need --interval.")
+    if args.dry_run and args.interval:
+        parser.error("--dry-run runs a single cycle, drop --interval.")
+    return args
+
+
+def run_cycle(
+    reconciler: Reconciler,
+    scheduler: CheckScheduler,
+    board: Optional[StatusBoard] = None,
+) -> None:
+    """
+    Reconciles the records that are due. If none are, only checks the public
+    IP, polls records that are still propagating and replays changes left in
+    the outbox by a failed cycle.
+
+    The outcome is published to board, if given.
+    """
+
+    scheduler.sync(
+        {c.service_name: c.record_names() for c in reconciler.clients}
+    )
+    due = scheduler.pop_due()
+    started = time.monotonic()
+    try:
+        if due:
+            cycle = replace(
+                reconciler,
+                clients=[
+                    c for c in reconciler.clients if c.service_name in due
+                ],
+                record_names=due,
+            )
+            plan = cycle.run()
+            scheduler.reschedule(due, plan)
+            if board is not None:
+                board.record_cycle(plan, time.monotonic() - started)
+        else:
+            deadline = Deadline(reconciler.budget)
+            if reconciler.propagation is not None:
+                reconciler.propagation.poll(deadline)
+            ip_address = reconciler.clients[0].get_ipv4(deadline)
+            if not scheduler.observe_ip(ip_address):
+                reconciler.replay(deadline)
+            if board is not None:
+                board.record_ip(ip_address, time.monotonic() - started)
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        logging.error("Reconciliation cycle failed: %s", err)
+        scheduler.reschedule(due)
+        if board is not None:
+            board.record_error(err)
+
+
+def run_forever(
+    reconciler: Reconciler,
+    scheduler: CheckScheduler,
+    interval: float,
+    profiler: Optional[Profiler] = None,
+    board: Optional[StatusBoard] = None,
+) -> None:
+    """
+    Runs cycles until interrupted.
+
+    The public IP is checked every interval seconds. Records are only
+    reconciled when the scheduler reports them due, or when the public IP
+    moved.
+    """
+
+    logging.info("Checking the public IP every %.0fs.", interval)
+    while True:
+        with profiler.cycle() if profiler else nullcontext():
+            run_cycle(reconciler, scheduler, board)
+
+        delay = interval
+        next_due = scheduler.next_due()
+        if next_due is not None:
+            delay = min(interval, max(0.0, next_due - scheduler.clock()))
+        time.sleep(delay)
+
+
+def health_max_age(interval: float, budget: Optional[float]) -> float:
+    """
+    Returns the seconds without a finished cycle after which /health
+    reports the daemon as stale: one interval, a cycle using its whole
+    budget, and another interval as margin.
+    """
+
+    return 2 * interval + (budget or 0)
+
+
+def scheduler_bounds(
+    snapshot: ConfigSnapshot, interval: float
+) -> Tuple[float, float]:
+    """
+    Returns the (min, max) check interval. check_min_interval defaults to
+    the --interval value.
+    """
+
+    cycle = snapshot.client.cycle
+    minimum = cycle.check_min_interval or interval
+    return minimum, max(minimum, cycle.check_max_interval)
+
+
+def serve(
+    args: argparse.Namespace,
+    config: Config,
+    reconciler: Reconciler,
+    profiler: Optional[Profiler] = None,
+) -> int:
+    """
+    Runs cycles every --interval seconds until interrupted. Config changes
+    are applied as they are made, and the status endpoints are served if
+    asked to.
+    """
+
+    # The damper keeps its samples in memory, a one-shot run could never
+    # see the IP stable and would hold every change.
+    damper = FlapDamper.from_config(config, Storage())
+    reconciler.damper = damper
+    reconciler.propagation = PropagationTracker()
+    scheduler = CheckScheduler(Storage(), damper=damper)
+    scheduler.min_interval, scheduler.max_interval = scheduler_bounds(
+        config.snapshot, args.interval
+    )
+
+    def on_config_change(
+        snapshot: ConfigSnapshot, changed: FrozenSet[str]
+    ) -> None:
+        if "Client_settings" in changed:
+            damper.configure(snapshot.client.damping)
+            reconciler.budget = snapshot.client.cycle.budget or None
+            scheduler.min_interval, scheduler.max_interval = (
+                scheduler_bounds(snapshot, args.interval)
+            )
+            if board is not None:
+                board.max_age = health_max_age(
+                    args.interval, reconciler.budget
+                )
+
+    board: Optional[StatusBoard] = None
+    server: Optional[StatusServer] = None
+    if args.status_listen or args.status_socket:
+        board = StatusBoard(
+            max_age=health_max_age(args.interval, reconciler.budget)
+        )
+        server = StatusServer(
+            board,
+            address=(
+                parse_listen(args.status_listen)
+                if args.status_listen
+                else None
+            ),
+            socket_path=args.status_socket,
+        ).start()
+
+    config.subscribe(on_config_change)
+    watcher = ConfigWatcher(config).start()
+    try:
+        run_forever(reconciler, scheduler, args.interval, profiler, board)
+    except KeyboardInterrupt:
+        logging.info("Interrupted, shutting down.")
+    finally:
+        watcher.stop()
+        if server is not None:
+            server.stop()
+    return 0
+
+
+def run_once(
+    reconciler: Reconciler,
+    dry_run: bool = False,
+    profiler: Optional[Profiler] = None,
+) -> None:
+    """
+    Runs a single cycle, or the --profile cycles, and prints the plan of a
+    dry run.
+    """
+
+    if profiler is None:
+        plan = reconciler.run(dry_run=dry_run)
+    else:
+        # Profile N consecutive cycles, the first one runs cold.
+        while profiler.active:
+            with profiler.cycle():
+                plan = reconciler.run(dry_run=dry_run)
+
+    if dry_run:
+        print(plan.render())
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the pyddns command."""
+
+    args = parse_args(argv)
+    config = Config(config_file=args.config)
+    Storage(
+        filename=config.snapshot.client.storage.database,
+        backend=config.snapshot.client.storage.backend,
+    )
+
+    if args.export_snapshot:
+        Storage().export_snapshot(args.export_snapshot)
+        return 0
+
+    if args.import_snapshot:
+        Storage().import_snapshot(args.import_snapshot)
+        return 0
+
+    clients = build_clients(config)
+
+    if not clients:
+        logging.error("No services configured in %s.", args.config)
+        return 1
+
+    if args.seed:
+        for client in clients:
+            client.seed()
+        return 0
+
+    reconciler = Reconciler(
+        clients, budget=config.snapshot.client.cycle.budget or None
+    )
+
+    profiler: Optional[Profiler] = None
+    if args.profile > 0:
+        profiler = Profiler(args.profile, args.profile_dir)
+        # Stays installed across reloads unless an exporter is configured.
+        set_fallback_exporter(LogExporter)
+
+    if args.interval:
+        return serve(args, config, reconciler, profiler)
+
+    run_once(reconciler, args.dry_run, profiler)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -8,10 +8,33 @@ for obtaining the current public IP address and updating DNS records.
 """
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 import logging
+import threading
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple, Type
 
 import requests
 
+from pyddns.deadline import Deadline
+from pyddns.discovery import SOURCES, DiscoveryChain, shared_chain
+from pyddns.events import emit
+from pyddns.storage import Storage
+from pyddns.tracing import traced
+
+if TYPE_CHECKING:
+    from pyddns.reconcile import RecordChange, RecordState
+
+
+@dataclass
+class _LastAddress:
+    """The public IPv4 address most recently seen by any client."""
+
+    ipv4: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_last_address = _LastAddress()
+
 
 class DDNSClient(ABC):
     """
@@ -22,26 +45,133 @@ class DDNSClient(ABC):
 
     Methods:
         INHERITED: get_ip() -> str: Retrieves the current public IP address.
-        ABSTRACT: update_dns(ip_address: str, record_name: str) -> None"
+        ABSTRACT: update_dns(ip_address: str, record_name: str,
+            deadline: Optional[Deadline] = None) -> None"
+
+    Clients taking part in reconciliation also implement record_names,
+    fetch_state and apply_changes. Clients that set auto_create receive
+    "create" changes for records missing at the provider. api_errors lists
+    the exceptions of a failed provider call, which keep the changes in the
+    outbox.
     """
 
-    def get_ipv4(self) -> str:
-        """Obtains current IPv4 adress and returns as a str."""
+    service_name: str = "DDNSClient"
+    auto_create: bool = False
+    api_errors: Tuple[Type[Exception], ...] = (
+        requests.RequestException,
+        OSError,
+    )
+    storage: Storage
+
+    def ip_discovery(self) -> DiscoveryChain:
+        """
+        Returns the discovery chain named by the ip_sources option, or the
+        default chain for clients without a config.
+        """
+        config = getattr(self, "config", None)
+        if config is None:
+            return shared_chain(SOURCES)
+        return shared_chain(config.snapshot.client.ip_sources)
+
+    @traced("get_ipv4")
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        """
+        Obtains current IPv4 adress and returns as a str.
+
+        Local sources (interfaces, NAT-PMP, UPnP IGD) are tried before the
+        HTTP echo service, see pyddns.discovery. An "ip_changed" event is
+        emitted when the address differs from the previous lookup.
+        """
 
         logging.debug("Attempting to retrieve current public IP address.")
         try:
-            response = requests.get("https://api.ipify.org", timeout=10)
-            response.raise_for_status()
+            ip_address = self.ip_discovery().get_ipv4(deadline)
 
-            logging.info("Current IPv4 is %s", response.text)
-            return response.text
+            logging.info("Current IPv4 is %s", ip_address)
+            self._observe_ipv4(ip_address)
+            return ip_address
 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, OSError) as e:
             logging.error("Error getting IP: %s", e)
             raise
 
+    def _observe_ipv4(self, ip_address: str) -> None:
+        with _last_address.lock:
+            previous, _last_address.ipv4 = _last_address.ipv4, ip_address
+        if previous is not None and previous != ip_address:
+            emit(
+                "ip_changed",
+                self.service_name,
+                old_ip=previous,
+                new_ip=ip_address,
+            )
+
     @abstractmethod
-    def update_dns(self, ip_address: str, record_name: str) -> None:
+    def update_dns(
+        self,
+        ip_address: str,
+        record_name: str,
+        deadline: Optional[Deadline] = None,
+    ) -> None:
         """
         Abstract Method to force all clients to have an update_dns method.
         """
+
+    def record_names(self) -> Tuple[str, ...]:
+        """
+        Returns the record names configured for this client.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support reconciliation."
+        )
+
+    def dns_name(self, record_name: str) -> str:
+        """
+        Returns the hostname resolvers answer for record_name.
+        """
+        return record_name
+
+    def fetch_state(
+        self,
+        record_names: Iterable[str],
+        deadline: Optional[Deadline] = None,
+        dry_run: bool = False,
+    ) -> Tuple["RecordState", ...]:
+        """
+        Returns the database and provider state of the given records.
+
+        Records that cannot be looked up before the deadline are returned
+        as DeferredState instances. With dry_run set, nothing is written to
+        storage.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support reconciliation."
+        )
+
+    def apply_changes(
+        self,
+        changes: Iterable["RecordChange"],
+        deadline: Optional[Deadline] = None,
+    ) -> None:
+        """
+        Applies a set of planned changes with as few API calls as possible.
+
+        Raises:
+            DeadlineExceeded: If the changes could not be sent in time.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support reconciliation."
+        )
+
+    def seed(
+        self,
+        record_names: Optional[Iterable[str]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> int:
+        """
+        Imports provider state into the database in one bulk transaction.
+        Returns the number of records imported.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support seeding."
+        )
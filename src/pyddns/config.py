@@ -8,12 +8,289 @@ the application, promoting efficient resource management and consistent access
 to configuration settings and data storage.
 """
 
-from configparser import ConfigParser
+from configparser import ConfigParser, Error as ConfigParserError
+from dataclasses import dataclass, field
 import logging
 import os
+import threading
+from types import MappingProxyType
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+import weakref
 
+from pyddns.discovery import SOURCES
+from pyddns.events import (
+    POLICIES,
+    EventSettings,
+    SubscriptionOptions,
+    configure_events,
+)
+from pyddns.logger import INTERVALS, ROTATIONS, LogSettings, start_logging
+from pyddns.storage import BACKENDS
+from pyddns.tracing import EXPORTERS, configure_tracing
 
-from typing import Optional
+# Required options and record option of every supported provider section.
+PROVIDERS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "Cloudflare": (("api_token", "zone_id"), "record_name"),
+    "Duckdns": (("token",), "domains"),
+}
+
+T = TypeVar("T")
+
+
+def split_list(value: str) -> Tuple[str, ...]:
+    """Splits a comma separated option into a tuple of stripped values."""
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+def parse_bool(value: str) -> bool:
+    """Parses a boolean option the same way ConfigParser.getboolean does."""
+    return ConfigParser.BOOLEAN_STATES[value.lower().strip()]
+
+
+def _parse(
+    section: str, option: str, value: str, parser: Callable[[str], T]
+) -> T:
+    try:
+        return parser(value)
+    except (KeyError, ValueError) as err:
+        raise ValueError(
+            f"Invalid value for '{option}' in section '{section}': {value!r}"
+        ) from err
+
+
+def _ip_sources(value: str) -> Tuple[str, ...]:
+    sources = split_list(value.lower())
+    if not sources or not set(sources) <= set(SOURCES):
+        raise ValueError(value)
+    return sources
+
+
+def _log_rotation(value: str) -> str:
+    rotation = value.lower().strip()
+    if rotation not in ROTATIONS:
+        raise ValueError(value)
+    return rotation
+
+
+def _log_when(value: str) -> str:
+    when = value.lower().strip()
+    if when not in INTERVALS:
+        raise ValueError(value)
+    return when
+
+
+def _storage_backend(value: str) -> str:
+    backend = value.lower().strip()
+    if backend not in BACKENDS:
+        raise ValueError(value)
+    return backend
+
+
+def _event_policy(value: str) -> str:
+    policy = value.lower().strip()
+    if policy not in POLICIES:
+        raise ValueError(value)
+    return policy
+
+
+def _trace_exporter(value: str) -> str:
+    exporter = value.lower().strip()
+    if exporter not in EXPORTERS:
+        raise ValueError(value)
+    return exporter
+
+
+@dataclass(frozen=True)
+class ProviderSettings:
+    """Validated settings of a single provider section."""
+
+    name: str
+    options: Mapping[str, str]
+    records: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class DampingSettings:
+    """Flap damping and coalescing options of [Client_settings]."""
+
+    stable_seconds: float = 0.0
+    stable_samples: int = 1
+    coalesce_window: float = 0.0
+
+
+@dataclass(frozen=True)
+class CycleSettings:
+    """Cycle budget and check interval options of [Client_settings]."""
+
+    budget: float = 60.0
+    check_min_interval: float = 0.0
+    check_max_interval: float = 3600.0
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    """Storage backend options of [Client_settings]."""
+
+    backend: str = "file"
+    database: str = "py_ddns.db"
+
+
+@dataclass(frozen=True)
+class ClientSettings:
+    """Validated [Client_settings] section."""
+
+    logging: LogSettings = field(default_factory=LogSettings)
+    damping: DampingSettings = field(default_factory=DampingSettings)
+    cycle: CycleSettings = field(default_factory=CycleSettings)
+    ip_sources: Tuple[str, ...] = SOURCES
+    trace_exporter: str = "none"
+    storage: StorageSettings = field(default_factory=StorageSettings)
+    events: EventSettings = field(default_factory=EventSettings)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable, validated view of the configuration file.
+
+    A new snapshot is built for every (re)load and swapped in as a whole, so
+    readers never observe a half-applied file.
+    """
+
+    sections: Mapping[str, Mapping[str, str]]
+    client: ClientSettings
+    providers: Mapping[str, ProviderSettings]
+
+    @classmethod
+    def from_parser(cls, parser: ConfigParser) -> "ConfigSnapshot":
+        """
+        Builds and validates a snapshot from a loaded ConfigParser.
+
+        Raises:
+            ValueError: If an option is missing or has an invalid value.
+        """
+
+        sections = MappingProxyType(
+            {
+                name: MappingProxyType(dict(parser.items(name, raw=True)))
+                for name in parser.sections()
+            }
+        )
+
+        providers = {}
+        for name, (required, records_option) in PROVIDERS.items():
+            if name not in sections:
+                continue
+            options = sections[name]
+            for option in required:
+                if not options.get(option, "").strip():
+                    raise ValueError(
+                        f"Option '{option}' is required in section '{name}'."
+                    )
+            providers[name] = ProviderSettings(
+                name=name,
+                options=options,
+                records=split_list(options.get(records_option, "")),
+            )
+
+        return cls(
+            sections=sections,
+            client=cls._client_settings(
+                sections.get("Client_settings", MappingProxyType({}))
+            ),
+            providers=MappingProxyType(providers),
+        )
+
+    @staticmethod
+    def _client_settings(options: Mapping[str, str]) -> ClientSettings:
+        section = "Client_settings"
+
+        def value(option: str, parser: Callable[[str], T], fallback: T) -> T:
+            if option not in options:
+                return fallback
+            return _parse(section, option, options[option], parser)
+
+        logging_level = options.get("logging_level", "info").lower().strip()
+        if logging_level not in ["info", "debug"]:
+            raise ValueError(
+                "Invalid logging level."
+                f"Expected info or logging, got {logging_level}"
+            )
+
+        return ClientSettings(
+            logging=LogSettings(
+                level=(
+                    logging.DEBUG if logging_level == "debug" else logging.INFO
+                ),
+                log_file=options.get("log_file", "py_ddns.log"),
+                rotation=value("log_rotation", _log_rotation, "size"),
+                max_bytes=value("log_max_bytes", int, 10 * 1024 * 1024),
+                when=value("log_when", _log_when, "midnight"),
+                backup_count=value("log_backup_count", int, 5),
+                json_lines=options.get("log_format", "text").lower().strip()
+                == "json",
+            ),
+            damping=DampingSettings(
+                stable_seconds=value("stable_seconds", float, 0.0),
+                stable_samples=value("stable_samples", int, 1),
+                coalesce_window=value("coalesce_window", float, 0.0),
+            ),
+            cycle=CycleSettings(
+                budget=value("cycle_budget", float, 60.0),
+                check_min_interval=value("check_min_interval", float, 0.0),
+                check_max_interval=value(
+                    "check_max_interval", float, 3600.0
+                ),
+            ),
+            ip_sources=value("ip_sources", _ip_sources, SOURCES),
+            trace_exporter=value("trace_exporter", _trace_exporter, "none"),
+            storage=StorageSettings(
+                backend=value("storage", _storage_backend, "file"),
+                database=options.get("database", "py_ddns.db").strip(),
+            ),
+            events=EventSettings(
+                log=value("event_log", parse_bool, False),
+                webhook_url=options.get("event_webhook_url", "").strip(),
+                command=options.get("event_command", "").strip(),
+                delivery=SubscriptionOptions(
+                    queue_size=value("event_queue_size", int, 1000),
+                    batch_size=value("event_batch_size", int, 50),
+                    batch_wait=value("event_batch_wait", float, 1.0),
+                    policy=value(
+                        "event_policy", _event_policy, "drop_oldest"
+                    ),
+                    timeout=value("event_timeout", float, 10.0),
+                ),
+            ),
+        )
+
+    def changed_sections(
+        self, previous: Optional["ConfigSnapshot"]
+    ) -> FrozenSet[str]:
+        """Returns the names of sections that differ from previous."""
+
+        if previous is None:
+            return frozenset(self.sections)
+
+        names = set(self.sections) | set(previous.sections)
+        return frozenset(
+            name
+            for name in names
+            if dict(self.sections.get(name, {}))
+            != dict(previous.sections.get(name, {}))
+        )
+
+
+ConfigListener = Callable[[ConfigSnapshot, FrozenSet[str]], None]
 
 
 class Config:
@@ -21,7 +298,9 @@ class Config:
     A class to manage configuration settings using ConfigParser.
 
     This class loads configuration settings from a specified INI file
-    and provides methods to access the settings.
+    and provides methods to access the settings. Every load produces an
+    immutable `ConfigSnapshot`; `reload` swaps it atomically and notifies
+    subscribers of the sections that changed.
     """
 
     _instance: Optional["Config"] = None
@@ -29,55 +308,167 @@ class Config:
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(Config, cls).__new__(cls)
+            cls._instance._listeners = []
+            cls._instance._reload_lock = threading.Lock()
         return cls._instance
 
-    def __init__(self, config_file: str = "py_ddns.ini") -> None:
+    def __init__(self, config_file: Optional[str] = None) -> None:
         """
         Initializes the Config class and loads the configuration file.
+
+        Re-initializing without a config_file reloads the previously used
+        file, defaulting to py_ddns.ini.
         """
-        self.config = ConfigParser()
-        self.config_file = config_file
-        self.load_config()
-        self.setup_logging()
+        self._listeners: List[Callable[[], Optional[ConfigListener]]]
+        self._reload_lock: threading.Lock
+
+        previous: Optional[str] = getattr(self, "config_file", None)
+        self.config_file = config_file or previous or "py_ddns.ini"
+
+        try:
+            self.load_config()
+        except FileNotFoundError:
+            if previous is None:
+                del self.config_file
+            else:
+                self.config_file = previous
+            raise
+
+        self._setup(self.snapshot.client)
 
-    def setup_logging(self) -> None:
+    def setup_tracing(self, client: Optional[ClientSettings] = None) -> None:
         """
-        Sets up the logging configuration for the application.
+        Installs the span exporter named by trace_exporter, "none" keeps
+        tracing disabled. client defaults to the current snapshot.
         """
-        logging_level = self.config.get("Client_settings", "logging_level")
+        client = client or self.snapshot.client
+        try:
+            configure_tracing(client.trace_exporter)
+        except ImportError as err:
+            logging.error("Tracing: %s Tracing stays disabled.", err)
 
-        if logging_level.lower().strip() not in ["info", "debug"]:
-            raise ValueError(
-                "Invalid logging level."
-                f"Expected info or logging, got {logging_level}"
-            )
+    def setup_events(self, client: Optional[ClientSettings] = None) -> None:
+        """
+        Subscribes the event sinks enabled by the event_* options. client
+        defaults to the current snapshot.
+        """
+        configure_events((client or self.snapshot.client).events)
 
-        if logging_level.lower() == "debug":
-            level = logging.DEBUG
-        else:
-            level = logging.INFO
-
-        logging.basicConfig(
-            level=level,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler("py_ddns.log"),
-                logging.StreamHandler(),
-            ],
+    def setup_logging(self, client: Optional[ClientSettings] = None) -> None:
+        """
+        Sets up the logging configuration for the application. client
+        defaults to the current snapshot.
+
+        Log records are queued and written by a background listener to a
+        rotating log file, so logging never blocks the caller on disk I/O.
+        """
+        settings = (client or self.snapshot.client).logging
+
+        start_logging(settings)
+        logging.info(
+            "Logging is set up, level = %s",
+            logging.getLevelName(settings.level),
         )
-        logging.info("Logging is set up, level = %s", logging_level.upper())
 
     def load_config(self) -> None:
         """
         Loads the configuration from the specified file.
+
+        Raises:
+            FileNotFoundError: If the configuration file does not exist.
+            ValueError: If the configuration file is invalid.
         """
 
+        parser, snapshot = self._read()
+        self.snapshot: ConfigSnapshot = snapshot
+        self.config = parser
+
+    def _read(self) -> Tuple[ConfigParser, ConfigSnapshot]:
         if not os.path.exists(self.config_file):
             raise FileNotFoundError(
                 f"Configuration file '{self.config_file}' not found."
             )
 
-        self.config.read(self.config_file)
+        parser = ConfigParser()
+        parser.read(self.config_file)
+        return parser, ConfigSnapshot.from_parser(parser)
+
+    def _setup(self, client: ClientSettings) -> None:
+        self.setup_logging(client)
+        self.setup_tracing(client)
+        self.setup_events(client)
+
+    def reload(self) -> FrozenSet[str]:
+        """
+        Re-reads the configuration file and swaps in the new snapshot.
+
+        An invalid file, or one whose logging, tracing or event settings
+        cannot be applied, is logged and ignored, keeping the current
+        snapshot. Returns the names of the sections that changed.
+        """
+
+        with self._reload_lock:
+            previous = self.snapshot
+            try:
+                parser, snapshot = self._read()
+            except (FileNotFoundError, ValueError, ConfigParserError) as err:
+                logging.error(
+                    "Config: Ignoring invalid %s: %s", self.config_file, err
+                )
+                return frozenset()
+
+            changed = snapshot.changed_sections(previous)
+            if not changed:
+                return changed
+
+            if "Client_settings" in changed:
+                try:
+                    self._setup(snapshot.client)
+                except (OSError, ValueError) as err:
+                    self._setup(previous.client)
+                    logging.error(
+                        "Config: Ignoring %s, its settings cannot be "
+                        "applied: %s",
+                        self.config_file,
+                        err,
+                    )
+                    return frozenset()
+
+            self.snapshot = snapshot
+            self.config = parser
+            logging.info(
+                "Config: Reloaded %s, changed sections: %s",
+                self.config_file,
+                ", ".join(sorted(changed)),
+            )
+            for listener in self._live_listeners():
+                listener(self.snapshot, changed)
+            return changed
+
+    def subscribe(self, listener: ConfigListener) -> None:
+        """
+        Registers a callback invoked with (snapshot, changed_sections)
+        after every reload that changed something.
+
+        Bound methods are held weakly, so subscribing does not keep clients
+        alive.
+        """
+
+        if hasattr(listener, "__self__"):
+            self._listeners.append(weakref.WeakMethod(listener))
+        else:
+            self._listeners.append(lambda: listener)
+
+    def _live_listeners(self) -> List[ConfigListener]:
+        listeners = []
+        alive = []
+        for ref in self._listeners:
+            listener = ref()
+            if listener is not None:
+                listeners.append(listener)
+                alive.append(ref)
+        self._listeners[:] = alive
+        return listeners
 
     def get(self, section: str, option: str) -> str:
         """
@@ -91,7 +482,59 @@ class Config:
             KeyError: If the specified option does not exist in the section.
         """
 
-        if self.config.has_option(section, option):
-            return self.config.get(section, option)
+        options = self.snapshot.sections.get(section)
+        if options is not None and option.lower() in options:
+            return options[option.lower()]
 
         raise KeyError(f"Option '{option}' not found in section '{section}'.")
+
+    def get_list(self, section: str, option: str) -> Tuple[str, ...]:
+        """
+        Retrieves a comma separated option as a tuple of stripped values.
+
+        Raises:
+            KeyError: If the specified option does not exist in the section.
+        """
+
+        return split_list(self.get(section, option))
+
+    def _get_optional(
+        self,
+        section: str,
+        option: str,
+        parser: Callable[[str], T],
+        fallback: T,
+    ) -> T:
+        try:
+            value = self.get(section, option)
+        except KeyError:
+            return fallback
+        return _parse(section, option, value, parser)
+
+    def get_float(
+        self, section: str, option: str, fallback: float
+    ) -> float:
+        """
+        Retrieves an optional numeric option, returning fallback if unset.
+        """
+
+        return self._get_optional(section, option, float, fallback)
+
+    def get_int(self, section: str, option: str, fallback: int) -> int:
+        """
+        Retrieves an optional integer option, returning fallback if unset.
+        """
+
+        return self._get_optional(section, option, int, fallback)
+
+    def get_bool(self, section: str, option: str, fallback: bool) -> bool:
+        """
+        Retrieves an optional boolean option, returning fallback if unset.
+        """
+
+        return self._get_optional(section, option, parse_bool, fallback)
+
+    def has_section(self, section: str) -> bool:
+        """Returns True if the configuration file defines the section."""
+
+        return section in self.snapshot.sections
@@ -0,0 +1,175 @@
+"""
+Flap Damping Module
+
+Provides hysteresis for unstable uplinks. A newly observed public IP must be
+seen for a number of seconds and/or consecutive samples before it is used to
+update records, and records updated within a coalescing window are held back
+so that a burst of changes results in a single update per record.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import logging
+import time
+from typing import Callable, Optional, Union
+
+from pyddns.config import Config, DampingSettings
+from pyddns.storage import Storage
+
+
+def parse_timestamp(value: Union[str, datetime, None]) -> Optional[datetime]:
+    """
+    Parses a SQLite CURRENT_TIMESTAMP value (UTC) into an aware datetime.
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@dataclass
+class _Candidate:
+    """The IP observed in the latest samples and since when."""
+
+    ip: Optional[str] = None
+    since: float = 0.0
+    samples: int = 0
+
+
+@dataclass
+class FlapDamper:
+    """
+    Tracks public IP samples and decides when an IP is stable enough to use.
+
+    Attributes:
+        stable_seconds: Seconds a new IP must be observed before it is used.
+        stable_samples: Consecutive samples a new IP must be observed for.
+        coalesce_window: Seconds after an update during which further
+            updates of the same record are held back.
+        storage: Optional storage used to record flap events.
+    """
+
+    stable_seconds: float = 0.0
+    stable_samples: int = 1
+    coalesce_window: float = 0.0
+    storage: Optional[Storage] = None
+    clock: Callable[[], float] = time.monotonic
+
+    _stable_ip: Optional[str] = field(default=None, init=False)
+    _candidate: _Candidate = field(default_factory=_Candidate, init=False)
+
+    @classmethod
+    def from_config(
+        cls, config: Config, storage: Optional[Storage] = None
+    ) -> "FlapDamper":
+        """
+        Builds a damper from the optional [Client_settings] options
+        stable_seconds, stable_samples and coalesce_window.
+        """
+
+        damper = cls(storage=storage)
+        damper.configure(config.snapshot.client.damping)
+        return damper
+
+    def configure(self, settings: DampingSettings) -> None:
+        """
+        Applies (re)loaded settings, keeping the observed samples.
+        """
+
+        self.stable_seconds = settings.stable_seconds
+        self.stable_samples = settings.stable_samples
+        self.coalesce_window = settings.coalesce_window
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if any damping or coalescing is configured."""
+        return (
+            self.stable_seconds > 0
+            or self.stable_samples > 1
+            or self.coalesce_window > 0
+        )
+
+    @property
+    def stable_ip(self) -> Optional[str]:
+        """The last IP that was observed long enough to be trusted."""
+        return self._stable_ip
+
+    @property
+    def settling(self) -> bool:
+        """Returns True while a newly observed IP is held back."""
+        candidate_ip = self._candidate.ip
+        return candidate_ip is not None and candidate_ip != self._stable_ip
+
+    def observe(self, ip_address: str) -> Optional[str]:
+        """
+        Records a public IP sample and returns the IP that should be used.
+
+        Returns the new IP once it is stable, otherwise the previously stable
+        IP, or None if no IP has been stable yet.
+        """
+
+        now = self.clock()
+        candidate = self._candidate
+
+        if ip_address != candidate.ip:
+            if candidate.ip is not None and candidate.ip != self._stable_ip:
+                self._record_flap(
+                    candidate.ip, ip_address, now - candidate.since
+                )
+            candidate = self._candidate = _Candidate(ip_address, now)
+
+        candidate.samples += 1
+
+        if (
+            candidate.samples >= self.stable_samples
+            and now - candidate.since >= self.stable_seconds
+        ):
+            if self._stable_ip != ip_address:
+                logging.info(
+                    "Damping: %s is stable after %d sample(s).",
+                    ip_address,
+                    candidate.samples,
+                )
+            self._stable_ip = ip_address
+        else:
+            logging.info(
+                "Damping: Holding %s, seen %d sample(s) over %.0fs.",
+                ip_address,
+                candidate.samples,
+                now - candidate.since,
+            )
+
+        return self._stable_ip
+
+    def allow_update(
+        self, last_updated: Union[str, datetime, None]
+    ) -> bool:
+        """
+        Returns False if the record was updated within the coalesce window.
+        """
+
+        if self.coalesce_window <= 0:
+            return True
+
+        updated_at = parse_timestamp(last_updated)
+        if updated_at is None:
+            return True
+
+        age = (datetime.now(timezone.utc) - updated_at).total_seconds()
+        return age >= self.coalesce_window
+
+    def _record_flap(
+        self, previous_ip: str, observed_ip: str, held_for: float
+    ) -> None:
+        logging.warning(
+            "Damping: Flap from %s to %s after %.1fs.",
+            previous_ip,
+            observed_ip,
+            held_for,
+        )
+        if self.storage is not None:
+            self.storage.record_flap(previous_ip, observed_ip, held_for)
@@ -0,0 +1,188 @@
+"""
+Deadline Module
+
+Provides a per-cycle deadline budget that is propagated into every I/O call,
+so that a slow or hung provider cannot stall a reconciliation cycle.
+"""
+
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError as _Timeout,
+)
+from functools import partial
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Optional, Set, TypeVar
+
+from pyddns.tracing import span
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an operation does not fit in the remaining budget."""
+
+
+class Deadline:
+    """
+    An absolute point in time, derived from a budget in seconds.
+
+    A Deadline created with budget=None never expires, which keeps the
+    behaviour of callers that do not pass a deadline unchanged.
+    """
+
+    def __init__(
+        self,
+        budget: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.clock = clock
+        self.budget = budget
+        self.expires_at: Optional[float] = (
+            None if budget is None else clock() + budget
+        )
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget, or None if unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        """Returns True if the budget has been used up."""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self, operation: str) -> None:
+        """Raises DeadlineExceeded if the budget has been used up."""
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before {operation}.")
+
+    def timeout(self, default: float) -> float:
+        """
+        Returns the timeout for the next I/O call: the smaller of default and
+        the remaining budget.
+
+        Raises:
+            DeadlineExceeded: If the budget has been used up.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded.")
+        return min(default, remaining)
+
+
+class _BoundedPool:
+    """
+    Runs blocking calls that have no overall timeout of their own, such as
+    socket.gethostbyname, on a small thread pool.
+
+    A call abandoned at its deadline keeps its worker until it returns.
+    Once abandoned calls hold every worker the pool is retired, without
+    waiting for them, and a fresh one takes its place, so new calls are
+    not queued behind hung ones.
+    """
+
+    def __init__(self, name: str, kind: str, workers: int = 8) -> None:
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pool = self._new_pool()
+        self.abandoned: Set[Future] = set()
+
+    def _new_pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=f"pyddns-{self.name}",
+        )
+
+    def submit(self, func: Callable[[], T]) -> "Future[T]":
+        """Starts func on a worker."""
+
+        with self.lock:
+            if len(self.abandoned) >= self.workers:
+                logging.warning(
+                    "Deadline: %d %s are hung, starting new workers.",
+                    len(self.abandoned),
+                    self.kind,
+                )
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._new_pool()
+                self.abandoned = set()
+            return self.pool.submit(func)
+
+    def abandon(self, future: Future) -> None:
+        """Gives up on future, counting it while it still holds a worker."""
+
+        if future.cancel():
+            return
+        with self.lock:
+            abandoned = self.abandoned
+            abandoned.add(future)
+        future.add_done_callback(abandoned.discard)
+
+    def call(
+        self,
+        func: Callable[[], T],
+        deadline: Optional[Deadline],
+        operation: str,
+    ) -> T:
+        """
+        Returns the result of func, giving up on it when deadline expires.
+
+        Raises:
+            DeadlineExceeded: If func does not return in time.
+        """
+
+        if deadline is None or deadline.remaining() is None:
+            return func()
+
+        future = self.submit(func)
+        try:
+            return future.result(timeout=deadline.timeout(float("inf")))
+        except _Timeout as err:
+            self.abandon(future)
+            logging.warning("Deadline: %s timed out.", operation)
+            raise DeadlineExceeded(f"{operation} timed out.") from err
+
+
+_resolver = _BoundedPool("dns", "DNS lookups")
+_requests = _BoundedPool("http", "HTTP requests")
+
+
+def resolve_host(hostname: str, deadline: Optional[Deadline] = None) -> str:
+    """
+    Resolves hostname to an IPv4 address within the deadline.
+
+    Raises:
+        DeadlineExceeded: If the lookup does not finish in time.
+        socket.gaierror: If the lookup fails.
+    """
+
+    with span("dns.lookup", host=hostname):
+        return _resolver.call(
+            partial(socket.gethostbyname, hostname),
+            deadline,
+            f"DNS lookup for {hostname}",
+        )
+
+
+def call_within(
+    func: Callable[[], T], deadline: Optional[Deadline], operation: str
+) -> T:
+    """
+    Runs func, typically an HTTP request, and returns its result within the
+    deadline. Socket timeouts only bound each read, a server trickling its
+    answer could otherwise hold the call for much longer.
+
+    Raises:
+        DeadlineExceeded: If func does not return in time.
+    """
+
+    return _requests.call(func, deadline, operation)
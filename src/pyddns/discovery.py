@@ -0,0 +1,400 @@
+"""
+Public IP Discovery Module
+
+Provides local strategies to discover the public IPv4 address without a WAN
+round-trip: a scan of the host's interfaces for a global address, a NAT-PMP
+query to the gateway and the UPnP IGD GetExternalIPAddress action. They are
+chained ahead of the HTTP echo service, which remains the last resort.
+"""
+
+from abc import ABC, abstractmethod
+import ipaddress
+import logging
+import socket
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin
+from xml.etree import ElementTree
+
+import requests
+
+from pyddns.deadline import Deadline, DeadlineExceeded
+from pyddns.tracing import span
+
+SOURCES = ("interface", "natpmp", "upnp", "http")
+
+_SIOCGIFADDR = 0x8915
+_WAN_SERVICES = (
+    "urn:schemas-upnp-org:service:WANIPConnection:1",
+    "urn:schemas-upnp-org:service:WANIPConnection:2",
+    "urn:schemas-upnp-org:service:WANPPPConnection:1",
+)
+_SOAP_REQUEST = (
+    '<?xml version="1.0"?>'
+    '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+    's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    '<s:Body><u:GetExternalIPAddress xmlns:u="{service}"/></s:Body>'
+    "</s:Envelope>"
+)
+
+
+class DiscoveryError(OSError):
+    """Raised when a source cannot determine the public IP."""
+
+
+def is_public_ipv4(value: Optional[str]) -> bool:
+    """Returns True if value is a globally routable IPv4 address."""
+    if not value:
+        return False
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return address.version == 4 and address.is_global
+
+
+def default_gateway() -> Optional[str]:
+    """Returns the IPv4 default gateway from /proc/net/route, if any."""
+
+    try:
+        with open("/proc/net/route", "r", encoding="ascii") as routes:
+            next(routes)
+            for line in routes:
+                fields = line.split()
+                if fields[1] == "00000000" and int(fields[3], 16) & 0x2:
+                    return socket.inet_ntoa(
+                        struct.pack("<L", int(fields[2], 16))
+                    )
+    except (OSError, StopIteration, IndexError, ValueError):
+        pass
+    return None
+
+
+def interface_addresses() -> List[str]:
+    """
+    Returns the IPv4 addresses assigned to the host's interfaces.
+
+    Uses SIOCGIFADDR on Linux, plus the source address of the default
+    route (a connected UDP socket sends no packets). Neither queries DNS,
+    so the lookup cannot block on a resolver.
+    """
+
+    addresses: List[str] = []
+
+    if sys.platform.startswith("linux"):
+        import fcntl  # pylint: disable=import-outside-toplevel
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for _, name in socket.if_nameindex():
+                try:
+                    packed = fcntl.ioctl(
+                        sock.fileno(),
+                        _SIOCGIFADDR,
+                        struct.pack("256s", name[:15].encode()),
+                    )
+                except OSError:
+                    continue
+                addresses.append(socket.inet_ntoa(packed[20:24]))
+
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("192.0.2.1", 9))
+            addresses.append(sock.getsockname()[0])
+    except OSError:
+        pass
+
+    return list(dict.fromkeys(addresses))
+
+
+class IPSource(ABC):
+    """A strategy for discovering the public IPv4 address."""
+
+    name = "source"
+    timeout = 1.0
+
+    def timeout_for(self, deadline: Optional[Deadline]) -> float:
+        """Returns the timeout of a single query, capped by deadline."""
+        return deadline.timeout(self.timeout) if deadline else self.timeout
+
+    @abstractmethod
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        """
+        Returns the public IPv4 address.
+
+        Raises:
+            DiscoveryError: If the source cannot determine the address.
+        """
+
+
+class InterfaceSource(IPSource):
+    """Uses a global address assigned directly to one of our interfaces."""
+
+    name = "interface"
+
+    def __init__(
+        self, addresses: Callable[[], Iterable[str]] = interface_addresses
+    ) -> None:
+        self.addresses = addresses
+
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        if deadline is not None:
+            deadline.check("reading interface addresses")
+        for address in self.addresses():
+            if is_public_ipv4(address):
+                return address
+        raise DiscoveryError("No interface has a global IPv4 address.")
+
+
+class NatPmpSource(IPSource):
+    """Asks the gateway for its external address over NAT-PMP (RFC 6886)."""
+
+    name = "natpmp"
+    timeout = 0.25
+
+    def __init__(
+        self, gateway: Optional[str] = None, port: int = 5351
+    ) -> None:
+        self.gateway = gateway
+        self.port = port
+
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        gateway = self.gateway or default_gateway()
+        if gateway is None:
+            raise DiscoveryError("No default gateway found.")
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout_for(deadline))
+            try:
+                sock.sendto(b"\x00\x00", (gateway, self.port))
+                data, _ = sock.recvfrom(16)
+            except OSError as err:
+                raise DiscoveryError(
+                    f"NAT-PMP request failed: {err}"
+                ) from err
+
+        if len(data) < 12:
+            raise DiscoveryError("NAT-PMP response too short.")
+
+        version, opcode, result = struct.unpack_from("!BBH", data)
+        if version != 0 or opcode != 128 or result != 0:
+            raise DiscoveryError(
+                f"NAT-PMP error: version={version} opcode={opcode} "
+                f"result={result}"
+            )
+        return socket.inet_ntoa(data[8:12])
+
+
+class UpnpIgdSource(IPSource):
+    """
+    Calls GetExternalIPAddress on the gateway's UPnP IGD WAN service.
+
+    The control URL is discovered once, through SSDP unless location is
+    given, and reused afterwards.
+    """
+
+    name = "upnp"
+    timeout = 1.0
+
+    def __init__(
+        self,
+        location: Optional[str] = None,
+        ssdp_address: Tuple[str, int] = ("239.255.255.250", 1900),
+    ) -> None:
+        self.location = location
+        self.ssdp_address = ssdp_address
+        self._control: Optional[Tuple[str, str]] = None
+
+    def _discover_location(self, timeout: float) -> str:
+        request = (
+            "M-SEARCH * HTTP/1.1\r\n"
+            f"HOST: {self.ssdp_address[0]}:{self.ssdp_address[1]}\r\n"
+            'MAN: "ssdp:discover"\r\n'
+            "MX: 1\r\n"
+            "ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+            "\r\n"
+        ).encode()
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            try:
+                sock.sendto(request, self.ssdp_address)
+                data, _ = sock.recvfrom(4096)
+            except OSError as err:
+                raise DiscoveryError(
+                    f"SSDP discovery failed: {err}"
+                ) from err
+
+        for line in data.decode(errors="replace").splitlines():
+            key, _, value = line.partition(":")
+            if key.strip().lower() == "location":
+                return value.strip()
+        raise DiscoveryError("SSDP response without LOCATION.")
+
+    def _control_url(self, timeout: float) -> Tuple[str, str]:
+        if self._control is not None:
+            return self._control
+
+        location = self.location or self._discover_location(timeout)
+        with span("http.get", url=location):
+            response = requests.get(location, timeout=timeout)
+        response.raise_for_status()
+        root = ElementTree.fromstring(response.content)
+
+        base = location
+        for element in root.iter():
+            if element.tag.endswith("URLBase") and element.text:
+                base = element.text.strip()
+
+        for service in root.iter():
+            if not service.tag.endswith("service"):
+                continue
+            fields: Dict[str, str] = {
+                child.tag.rsplit("}", 1)[-1]: (child.text or "").strip()
+                for child in service
+            }
+            if fields.get("serviceType") in _WAN_SERVICES:
+                self._control = (
+                    urljoin(base, fields.get("controlURL", "")),
+                    fields["serviceType"],
+                )
+                return self._control
+
+        raise DiscoveryError("Gateway has no WAN connection service.")
+
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        timeout = self.timeout_for(deadline)
+        try:
+            url, service = self._control_url(timeout)
+            with span("http.post", url=url):
+                response = requests.post(
+                    url,
+                    data=_SOAP_REQUEST.format(service=service),
+                    headers={
+                        "Content-Type": 'text/xml; charset="utf-8"',
+                        "SOAPAction": f'"{service}#GetExternalIPAddress"',
+                    },
+                    timeout=timeout,
+                )
+            response.raise_for_status()
+            root = ElementTree.fromstring(response.content)
+        except (requests.RequestException, ElementTree.ParseError) as err:
+            self._control = None
+            raise DiscoveryError(f"UPnP request failed: {err}") from err
+
+        for element in root.iter():
+            if element.tag.endswith("NewExternalIPAddress") and element.text:
+                return element.text.strip()
+        raise DiscoveryError("UPnP response without NewExternalIPAddress.")
+
+
+class HttpEchoSource(IPSource):
+    """Asks an internet echo service, the original behaviour."""
+
+    name = "http"
+    timeout = 10.0
+
+    def __init__(self, url: str = "https://api.ipify.org") -> None:
+        self.url = url
+
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        with span("http.get", url=self.url):
+            response = requests.get(
+                self.url, timeout=self.timeout_for(deadline)
+            )
+        response.raise_for_status()
+        return response.content.decode("ascii", errors="replace").strip()
+
+
+class DiscoveryChain:
+    """
+    Tries each source in order and returns the first public IPv4 address.
+
+    A local source that fails is skipped for retry_after seconds, so hosts
+    without NAT-PMP or UPnP only pay for the probe once in a while. The
+    last source is always tried.
+    """
+
+    def __init__(
+        self,
+        sources: Sequence[IPSource],
+        retry_after: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not sources:
+            raise ValueError("Discovery: At least one source is required.")
+        self.sources = list(sources)
+        self.retry_after = retry_after
+        self.clock = clock
+        self._skip_until: Dict[str, float] = {}
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> "DiscoveryChain":
+        """Builds a chain from source names, see SOURCES."""
+
+        factories: Dict[str, Callable[[], IPSource]] = {
+            "interface": InterfaceSource,
+            "natpmp": NatPmpSource,
+            "upnp": UpnpIgdSource,
+            "http": HttpEchoSource,
+        }
+        return cls([factories[name]() for name in names])
+
+    def get_ipv4(self, deadline: Optional[Deadline] = None) -> str:
+        """
+        Returns the public IPv4 address from the first source that knows it.
+
+        Raises:
+            The error of the last source if no source succeeds.
+        """
+
+        last = len(self.sources) - 1
+        for index, source in enumerate(self.sources):
+            skip_until = self._skip_until.get(source.name, 0.0)
+            if index < last and skip_until > self.clock():
+                continue
+
+            try:
+                with span("discovery.source", source=source.name):
+                    address = source.get_ipv4(deadline)
+            except DeadlineExceeded:
+                raise
+            except (OSError, requests.RequestException) as err:
+                if index == last:
+                    raise
+                logging.debug("Discovery: %s failed: %s", source.name, err)
+                self._skip(source)
+                continue
+
+            if is_public_ipv4(address):
+                logging.debug(
+                    "Discovery: %s reported %s", source.name, address
+                )
+                return address
+
+            if index == last:
+                raise DiscoveryError(
+                    f"{source.name} returned a non-public address {address}."
+                )
+            logging.debug(
+                "Discovery: %s returned non-public %s", source.name, address
+            )
+            self._skip(source)
+
+        raise DiscoveryError("No source could determine the public IP.")
+
+    def _skip(self, source: IPSource) -> None:
+        self._skip_until[source.name] = self.clock() + self.retry_after
+
+
+_chains: Dict[Tuple[str, ...], DiscoveryChain] = {}
+
+
+def shared_chain(names: Iterable[str]) -> DiscoveryChain:
+    """Returns a process wide chain for the given source names."""
+
+    key = tuple(names)
+    if key not in _chains:
+        _chains[key] = DiscoveryChain.from_names(key)
+    return _chains[key]
@@ -0,0 +1,574 @@
+"""
+Events Module
+
+Provides an in-process event bus for record changes. Services publish
+`Event`s while they update records; every subscriber consumes them from its
+own bounded queue on a background worker, in batches. Publishing never waits
+on a subscriber, unless the subscriber opted into backpressure, so slow
+webhooks or scripts cannot delay DNS updates.
+"""
+
+from abc import ABC, abstractmethod
+import atexit
+from dataclasses import asdict, dataclass, field, replace
+import json
+import logging
+import queue
+import shlex
+import subprocess
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import requests
+
+EVENT_KINDS = ("ip_changed", "record_updated", "drift_repaired", "error")
+POLICIES = ("drop_new", "drop_oldest", "block")
+
+
+@dataclass(frozen=True)
+class Event:  # pylint: disable=too-many-instance-attributes
+    """
+    Something that happened to a record or a service.
+
+    Attributes:
+        kind: One of EVENT_KINDS.
+        service: Name of the service that emitted the event.
+        record_name: Affected record, if any.
+        old_ip: Previous value, if known.
+        new_ip: New value, if any.
+        reason: Reason of the change, e.g. "ip_changed" or "create", or the
+            failed operation of "error" events.
+        error: Error message of "error" events.
+        timestamp: Seconds since the epoch.
+    """
+
+    kind: str
+    service: str
+    record_name: Optional[str] = None
+    old_ip: Optional[str] = None
+    new_ip: Optional[str] = None
+    reason: Optional[str] = None
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the event as a JSON serializable dict."""
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class SubscriptionOptions:
+    """
+    How events are queued and handed to a subscriber.
+
+    Attributes:
+        kinds: Event kinds delivered to the subscriber, None for all.
+        queue_size: Events queued before the policy applies.
+        batch_size: Most events handed to the subscriber at once.
+        batch_wait: Seconds to wait for more events to fill a batch.
+        policy: What happens when the queue is full, one of POLICIES.
+        timeout: Seconds the subscriber may spend on one batch, None for no
+            limit.
+        max_block: Seconds the "block" policy waits for room in the queue.
+    """
+
+    kinds: Optional[Collection[str]] = None
+    queue_size: int = 1000
+    batch_size: int = 50
+    batch_wait: float = 0.0
+    policy: str = "drop_oldest"
+    timeout: Optional[float] = 10.0
+    max_block: float = 1.0
+
+
+@dataclass(frozen=True)
+class EventSettings:
+    """
+    Event sinks read from the [Client_settings] section.
+
+    Attributes:
+        log: Log every event.
+        webhook_url: URL that receives batches of events as JSON POSTs.
+        command: Command that receives batches of events as JSON on stdin.
+        delivery: Queueing and batching of every sink.
+    """
+
+    log: bool = False
+    webhook_url: str = ""
+    command: str = ""
+    delivery: SubscriptionOptions = SubscriptionOptions(batch_wait=1.0)
+
+
+@dataclass
+class DeliveryStats:
+    """Counts the events a subscription handled or lost."""
+
+    delivered: int = 0
+    dropped: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def add(self, counter: str, count: int = 1) -> int:
+        """Adds count to the named counter and returns its new value."""
+        with self.lock:
+            value = getattr(self, counter) + count
+            setattr(self, counter, value)
+        return value
+
+
+class EventSubscriber(ABC):
+    """Receives batches of events on a worker thread."""
+
+    name: str = "subscriber"
+
+    @abstractmethod
+    def handle(self, events: Sequence[Event]) -> None:
+        """Handles a batch of events, oldest first."""
+
+    def close(self) -> None:
+        """Releases resources."""
+
+
+Handler = Union[EventSubscriber, Callable[[Sequence[Event]], None]]
+
+
+class _FunctionSubscriber(EventSubscriber):
+    """Adapts a callable taking a batch to `EventSubscriber`."""
+
+    def __init__(self, func: Callable[[Sequence[Event]], None]) -> None:
+        self.func = func
+        self.name = getattr(func, "__name__", "subscriber")
+
+    def handle(self, events: Sequence[Event]) -> None:
+        self.func(events)
+
+
+class LogSubscriber(EventSubscriber):
+    """Writes one log line per event."""
+
+    name = "log"
+
+    def __init__(self, level: int = logging.INFO) -> None:
+        self.level = level
+
+    def handle(self, events: Sequence[Event]) -> None:
+        for event in events:
+            logging.log(
+                self.level,
+                "Events: %s %s%s%s%s",
+                event.kind,
+                event.service,
+                f" {event.record_name}" if event.record_name else "",
+                f" {event.old_ip} -> {event.new_ip}" if event.new_ip else "",
+                f" error={event.error}" if event.error else "",
+            )
+
+
+class WebhookSubscriber(EventSubscriber):
+    """POSTs each batch as {"events": [...]} to a URL."""
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: Optional[float] = 10.0) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def handle(self, events: Sequence[Event]) -> None:
+        response = self.session.post(
+            self.url,
+            json={"events": [event.to_dict() for event in events]},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class CommandSubscriber(EventSubscriber):
+    """
+    Runs a local command per batch, with the events as a JSON array on
+    stdin.
+    """
+
+    name = "command"
+
+    def __init__(self, command: str, timeout: Optional[float] = 10.0) -> None:
+        self.args = shlex.split(command)
+        self.timeout = timeout
+
+    def handle(self, events: Sequence[Event]) -> None:
+        subprocess.run(
+            self.args,
+            input=json.dumps([event.to_dict() for event in events]),
+            text=True,
+            timeout=self.timeout,
+            check=True,
+            capture_output=True,
+        )
+
+
+class Subscription:
+    """
+    Bounded queue and worker thread feeding one subscriber.
+
+    When the queue is full, "drop_new" discards the new event, "drop_oldest"
+    discards the oldest queued one and "block" makes the publisher wait up to
+    max_block seconds before the new event is discarded.
+
+    A batch that is not handled within timeout is abandoned. While such a
+    call is still running, further batches are dropped instead of piling up
+    behind it.
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        options: SubscriptionOptions = SubscriptionOptions(),
+    ) -> None:
+        if options.policy not in POLICIES:
+            raise ValueError(
+                f"Events: Unknown policy {options.policy!r}, "
+                f"expected one of {', '.join(POLICIES)}."
+            )
+        if not isinstance(handler, EventSubscriber):
+            handler = _FunctionSubscriber(handler)
+        self.subscriber = handler
+        self.options = replace(
+            options,
+            kinds=frozenset(options.kinds) if options.kinds else None,
+            batch_size=max(1, options.batch_size),
+        )
+        self.stats = DeliveryStats()
+
+        self.queue: "queue.Queue[Optional[Event]]" = queue.Queue(
+            max(1, options.queue_size)
+        )
+        self._closed = False
+        self._overrunning: Optional[threading.Thread] = None
+        self._worker = threading.Thread(
+            target=self._run, name=f"pyddns-events-{self.name}", daemon=True
+        )
+        self._worker.start()
+
+    @property
+    def name(self) -> str:
+        """Name of the subscriber."""
+        return self.subscriber.name
+
+    def accepts(self, kind: str) -> bool:
+        """Returns True if the subscriber wants events of kind."""
+        return self.options.kinds is None or kind in self.options.kinds
+
+    def offer(self, event: Event) -> bool:
+        """
+        Queues event according to the policy. Returns False if an event
+        was dropped.
+        """
+
+        if self._closed:
+            return False
+        try:
+            if self.options.policy == "block":
+                self.queue.put(event, timeout=self.options.max_block)
+            else:
+                self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            if self.options.policy != "drop_oldest":
+                self._count_dropped(1)
+                return False
+
+        while True:
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self._count_dropped(1)
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(event)
+                return False
+            except queue.Full:
+                continue
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every queued event was handled or dropped. Returns False
+        if timeout expired first.
+        """
+
+        with self.queue.all_tasks_done:
+            return self.queue.all_tasks_done.wait_for(
+                lambda: self.queue.unfinished_tasks == 0, timeout
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops accepting events, hands the queued ones to the subscriber and
+        stops the worker, waiting at most timeout seconds.
+        """
+
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.warning(
+                "Events: %s did not drain its queue, dropping %d event(s).",
+                self.name,
+                self.queue.qsize(),
+            )
+        self._worker.join(timeout)
+        try:
+            self.subscriber.close()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logging.debug("Events: Closing %s failed: %s", self.name, err)
+
+    def _count_dropped(self, count: int) -> None:
+        dropped = self.stats.add("dropped", count)
+        if dropped == count or dropped // 100 != (dropped - count) // 100:
+            logging.warning(
+                "Events: %s is falling behind, %d event(s) dropped so far.",
+                self.name,
+                dropped,
+            )
+
+    def _next_batch(self) -> Tuple[List[Event], bool]:
+        """
+        Waits for the next batch. Returns the batch and whether the
+        subscription was closed.
+        """
+
+        first = self.queue.get()
+        if first is None:
+            self.queue.task_done()
+            return [], True
+
+        batch = [first]
+        linger_until = time.monotonic() + self.options.batch_wait
+        while len(batch) < self.options.batch_size:
+            remaining = linger_until - time.monotonic()
+            try:
+                if remaining > 0:
+                    event = self.queue.get(timeout=remaining)
+                else:
+                    event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:
+                self.queue.task_done()
+                return batch, True
+            batch.append(event)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                try:
+                    self._deliver(batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+
+    def _call(self, batch: List[Event]) -> None:
+        try:
+            self.subscriber.handle(batch)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            self.stats.add("failed", len(batch))
+            logging.error(
+                "Events: %s failed to handle %d event(s): %s",
+                self.name,
+                len(batch),
+                err,
+            )
+            return
+        self.stats.add("delivered", len(batch))
+
+    def _deliver(self, batch: List[Event]) -> None:
+        overrunning = self._overrunning
+        if overrunning is not None:
+            if overrunning.is_alive():
+                self._count_dropped(len(batch))
+                return
+            self._overrunning = None
+
+        timeout = self.options.timeout
+        if timeout is None:
+            self._call(batch)
+            return
+
+        call = threading.Thread(
+            target=self._call,
+            args=(batch,),
+            name=f"pyddns-events-{self.name}-call",
+            daemon=True,
+        )
+        call.start()
+        call.join(timeout)
+        if call.is_alive():
+            self.stats.add("timed_out")
+            self._overrunning = call
+            logging.warning(
+                "Events: %s did not handle %d event(s) within %.1fs.",
+                self.name,
+                len(batch),
+                timeout,
+            )
+
+
+class EventBus:
+    """Fans events out to the queues of all subscriptions."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.subscriptions: Tuple[Subscription, ...] = ()
+
+    def subscribe(
+        self,
+        handler: Handler,
+        options: SubscriptionOptions = SubscriptionOptions(),
+        **overrides: Any,
+    ) -> Subscription:
+        """
+        Starts delivering events to handler, an `EventSubscriber` or a
+        callable taking a batch. overrides replace fields of options.
+        """
+
+        subscription = Subscription(handler, replace(options, **overrides))
+        with self._lock:
+            self.subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(
+        self, subscription: Subscription, timeout: Optional[float] = None
+    ) -> None:
+        """Removes subscription and closes it."""
+
+        with self._lock:
+            self.subscriptions = tuple(
+                s for s in self.subscriptions if s is not subscription
+            )
+        subscription.close(timeout)
+
+    def publish(self, event: Event) -> None:
+        """Queues event for every subscription that accepts its kind."""
+
+        for subscription in self.subscriptions:
+            if subscription.accepts(event.kind):
+                subscription.offer(event)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until all subscriptions handled their queued events."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for subscription in self.subscriptions:
+            remaining = (
+                None if deadline is None else deadline - time.monotonic()
+            )
+            if not subscription.flush(remaining):
+                return False
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Closes every subscription."""
+
+        with self._lock:
+            subscriptions, self.subscriptions = self.subscriptions, ()
+        for subscription in subscriptions:
+            subscription.close(timeout)
+
+
+@dataclass
+class _Events:
+    """The process wide bus and the sinks subscribed by configure_events."""
+
+    bus: EventBus = field(default_factory=EventBus)
+    configured: List[Subscription] = field(default_factory=list)
+    settings: Optional[EventSettings] = None
+
+
+_events = _Events()
+
+
+def get_bus() -> EventBus:
+    """Returns the process wide event bus."""
+    return _events.bus
+
+
+def emit(
+    kind: str, service: str, record_name: Optional[str] = None, **details: Any
+) -> None:
+    """
+    Publishes an event on the process wide bus. details are the remaining
+    `Event` fields, e.g. new_ip. Does nothing while nobody is subscribed.
+    """
+
+    bus = _events.bus
+    if not bus.subscriptions:
+        return
+    bus.publish(Event(kind, service, record_name, **details))
+
+
+def configure_events(settings: EventSettings) -> None:
+    """
+    Subscribes the sinks enabled in settings to the process wide bus,
+    replacing the sinks of a previous call. Unchanged settings keep the
+    running sinks.
+    """
+
+    if settings == _events.settings:
+        return
+    timeout = settings.delivery.timeout
+    for subscription in _events.configured:
+        _events.bus.unsubscribe(subscription, timeout=timeout)
+    _events.configured.clear()
+    _events.settings = settings
+
+    subscribers: List[EventSubscriber] = []
+    if settings.log:
+        subscribers.append(LogSubscriber())
+    if settings.webhook_url:
+        subscribers.append(WebhookSubscriber(settings.webhook_url, timeout))
+    if settings.command:
+        subscribers.append(CommandSubscriber(settings.command, timeout))
+
+    # The sinks time out on their own, the guard is a backstop.
+    delivery = replace(
+        settings.delivery, timeout=None if timeout is None else timeout + 1.0
+    )
+    for subscriber in subscribers:
+        _events.configured.append(
+            _events.bus.subscribe(subscriber, delivery)
+        )
+    if subscribers:
+        logging.info(
+            "Events: Publishing to %s.",
+            ", ".join(subscriber.name for subscriber in subscribers),
+        )
+
+
+def _shutdown() -> None:
+    """Gives the sinks a moment to send what is still queued."""
+    _events.bus.close(timeout=2.0)
+
+
+atexit.register(_shutdown)
@@ -0,0 +1,166 @@
+"""
+Logging Module
+
+Provides a non-blocking logging pipeline for pyddns. Log calls only put the
+record on an in-memory queue; a `QueueListener` thread formats the records
+and writes them to a rotating log file and the console.
+"""
+
+import atexit
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+ROTATIONS = ("size", "time", "none")
+
+# Rotation intervals understood by TimedRotatingFileHandler.
+INTERVALS = ("s", "m", "h", "d", "midnight", *(f"w{day}" for day in range(7)))
+
+
+@dataclass(frozen=True)
+class LogSettings:
+    """
+    Logging options read from the [Client_settings] section.
+
+    Attributes:
+        level: Logging level, logging.INFO or logging.DEBUG.
+        log_file: Path of the log file.
+        rotation: "size", "time" or "none".
+        max_bytes: Size at which the file is rotated when rotation is "size".
+        when: Rotation interval when rotation is "time", e.g. "midnight".
+        backup_count: Number of rotated files to keep.
+        json_lines: Write one JSON object per line instead of plain text.
+    """
+
+    level: int = logging.INFO
+    log_file: str = "py_ddns.log"
+    rotation: str = "size"
+    max_bytes: int = 10 * 1024 * 1024
+    when: str = "midnight"
+    backup_count: int = 5
+    json_lines: bool = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers formatting to the listener thread.
+
+    The stock handler formats every record before enqueueing it, which puts
+    the formatting cost back on the caller. The queue never leaves the
+    process, so the record can be handed over untouched.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+@dataclass
+class _Pipeline:
+    """The running queue handler and listener, with their settings."""
+
+    handler: Optional[LazyQueueHandler] = None
+    listener: Optional[logging.handlers.QueueListener] = None
+    settings: Optional[LogSettings] = None
+
+
+_pipeline = _Pipeline()
+
+
+def _file_handler(settings: LogSettings) -> logging.Handler:
+    if settings.rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            settings.log_file,
+            maxBytes=settings.max_bytes,
+            backupCount=settings.backup_count,
+            encoding="utf-8",
+        )
+    if settings.rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            settings.log_file,
+            when=settings.when,
+            backupCount=settings.backup_count,
+            encoding="utf-8",
+        )
+    if settings.rotation == "none":
+        return logging.FileHandler(settings.log_file, encoding="utf-8")
+
+    raise ValueError(
+        "Invalid log rotation. "
+        f"Expected size, time or none, got {settings.rotation}"
+    )
+
+
+def start_logging(settings: LogSettings) -> None:
+    """
+    Installs the queue handler on the root logger and starts the listener.
+
+    Calling this again with the same settings is a no-op, different settings
+    replace the running pipeline. The new pipeline is built before the old
+    one is stopped, so a failure keeps the old one running.
+    """
+
+    root = logging.getLogger()
+    if settings == _pipeline.settings:
+        root.setLevel(settings.level)
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    if settings.json_lines:
+        formatter = JsonFormatter()
+    handlers = [_file_handler(settings), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+
+    stop_logging()
+    root.setLevel(settings.level)
+    _pipeline.handler = LazyQueueHandler(log_queue)
+    _pipeline.listener = listener
+    _pipeline.settings = settings
+    root.addHandler(_pipeline.handler)
+
+
+def stop_logging() -> None:
+    """Flushes pending records and removes the queue handler."""
+
+    if _pipeline.handler is not None:
+        logging.getLogger().removeHandler(_pipeline.handler)
+    if _pipeline.listener is not None:
+        _pipeline.listener.stop()
+        for handler in _pipeline.listener.handlers:
+            handler.close()
+
+    _pipeline.handler = None
+    _pipeline.listener = None
+    _pipeline.settings = None
+
+
+atexit.register(stop_logging)
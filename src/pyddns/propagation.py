@@ -0,0 +1,174 @@
+"""
+Propagation Module
+
+Provides `PropagationTracker`, which follows applied changes until resolvers
+return the new value. Each pending record is polled until it is visible, then
+dropped, and the time it took is kept as its propagation latency. While a
+record propagates, resolvers still answering with the old value do not count
+as drift.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+import logging
+import socket
+import time
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from pyddns.deadline import Deadline, DeadlineExceeded, resolve_host
+
+if TYPE_CHECKING:
+    from pyddns.client import DDNSClient
+    from pyddns.reconcile import RecordChange
+
+
+@dataclass
+class _Pending:
+    hostname: str
+    new_ip: str
+    started_at: float
+    next_poll: float
+    poll_every: float
+
+
+@dataclass
+class PropagationTracker:
+    """
+    Polls resolvers for applied changes until the new value is visible.
+
+    Attributes:
+        poll_interval: Longest delay between two polls of a record. Records
+            with a shorter TTL are polled once per TTL.
+        max_wait: Seconds after which a record that is still not visible is
+            given up on.
+        resolve: Resolver used for the polls.
+    """
+
+    poll_interval: float = 30.0
+    max_wait: float = 3600.0
+    resolve: Callable[[str, Optional[Deadline]], str] = resolve_host
+    clock: Callable[[], float] = time.monotonic
+
+    _pending: Dict[Tuple[str, str], _Pending] = field(
+        default_factory=dict, init=False
+    )
+    latencies: Deque[float] = field(
+        default_factory=lambda: deque(maxlen=100), init=False
+    )
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def track(
+        self,
+        service: str,
+        record_name: str,
+        hostname: str,
+        new_ip: str,
+        ttl: Optional[int] = None,
+    ) -> None:
+        """Starts following record_name until hostname resolves to new_ip."""
+
+        now = self.clock()
+        poll_every = min(self.poll_interval, ttl or self.poll_interval)
+        self._pending[(service, record_name)] = _Pending(
+            hostname, new_ip, now, now, max(1.0, poll_every)
+        )
+
+    def track_changes(
+        self, client: "DDNSClient", changes: Iterable["RecordChange"]
+    ) -> None:
+        """
+        Follows the applied changes of client.
+
+        Proxied records are skipped, resolvers return the provider's edge
+        addresses for them and never show the new value.
+        """
+
+        changes = list(changes)
+        records = client.storage.retrieve_records(
+            c.record_name for c in changes
+        )
+        for change in changes:
+            record = records.get(change.record_name)
+            if record is not None and record.proxied:
+                continue
+            self.track(
+                change.service,
+                change.record_name,
+                client.dns_name(change.record_name),
+                change.new_ip,
+                record.ttl if record is not None else None,
+            )
+
+    def expected_ip(self, service: str, record_name: str) -> Optional[str]:
+        """
+        Returns the IP a propagating record was updated to, or None if the
+        record is not being tracked.
+        """
+
+        pending = self._pending.get((service, record_name))
+        return pending.new_ip if pending else None
+
+    def poll(
+        self, deadline: Optional[Deadline] = None
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Resolves the records that are due for a poll.
+
+        Returns (service, record_name, latency) for the records that became
+        visible.
+        """
+
+        visible = []
+        for key, pending in list(self._pending.items()):
+            now = self.clock()
+            if pending.next_poll > now:
+                continue
+
+            elapsed = now - pending.started_at
+            if elapsed > self.max_wait:
+                logging.warning(
+                    "Propagation: %s still not at %s after %.0fs, giving up.",
+                    pending.hostname,
+                    pending.new_ip,
+                    elapsed,
+                )
+                del self._pending[key]
+                continue
+
+            try:
+                answer = self.resolve(pending.hostname, deadline)
+            except DeadlineExceeded:
+                break
+            except socket.gaierror as err:
+                logging.debug(
+                    "Propagation: Lookup for %s failed: %s",
+                    pending.hostname,
+                    err,
+                )
+                answer = None
+
+            if answer != pending.new_ip:
+                pending.next_poll = now + pending.poll_every
+                continue
+
+            del self._pending[key]
+            self.latencies.append(elapsed)
+            visible.append((key[0], key[1], elapsed))
+            logging.info(
+                "Propagation: %s resolves to %s after %.1fs.",
+                pending.hostname,
+                pending.new_ip,
+                elapsed,
+            )
+        return visible
@@ -0,0 +1,600 @@
+"""
+Reconciliation Module
+
+Provides a two-phase plan/apply engine for Dynamic DNS (DDNS) services.
+The `plan` phase gathers the current public IP, the provider state and the
+local database rows for every configured record and produces an immutable
+change set. The `apply` phase executes that change set with as few provider
+calls as possible.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, replace
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from pyddns.client import DDNSClient
+from pyddns.damping import FlapDamper
+from pyddns.deadline import Deadline, DeadlineExceeded
+from pyddns.events import emit
+from pyddns.propagation import PropagationTracker
+from pyddns.tracing import traced
+
+
+@dataclass(frozen=True)
+class RecordState:
+    """
+    Snapshot of a single record as seen by the local database and provider.
+    """
+
+    service: str
+    record_name: str
+    db_ip: Optional[str] = None
+    provider_ip: Optional[str] = None
+    record_id: Optional[str] = None
+    stored: bool = False
+    last_updated: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class DeferredState(RecordState):
+    """
+    A record whose state or update did not finish this cycle, because the
+    deadline passed or its provider failed. It is rescheduled instead of
+    being compared.
+    """
+
+
+@dataclass(frozen=True)
+class RecordChange:
+    """
+    A single pending update of a record to a new IP address.
+
+    reason is either "ip_changed" (the public IP moved away from the database
+    value), "drift" (the provider no longer matches the database value) or
+    "create" (the record is missing and the client auto-creates records).
+    """
+
+    state: RecordState
+    new_ip: str
+    reason: str
+
+    @property
+    def service(self) -> str:
+        """Name of the service owning the record."""
+        return self.state.service
+
+    @property
+    def record_name(self) -> str:
+        """Name of the record to update."""
+        return self.state.record_name
+
+
+@dataclass(frozen=True)
+class ReconcilePlan:
+    """
+    Immutable change set produced by `Reconciler.plan`.
+
+    held contains changes that were deferred by flap damping or update
+    coalescing; they are re-evaluated in the next cycle. deferred contains
+    records that did not fit in the cycle deadline, or whose provider
+    failed, and are rescheduled.
+    missing contains records the provider does not have, including stored
+    ones that were deleted there.
+    """
+
+    current_ip: str
+    changes: Tuple[RecordChange, ...] = ()
+    unchanged: Tuple[RecordState, ...] = ()
+    missing: Tuple[RecordState, ...] = ()
+    held: Tuple[RecordChange, ...] = ()
+    deferred: Tuple[RecordState, ...] = ()
+
+    def is_empty(self) -> bool:
+        """Returns True if the plan does not contain any change."""
+        return not self.changes
+
+    def for_service(self, service: str) -> Tuple[RecordChange, ...]:
+        """Returns the changes belonging to the given service."""
+        return tuple(c for c in self.changes if c.service == service)
+
+    def render(self) -> str:
+        """Returns a human readable diff of the plan, used by --dry-run."""
+
+        lines = [f"Public IP: {self.current_ip}"]
+        for change in self.changes:
+            old_ip = change.state.provider_ip or change.state.db_ip
+            lines.append(
+                f"  ~ {change.service}: {change.record_name} "
+                f"{old_ip} -> {change.new_ip} ({change.reason})"
+            )
+        for change in self.held:
+            lines.append(
+                f"  ? {change.service}: {change.record_name} "
+                f"-> {change.new_ip} held ({change.reason})"
+            )
+        for state in self.deferred:
+            lines.append(
+                f"  > {state.service}: {state.record_name} deferred"
+            )
+        for state in self.missing:
+            lines.append(
+                f"  ! {state.service}: {state.record_name} "
+                "not found at provider"
+            )
+        for state in self.unchanged:
+            lines.append(
+                f"  = {state.service}: {state.record_name} {state.db_ip}"
+            )
+        lines.append(
+            f"{len(self.changes)} to update, {len(self.held)} held, "
+            f"{len(self.deferred)} deferred, {len(self.unchanged)} unchanged, "
+            f"{len(self.missing)} missing."
+        )
+        return "\n".join(lines)
+
+
+def diff_record(
+    state: RecordState, current_ip: str
+) -> Optional[RecordChange]:
+    """
+    Decides whether a record needs to be updated.
+
+    A record that is not yet stored locally trusts the provider value as its
+    database value, the same way `_obtain_record` seeds the database.
+    """
+
+    db_ip = state.db_ip if state.stored else state.provider_ip
+
+    if current_ip != db_ip:
+        return RecordChange(state, current_ip, "ip_changed")
+
+    if db_ip != state.provider_ip:
+        return RecordChange(state, current_ip, "drift")
+
+    return None
+
+
+def dedupe_changes(
+    changes: Iterable[RecordChange],
+) -> Tuple[RecordChange, ...]:
+    """
+    Collapses changes to one per (service, record_name), keeping the last.
+    """
+
+    latest: Dict[Tuple[str, str], RecordChange] = {}
+    for change in changes:
+        latest[(change.service, change.record_name)] = change
+    return tuple(latest.values())
+
+
+def emit_applied(change: RecordChange, new_ip: Optional[str]) -> None:
+    """
+    Emits "drift_repaired" for an applied "drift" change and
+    "record_updated" for any other applied change.
+    """
+
+    if change.reason == "drift":
+        kind, old_ip = "drift_repaired", change.state.provider_ip
+    else:
+        kind, old_ip = "record_updated", change.state.db_ip
+    emit(
+        kind,
+        change.service,
+        change.record_name,
+        old_ip=old_ip,
+        new_ip=new_ip or change.new_ip,
+        reason=change.reason,
+    )
+
+
+@dataclass
+class Reconciler:
+    """
+    Two-phase reconciliation engine over one or more DDNS clients.
+
+    Each client must implement `record_names`, `fetch_state` and
+    `apply_changes`. An optional `FlapDamper` holds back changes until the
+    public IP is stable and coalesces repeated updates of a record.
+
+    budget caps the duration of a cycle in seconds. Records that do not fit
+    are cancelled and reported as deferred, to be retried next cycle. So are
+    the records of a client whose provider call fails, without holding up
+    the other clients.
+
+    An optional `PropagationTracker` follows applied changes until resolvers
+    return them. Until then, a resolver still answering with the old value
+    is not treated as drift.
+
+    Outbox entries that failed max_attempts times are no longer replayed.
+    """
+
+    clients: Sequence[DDNSClient]
+    max_workers: int = 8
+    record_names: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    damper: Optional[FlapDamper] = None
+    budget: Optional[float] = None
+    propagation: Optional[PropagationTracker] = None
+    max_attempts: int = 5
+
+    def _names_for(self, client: DDNSClient) -> Tuple[str, ...]:
+        names = self.record_names.get(client.service_name)
+        if names is None:
+            names = client.record_names()
+        return tuple(names)
+
+    def _allow(self, change: RecordChange) -> bool:
+        if self.damper is None:
+            return True
+        return self.damper.allow_update(change.state.last_updated)
+
+    def _propagating(self, change: RecordChange) -> bool:
+        if self.propagation is None or change.reason != "drift":
+            return False
+        expected = self.propagation.expected_ip(
+            change.service, change.record_name
+        )
+        return expected == change.new_ip
+
+    @staticmethod
+    def _api_errors(client: DDNSClient) -> Tuple[Type[Exception], ...]:
+        # Mocked clients carry no error types of their own.
+        return getattr(type(client), "api_errors", DDNSClient.api_errors)
+
+    def _gather(
+        self, deadline: Deadline, dry_run: bool = False
+    ) -> Tuple[str, List[RecordState]]:
+        """
+        Fetches the public IP and all record states within the deadline.
+
+        Clients that do not answer in time, or whose provider call fails,
+        are abandoned and their records returned as deferred.
+        """
+
+        names = {c.service_name: self._names_for(c) for c in self.clients}
+        workers = max(1, min(self.max_workers, len(self.clients) + 1))
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            ip_future = pool.submit(self.clients[0].get_ipv4, deadline)
+            state_futures = {
+                pool.submit(
+                    client.fetch_state,
+                    names[client.service_name],
+                    deadline,
+                    # Only passed when set, overrides may predate it.
+                    **({"dry_run": True} if dry_run else {}),
+                ): client
+                for client in self.clients
+            }
+            futures: List[Future] = [ip_future, *state_futures]
+            done, _ = wait(futures, timeout=deadline.remaining())
+        finally:
+            # Never block on a hung provider, abandon it instead.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if ip_future not in done:
+            raise DeadlineExceeded("Deadline exceeded retrieving public IP.")
+        current_ip = ip_future.result()
+
+        states: List[RecordState] = []
+        for future, client in state_futures.items():
+            error = future.exception() if future in done else None
+            if future in done and error is None:
+                states.extend(future.result())
+                continue
+            if error is None or isinstance(error, DeadlineExceeded):
+                logging.warning(
+                    "Reconcile: %s did not answer before the deadline, "
+                    "deferring its records.",
+                    client.service_name,
+                )
+            elif isinstance(error, self._api_errors(client)):
+                logging.error(
+                    "Reconcile: Fetching %s records failed, "
+                    "deferring them: %s",
+                    client.service_name,
+                    error,
+                )
+            else:
+                raise error
+
+            states.extend(
+                DeferredState(service=client.service_name, record_name=name)
+                for name in names[client.service_name]
+            )
+
+        return current_ip, states
+
+    @traced("reconcile.plan")
+    def plan(
+        self, deadline: Optional[Deadline] = None, dry_run: bool = False
+    ) -> ReconcilePlan:
+        """
+        Gathers public IP and state of every record concurrently. With
+        dry_run set, the clients leave storage untouched.
+        """
+
+        if not self.clients:
+            raise ValueError("Reconcile: At least one client is required.")
+
+        deadline = deadline or Deadline(self.budget)
+        if self.propagation is not None:
+            self.propagation.poll(deadline)
+        current_ip, states = self._gather(deadline, dry_run)
+
+        target_ip: Optional[str] = current_ip
+        if self.damper is not None:
+            target_ip = self.damper.observe(current_ip)
+
+        creatable = {c.service_name for c in self.clients if c.auto_create}
+        changes = []
+        held = []
+        unchanged = []
+        missing = []
+        deferred = []
+        for state in states:
+            if isinstance(state, DeferredState):
+                deferred.append(state)
+                continue
+
+            if state.provider_ip is None:
+                if target_ip is not None and state.service in creatable:
+                    changes.append(RecordChange(state, target_ip, "create"))
+                else:
+                    missing.append(state)
+                    logging.log(
+                        logging.WARNING if state.stored else logging.DEBUG,
+                        "Reconcile: %s: %s not found at the provider, "
+                        "skipping it.",
+                        state.service,
+                        state.record_name,
+                    )
+                continue
+
+            change = diff_record(state, target_ip or current_ip)
+            if change is None or self._propagating(change):
+                unchanged.append(state)
+            elif target_ip is None or not self._allow(change):
+                held.append(change)
+            else:
+                changes.append(change)
+
+        plan = ReconcilePlan(
+            current_ip=current_ip,
+            changes=dedupe_changes(changes),
+            unchanged=tuple(unchanged),
+            missing=tuple(missing),
+            held=dedupe_changes(held),
+            deferred=tuple(deferred),
+        )
+        logging.debug(
+            "Reconcile: Planned %d change(s), %d held, %d deferred, "
+            "%d unchanged, %d missing.",
+            len(plan.changes),
+            len(plan.held),
+            len(plan.deferred),
+            len(plan.unchanged),
+            len(plan.missing),
+        )
+        return plan
+
+    def _replays(
+        self, client: DDNSClient, plan: ReconcilePlan
+    ) -> List[RecordChange]:
+        """
+        Returns the outbox entries of client that are not covered by plan.
+
+        Entries for records the plan found unchanged or missing are stale and
+        dropped. Entries for records with a planned or held change are left
+        to that change. Entries that failed max_attempts times are marked
+        dead and reported as an error event.
+        """
+
+        service = client.service_name
+        current = {
+            s.record_name: s
+            for s in plan.unchanged + plan.missing
+            if s.service == service
+        }
+        planned = {
+            c.record_name
+            for c in plan.changes + plan.held
+            if c.service == service
+        }
+
+        stale = []
+        dead = []
+        replays = []
+        for name, new_ip, reason, record_id, attempts in (
+            client.storage.pending_changes(service)
+        ):
+            if name in current:
+                stale.append((name, new_ip))
+            elif attempts >= self.max_attempts:
+                dead.append(name)
+                logging.error(
+                    "Reconcile: %s: Giving up on %s -> %s after %d attempts.",
+                    service,
+                    name,
+                    new_ip,
+                    attempts,
+                )
+                emit(
+                    "error",
+                    service,
+                    name,
+                    new_ip=new_ip,
+                    reason="outbox",
+                    error=f"Gave up after {attempts} attempts.",
+                )
+            elif name not in planned:
+                state = RecordState(
+                    service=service,
+                    record_name=name,
+                    record_id=record_id,
+                    stored=reason != "create",
+                )
+                replays.append(RecordChange(state, new_ip, reason))
+
+        if stale:
+            client.storage.complete_changes(service, stale)
+        if dead:
+            client.storage.mark_dead(service, dead)
+        return replays
+
+    def _send(
+        self,
+        client: DDNSClient,
+        batch: Sequence[RecordChange],
+        deadline: Deadline,
+    ) -> Optional[Exception]:
+        """
+        Hands batch to client and settles its outbox entries.
+
+        Returns the error if the provider call failed, after recording the
+        failed attempt.
+        """
+
+        try:
+            client.apply_changes(batch, deadline)
+        except self._api_errors(client) as err:
+            client.storage.fail_changes(
+                client.service_name,
+                [c.record_name for c in batch],
+                str(err) or type(err).__name__,
+            )
+            return err
+
+        client.storage.complete_changes(
+            client.service_name, [(c.record_name, c.new_ip) for c in batch]
+        )
+        if self.propagation is not None:
+            self.propagation.track_changes(client, batch)
+        return None
+
+    @traced("reconcile.apply")
+    def apply(
+        self, plan: ReconcilePlan, deadline: Optional[Deadline] = None
+    ) -> Tuple[RecordChange, ...]:
+        """
+        Executes the change set, handing each client only its own changes.
+
+        Changes are journaled in the outbox before they are sent and removed
+        once they succeeded. Entries left over from earlier failures are sent
+        first, in a batch of their own, so they cannot fail fresh changes.
+
+        Returns the changes that could not be applied, because the deadline
+        passed or the provider call failed. They stay in the outbox.
+        """
+
+        deadline = deadline or Deadline(self.budget)
+        not_applied: List[RecordChange] = []
+
+        for client in self.clients:
+            changes = plan.for_service(client.service_name)
+            states = [c.state for c in changes] + [
+                s for s in plan.unchanged if s.service == client.service_name
+            ]
+            unstored = [
+                (s.record_name, s.provider_ip, s.record_id)
+                for s in states
+                if not s.stored and s.provider_ip is not None
+            ]
+
+            if unstored:
+                client.storage.add_services(client.service_name, unstored)
+
+            replays = self._replays(client, plan)
+            if replays and not deadline.expired():
+                logging.info(
+                    "Reconcile: Replaying %d pending %s change(s).",
+                    len(replays),
+                    client.service_name,
+                )
+                error = self._send(client, replays, deadline)
+                if error is not None:
+                    logging.warning(
+                        "Reconcile: Replaying %s changes failed: %s",
+                        client.service_name,
+                        error,
+                    )
+            if not changes:
+                if not replays:
+                    logging.info(
+                        "Reconcile: No update needed for %s.",
+                        client.service_name,
+                    )
+                continue
+
+            client.storage.enqueue_changes(
+                client.service_name,
+                [
+                    (c.record_name, c.new_ip, c.reason, c.state.record_id)
+                    for c in changes
+                ],
+            )
+
+            if deadline.expired():
+                not_applied.extend(changes)
+                continue
+
+            error = self._send(client, changes, deadline)
+            if error is not None:
+                # A failing provider must not stop the other clients, its
+                # changes stay in the outbox for the next cycle.
+                if not deadline.expired():
+                    logging.error(
+                        "Reconcile: Updating %s records failed: %s",
+                        client.service_name,
+                        error,
+                    )
+                not_applied.extend(changes)
+
+        if not_applied:
+            logging.warning(
+                "Reconcile: Rescheduling %d change(s) not applied this cycle.",
+                len(not_applied),
+            )
+        return tuple(not_applied)
+
+    def replay(self, deadline: Optional[Deadline] = None) -> None:
+        """
+        Sends the changes left in the outbox by earlier failures, as one
+        batch per client, without planning. Failures are logged and the
+        changes kept for the next attempt. Does nothing, quietly, if the
+        outbox is empty.
+        """
+
+        if not any(
+            client.storage.pending_changes(client.service_name)
+            for client in self.clients
+        ):
+            return
+        self.apply(ReconcilePlan(current_ip=""), deadline)
+
+    def run(
+        self, dry_run: bool = False, deadline: Optional[Deadline] = None
+    ) -> ReconcilePlan:
+        """
+        Plans and, unless dry_run is set, applies the resulting change set.
+
+        Changes that could not be applied are moved to the deferred records
+        of the returned plan.
+        """
+
+        deadline = deadline or Deadline(self.budget)
+        plan = self.plan(deadline, dry_run)
+        if dry_run:
+            return plan
+
+        not_applied = self.apply(plan, deadline)
+        if not_applied:
+            plan = replace(
+                plan,
+                changes=tuple(c for c in plan.changes if c not in not_applied),
+                deferred=plan.deferred
+                + tuple(
+                    DeferredState(**asdict(c.state)) for c in not_applied
+                ),
+            )
+        return plan
@@ -0,0 +1,200 @@
+"""
+Record Module
+
+Provides `Record`, the compact, immutable representation of a stored DNS
+record shared by `Storage` and the DDNS clients. Large fleets keep many of
+these in memory, so the type uses __slots__, interns service names and
+stores the IP address as a packed integer.
+"""
+
+import ipaddress
+import sys
+from typing import Any, Iterator, Optional, Sequence, Union
+
+from typing_extensions import TypedDict, Unpack
+
+
+class RecordDetails(TypedDict, total=False):
+    """Provider details of a `Record`, passed as keyword arguments."""
+
+    ttl: Optional[int]
+    proxied: Optional[bool]
+    verified_at: Optional[float]
+
+
+class Record:
+    """
+    A DNS record as stored in the database.
+
+    For compatibility with the (ip, last_updated, record_id) tuples used
+    before, a Record can be indexed and unpacked like one: record[0] is the
+    IP address as a string. It only compares equal to other records.
+
+    Attributes:
+        service: Name of the service owning the record (interned).
+        name: Fully qualified record name.
+        ip: IP address as a string, stored packed as an int.
+        last_updated: SQLite timestamp of the last update, if known.
+        record_id: Provider id of the record, if any.
+        ttl: DNS TTL of the record in seconds, if known.
+        proxied: Whether the provider proxies the record, if known.
+        verified_at: Epoch seconds of the last check against the provider.
+    """
+
+    __slots__ = (
+        "service",
+        "name",
+        "_ip",
+        "_version",
+        "last_updated",
+        "record_id",
+        "ttl",
+        "proxied",
+        "verified_at",
+    )
+
+    service: str
+    name: str
+    last_updated: Optional[str]
+    record_id: Optional[str]
+    ttl: Optional[int]
+    proxied: Optional[bool]
+    verified_at: Optional[float]
+    _ip: Union[int, str]
+    _version: int
+
+    def __init__(
+        self,
+        service: str,
+        name: str,
+        ip: str,
+        last_updated: Optional[str] = None,
+        record_id: Optional[str] = None,
+        **details: Unpack[RecordDetails],
+    ) -> None:
+        try:
+            address = ipaddress.ip_address(ip)
+            packed: Union[int, str] = int(address)
+            version: int = address.version
+        except ValueError:
+            # Keep values that are not IP addresses as they are.
+            packed, version = ip, 0
+
+        setter = object.__setattr__
+        setter(self, "service", sys.intern(service))
+        setter(self, "name", name)
+        setter(self, "_ip", packed)
+        setter(self, "_version", version)
+        setter(self, "last_updated", last_updated)
+        setter(self, "record_id", record_id)
+        proxied = details.get("proxied")
+        setter(self, "ttl", details.get("ttl"))
+        setter(self, "proxied", None if proxied is None else bool(proxied))
+        setter(self, "verified_at", details.get("verified_at"))
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Record":
+        """
+        Builds a record from a (service, name, ip, last_updated, record_id,
+        ttl, proxied, verified_at) row.
+        """
+        return cls(
+            row[0],
+            row[1],
+            row[2],
+            row[3],
+            row[4],
+            ttl=row[5],
+            proxied=row[6],
+            verified_at=row[7],
+        )
+
+    @property
+    def ip(self) -> str:
+        """The IP address as a string."""
+        if self._version == 4:
+            return str(ipaddress.IPv4Address(self._ip))
+        if self._version == 6:
+            return str(ipaddress.IPv6Address(self._ip))
+        return str(self._ip)
+
+    def trusted_until(self) -> Optional[float]:
+        """
+        Epoch seconds until which the verified value can be trusted without
+        asking the provider again: the last check plus the TTL. Resolvers
+        cache the value that long anyway.
+        """
+        if self.verified_at is None or not self.ttl:
+            return None
+        return self.verified_at + self.ttl
+
+    def _astuple(self) -> tuple:
+        return (self.ip, self.last_updated, self.record_id)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        raise AttributeError(f"Record is immutable, cannot set {key}")
+
+    def __delattr__(self, key: str) -> None:
+        raise AttributeError(f"Record is immutable, cannot delete {key}")
+
+    def __getitem__(self, index: Any) -> Any:
+        return self._astuple()[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._astuple())
+
+    def __len__(self) -> int:
+        return 3
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Record):
+            return (
+                self.service,
+                self.name,
+                self._ip,
+                self._version,
+                self.last_updated,
+                self.record_id,
+                self.ttl,
+                self.proxied,
+                self.verified_at,
+            ) == (
+                other.service,
+                other.name,
+                other._ip,
+                other._version,
+                other.last_updated,
+                other.record_id,
+                other.ttl,
+                other.proxied,
+                other.verified_at,
+            )
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.service, self.name, self._ip, self.record_id))
+
+    def __repr__(self) -> str:
+        return (
+            f"Record(service={self.service!r}, name={self.name!r}, "
+            f"ip={self.ip!r}, last_updated={self.last_updated!r}, "
+            f"record_id={self.record_id!r}, ttl={self.ttl!r}, "
+            f"proxied={self.proxied!r}, verified_at={self.verified_at!r})"
+        )
+
+    def __reduce__(self) -> Any:
+        return (
+            Record.from_row,
+            (
+                (
+                    self.service,
+                    self.name,
+                    self.ip,
+                    self.last_updated,
+                    self.record_id,
+                    self.ttl,
+                    self.proxied,
+                    self.verified_at,
+                ),
+            ),
+        )
@@ -0,0 +1,236 @@
+"""
+Scheduler Module
+
+Provides adaptive per-record check scheduling. Records are kept in a priority
+queue ordered by the time they are next due. A record that has not changed
+for a long time is checked less often, within configurable bounds, while a
+record that just changed is checked again after the minimum interval.
+"""
+
+from dataclasses import InitVar, dataclass, field
+from datetime import datetime
+import heapq
+import logging
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pyddns.damping import FlapDamper, parse_timestamp
+from pyddns.reconcile import ReconcilePlan
+from pyddns.storage import Storage
+
+RecordKey = Tuple[str, str]
+
+
+@dataclass
+class _DueQueue:
+    """
+    Heap of due times with lazy removal. due holds the live due time of
+    each key, heap entries that no longer match it are skipped.
+    """
+
+    heap: List[Tuple[float, int, RecordKey]] = field(default_factory=list)
+    due: Dict[RecordKey, float] = field(default_factory=dict)
+    counter: int = 0
+
+    def push(self, key: RecordKey, due: float) -> None:
+        """Sets the due time of key, replacing any earlier entry."""
+
+        self.due[key] = due
+        self.counter += 1
+        heapq.heappush(self.heap, (due, self.counter, key))
+
+    def peek(self) -> Optional[float]:
+        """Returns the earliest live due time, or None if empty."""
+
+        while self.heap:
+            due, _, key = self.heap[0]
+            if self.due.get(key) == due:
+                return due
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_until(self, now: float) -> List[RecordKey]:
+        """Removes and returns the keys due at or before now."""
+
+        keys = []
+        while self.heap and self.heap[0][0] <= now:
+            when, _, key = heapq.heappop(self.heap)
+            if self.due.get(key) != when:
+                continue
+            del self.due[key]
+            keys.append(key)
+        return keys
+
+
+@dataclass
+class _IPWatch:
+    """The public IP seen in the last cycle, and the damper settling on it."""
+
+    last_ip: Optional[str] = None
+    damper: Optional[FlapDamper] = None
+
+    @property
+    def settling(self) -> bool:
+        """Returns True while the damper holds back a new IP."""
+        return self.damper is not None and self.damper.settling
+
+
+@dataclass
+class CheckScheduler:
+    """
+    Priority queue of (service, record name) pairs keyed on next due time.
+
+    The interval of a record is change_factor times the time since it was
+    last updated according to storage, clamped to [min_interval,
+    max_interval]. Records that changed, were held or were deferred in the
+    last cycle, and every record after the public IP moved, are due again
+    after min_interval. So is every checked record while the optional damper
+    is settling on a new IP, as it only samples the IP in those checks.
+
+    Attributes:
+        storage: Storage to read last_updated timestamps from.
+        min_interval: Shortest time in seconds between checks of a record.
+        max_interval: Longest time in seconds between checks of a record.
+        change_factor: Fraction of the stable time used as interval.
+        damper: Flap damper of the reconciler, if any.
+    """
+
+    storage: Storage
+    min_interval: float = 60.0
+    max_interval: float = 3600.0
+    change_factor: float = 0.25
+    clock: Callable[[], float] = time.time
+    damper: InitVar[Optional[FlapDamper]] = None
+
+    _queue: _DueQueue = field(default_factory=_DueQueue, init=False)
+    _ip: _IPWatch = field(default_factory=_IPWatch, init=False)
+
+    def __post_init__(self, damper: Optional[FlapDamper]) -> None:
+        self._ip.damper = damper
+
+    def __len__(self) -> int:
+        return len(self._queue.due)
+
+    def schedule(self, key: RecordKey, due: float) -> None:
+        """(Re)schedules a record, replacing any earlier entry."""
+        self._queue.push(key, due)
+
+    def sync(self, records: Mapping[str, Iterable[str]]) -> None:
+        """
+        Aligns the queue with the configured records. New records are due
+        immediately, records no longer configured are dropped.
+        """
+
+        wanted = {
+            (service, name)
+            for service, names in records.items()
+            for name in names
+        }
+        now = self.clock()
+        scheduled = self._queue.due
+        for key in wanted - scheduled.keys():
+            self.schedule(key, now)
+        for key in scheduled.keys() - wanted:
+            # Stale heap entries are skipped when popped.
+            del scheduled[key]
+
+    def next_due(self) -> Optional[float]:
+        """Returns the time the next record is due, or None if empty."""
+        return self._queue.peek()
+
+    def pop_due(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        Removes and returns all records that are due, grouped by service.
+        """
+
+        due: Dict[str, List[str]] = {}
+        for service, name in self._queue.pop_until(self.clock()):
+            due.setdefault(service, []).append(name)
+        return {service: tuple(names) for service, names in due.items()}
+
+    def observe_ip(self, ip_address: Optional[str]) -> bool:
+        """
+        Records the public IP of the last cycle. If it moved, every record
+        is made due now and True is returned.
+        """
+
+        if ip_address is None:
+            return False
+        last_ip = self._ip.last_ip
+        changed = last_ip is not None and ip_address != last_ip
+        self._ip.last_ip = ip_address
+        if changed:
+            logging.info(
+                "Scheduler: Public IP changed, checking all %d record(s).",
+                len(self),
+            )
+            now = self.clock()
+            for key in list(self._queue.due):
+                self.schedule(key, now)
+        return changed
+
+    def interval_for(
+        self, last_updated: Union[str, datetime, None]
+    ) -> float:
+        """
+        Returns the check interval of a record last updated at last_updated.
+        """
+
+        updated_at = parse_timestamp(last_updated)
+        if updated_at is None:
+            return self.min_interval
+        stable_for = max(0.0, self.clock() - updated_at.timestamp())
+        return min(
+            self.max_interval,
+            max(self.min_interval, stable_for * self.change_factor),
+        )
+
+    def reschedule(
+        self,
+        checked: Mapping[str, Iterable[str]],
+        plan: Optional[ReconcilePlan] = None,
+    ) -> None:
+        """
+        Schedules the records checked in a cycle according to its plan. If
+        the cycle failed (plan is None) they are retried after min_interval.
+        """
+
+        now = self.clock()
+        keys = [
+            (service, name)
+            for service, names in checked.items()
+            for name in names
+        ]
+
+        if plan is None:
+            for key in keys:
+                self.schedule(key, now + self.min_interval)
+            return
+
+        # Records checked in this cycle already saw the new IP, only the
+        # ones still queued need to be pulled forward.
+        self.observe_ip(plan.current_ip)
+
+        hot = {(c.service, c.record_name) for c in plan.changes + plan.held}
+        hot.update((s.service, s.record_name) for s in plan.deferred)
+        if self._ip.settling:
+            hot.update(keys)
+        stored = self.storage.retrieve_records(
+            key[1] for key in keys if key not in hot
+        )
+
+        for key in keys:
+            interval = self.min_interval
+            record = stored.get(key[1])
+            if key not in hot and record and record.service == key[0]:
+                interval = self.interval_for(record.last_updated)
+            self.schedule(key, now + interval)
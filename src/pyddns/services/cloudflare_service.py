@@ -6,23 +6,62 @@ on Cloudflare. It allows users to update DNS records automatically based on
 the current IP address, leveraging the Cloudflare API.
 """
 
+import ipaddress
 import logging
-import socket
-from typing import Callable, Optional, Any, Tuple
+import time
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Any,
+    Set,
+    Tuple,
+    cast,
+)
 from datetime import datetime
 
 from cloudflare import (
     Cloudflare,
     NOT_GIVEN,
     APIConnectionError,
+    APIError,
     APIStatusError,
     RateLimitError,
 )
-from cloudflare.types.dns import RecordResponse
+from cloudflare.types.dns import (
+    BatchPatchParam,
+    RecordParam,
+    RecordResponse,
+)
 
-from pyddns.config import Config
+from pyddns.config import Config, ConfigSnapshot
 from pyddns.storage import Storage
 from pyddns.client import DDNSClient
+from pyddns.deadline import Deadline, resolve_host
+from pyddns.events import emit
+from pyddns.record import Record
+from pyddns.tracing import span, traced
+from pyddns.reconcile import (
+    RecordChange,
+    RecordState,
+    Reconciler,
+    dedupe_changes,
+    emit_applied,
+)
+
+# Cloudflare reports "automatic" TTLs, and those of proxied records, as 1.
+AUTOMATIC_TTL = 300
+
+
+def effective_ttl(ttl: Optional[float]) -> Optional[int]:
+    """Returns the TTL in seconds resolvers apply to a Cloudflare record."""
+    if ttl is None:
+        return None
+    return AUTOMATIC_TTL if int(ttl) == 1 else int(ttl)
 
 
 class CloudflareDNS(DDNSClient):
@@ -33,27 +72,82 @@ class CloudflareDNS(DDNSClient):
     for domains hosted on Cloudflare.
     """
 
+    service_name = "Cloudflare"
+    api_errors = (APIError, OSError)
+
     def __init__(
         self, api_token: Optional[str] = None, zone_id: Optional[str] = None
     ) -> None:
         logging.debug("CloudFlare DNS: Initializing Cloudflare_DDNS client.")
-        self.service_name = "Cloudflare"
         self.config = Config()
         self.storage = Storage()
+        self._explicit = {"api_token": api_token, "zone_id": zone_id}
+
+        if not self.zone_id or not self.api_token:
+            raise ValueError(
+                "CloudFlare DNS: API token and Zone ID must be provided."
+            )
 
-        self.zone_id: str = zone_id or self.config.get(
+        self._load_options()
+
+        self.cf_client = self._build_client()
+        self.config.subscribe(self._on_config_change)
+
+    @property
+    def zone_id(self) -> str:
+        """The zone passed to __init__, else the one of the config."""
+        return self._explicit["zone_id"] or self.config.get(
             self.service_name, "zone_id"
         )
-        self.api_token: str = api_token or self.config.get(
+
+    @property
+    def api_token(self) -> str:
+        """The API token passed to __init__, else the one of the config."""
+        return self._explicit["api_token"] or self.config.get(
             self.service_name, "api_token"
         )
 
-        if not self.zone_id or not self.api_token:
-            raise ValueError(
-                "CloudFlare DNS: API token and Zone ID must be provided."
-            )
+    def _build_client(self) -> Cloudflare:
+        """
+        Builds the SDK client. The SDK retries a timed out call by default,
+        which would let a single call run several times past its deadline
+        timeout, so retries are left to the next cycle and the outbox.
+        """
+        return Cloudflare(api_token=self.api_token, max_retries=0)
+
+    def _load_options(self) -> None:
+        """Reads the optional settings of the Cloudflare section."""
+
+        self.auto_create = self.config.get_bool(
+            self.service_name, "auto_create", False
+        )
+        self.negative_cache_ttl: float = self.config.get_float(
+            self.service_name, "negative_cache_ttl", 3600.0
+        )
+        self.proxied = self.config.get_bool(
+            self.service_name, "proxied", True
+        )
+
+    def _on_config_change(
+        self, snapshot: ConfigSnapshot, changed: FrozenSet[str]
+    ) -> None:
+        """
+        Applies a reloaded Cloudflare section without recreating the client.
 
-        self.cf_client = Cloudflare(api_token=self.api_token)
+        zone_id and api_token are read from the current snapshot. The SDK
+        client, and with it its connection pool, is only rebuilt when the
+        API token changes.
+        """
+
+        provider = snapshot.providers.get(self.service_name)
+        if self.service_name not in changed or provider is None:
+            return
+
+        if self.api_token != self.cf_client.api_token:
+            self.cf_client = self._build_client()
+            logging.info("CloudFlare DNS: API token changed, client rebuilt.")
+
+        self._load_options()
 
     @staticmethod
     def cf_error_handler(func: Callable) -> Callable:
@@ -75,12 +169,24 @@ class CloudflareDNS(DDNSClient):
                     f"The server could not be reached: {e.__cause__}"
                 )
                 logging.error("CloudFlare DNS: %s", error_message)
+                emit(
+                    "error",
+                    "Cloudflare",
+                    reason=func.__name__,
+                    error=error_message,
+                )
                 raise
             except RateLimitError:
                 error_message = (
                     "A 429 status code was received; we should back off a bit."
                 )
                 logging.warning("CloudFlare DNS: %s", error_message)
+                emit(
+                    "error",
+                    "Cloudflare",
+                    reason=func.__name__,
+                    error=error_message,
+                )
                 raise
             except APIStatusError as e:
                 error_message = (
@@ -88,14 +194,343 @@ class CloudflareDNS(DDNSClient):
                         f"Response:{e.response}"
                 )
                 logging.error("CloudFlare DNS: %s", error_message)
+                emit(
+                    "error",
+                    "Cloudflare",
+                    reason=func.__name__,
+                    error=error_message,
+                )
                 raise
 
         return wrapper
 
+    def record_names(self) -> Tuple[str, ...]:
+        """Returns the record names configured in the Cloudflare section."""
+        return self.config.get_list(self.service_name, "record_name")
+
+    @staticmethod
+    def _timeout(deadline: Optional[Deadline], default: float = 60.0) -> Any:
+        """Returns the SDK timeout for the next call within the deadline."""
+        return deadline.timeout(default) if deadline else NOT_GIVEN
+
+    def _iter_zone_records(
+        self, deadline: Optional[Deadline] = None
+    ) -> Iterator[RecordResponse]:
+        """
+        Iterates over every record in the zone, following pagination.
+
+        Every page is requested with the time left in the deadline, so a
+        large zone cannot run past it. Listing stops at the last page, or
+        at the first empty one.
+        """
+        page_number = 1
+        while True:
+            with span("cloudflare.list", page=page_number):
+                page = self.cf_client.dns.records.list(
+                    zone_id=self.zone_id,
+                    page=page_number,
+                    timeout=self._timeout(deadline),
+                )
+            records = list(page.result or ())
+            yield from records
+            if not records or not page.has_next_page():
+                return
+            page_number += 1
+
     @cf_error_handler
+    def seed(
+        self,
+        record_names: Optional[Iterable[str]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> int:
+        """
+        Imports A records of the zone into the database with one listing.
+
+        If record_names is None every A record of the zone is imported.
+        """
+
+        wanted = set(record_names) if record_names is not None else None
+        listed = [
+            record
+            for record in self._iter_zone_records(deadline)
+            if record.type == "A"
+            and (wanted is None or record.name in wanted)
+        ]
+        count = self.storage.upsert_services(
+            self.service_name,
+            [
+                (record.name, record.content, record.id)
+                for record in listed
+                if record.name and record.content
+            ],
+        )
+        self._mark_verified(listed)
+        return count
+
+    @cf_error_handler
+    def fetch_state(
+        self,
+        record_names: Iterable[str],
+        deadline: Optional[Deadline] = None,
+        dry_run: bool = False,
+    ) -> Tuple[RecordState, ...]:
+        """
+        Returns the state of the given A records.
+
+        Uses a single database query and a single zone listing, regardless
+        of the number of records. The listing is skipped when every record
+        was verified within its TTL or was found missing within
+        negative_cache_ttl. Records absent from a listing are cached as
+        missing, unless dry_run is set.
+        """
+
+        names = tuple(record_names)
+        stored = self.storage.retrieve_records(names)
+        wanted = set(names)
+
+        now = time.time()
+        provider: Dict[str, Record] = {
+            name: record
+            for name, record in stored.items()
+            if (record.trusted_until() or 0) > now
+        }
+        cached_missing = {
+            name
+            for name in wanted - provider.keys()
+            if self.storage.is_missing(
+                self.service_name, name, self.negative_cache_ttl
+            )
+        }
+        if wanted <= provider.keys() | cached_missing:
+            logging.debug(
+                "CloudFlare DNS: %d record(s) verified within their TTL, "
+                "%d cached as missing, skipping the zone listing.",
+                len(provider),
+                len(cached_missing),
+            )
+        else:
+            # Keep compact records only, the SDK objects are released page
+            # by page while the listing is streamed.
+            provider = {}
+            for record in self._iter_zone_records(deadline):
+                if record.name in wanted and record.type == "A":
+                    provider[record.name] = Record(
+                        self.service_name,
+                        record.name,
+                        record.content or "",
+                        record_id=record.id,
+                        ttl=effective_ttl(record.ttl),
+                        proxied=record.proxied,
+                    )
+            logging.debug(
+                "CloudFlare DNS: Found %d of %d records in zone.",
+                len(provider),
+                len(names),
+            )
+            if not dry_run:
+                self._record_listing(
+                    wanted, stored, provider, cached_missing
+                )
+
+        states = []
+        for name in names:
+            local = stored.get(name)
+            remote = provider.get(name)
+            states.append(
+                RecordState(
+                    service=self.service_name,
+                    record_name=name,
+                    db_ip=local.ip if local else None,
+                    provider_ip=remote.ip if remote else None,
+                    # A stored id of a record that is gone is stale.
+                    record_id=remote.record_id if remote else None,
+                    stored=local is not None,
+                    last_updated=local.last_updated if local else None,
+                )
+            )
+        return tuple(states)
+
+    def _record_listing(
+        self,
+        wanted: Set[str],
+        stored: Dict[str, Record],
+        listed: Dict[str, Record],
+        cached_missing: Set[str],
+    ) -> None:
+        """
+        Caches the wanted records absent from a zone listing as missing, and
+        marks the listed ones matching the database as verified.
+        """
+
+        for name in wanted - listed.keys():
+            self.storage.mark_missing(self.service_name, name)
+        for name in cached_missing & listed.keys():
+            self.storage.clear_missing(self.service_name, name)
+        self.storage.mark_verified(
+            self.service_name,
+            [
+                (name, remote.ttl, remote.proxied)
+                for name, remote in listed.items()
+                if name in stored and stored[name].ip == remote.ip
+            ],
+        )
+
+    @cf_error_handler
+    def apply_changes(
+        self,
+        changes: Iterable[RecordChange],
+        deadline: Optional[Deadline] = None,
+    ) -> None:
+        """
+        Applies all changes with a single batch call to the Cloudflare API.
+        """
+
+        changes = dedupe_changes(changes)
+        if not changes:
+            return
+        by_name = {change.record_name: change for change in changes}
+
+        comment = f"Updated on {datetime.now()} by py_ddns."
+        patches: List[BatchPatchParam] = [
+            cast(
+                BatchPatchParam,
+                {
+                    "id": change.state.record_id,
+                    "type": "A",
+                    "name": change.record_name,
+                    "content": change.new_ip,
+                    "comment": comment,
+                },
+            )
+            for change in changes
+            if change.reason != "create"
+        ]
+        posts: List[RecordParam] = [
+            self._new_record_params(change.record_name, change.new_ip)
+            for change in changes
+            if change.reason == "create"
+        ]
+        logging.info(
+            "CloudFlare DNS: Sending batch with %d update(s), %d creation(s).",
+            len(patches),
+            len(posts),
+        )
+        with span("cloudflare.batch", patches=len(patches), posts=len(posts)):
+            response = self.cf_client.dns.records.batch(
+                zone_id=self.zone_id,
+                patches=patches or NOT_GIVEN,
+                posts=posts or NOT_GIVEN,
+                timeout=self._timeout(deadline),
+            )
+
+        if response is None:
+            logging.error(
+                "CloudFlare DNS: No response received from Cloudflare."
+            )
+            return
+
+        if response.patches:
+            self.storage.update_ips(
+                self.service_name,
+                [
+                    (record.name, record.content)
+                    for record in response.patches
+                    if record.name
+                ],
+            )
+            self._mark_verified(response.patches)
+            for record in response.patches:
+                logging.info(
+                    "CloudFlare DNS: Updated %s to new IP: %s.",
+                    record.name,
+                    record.content,
+                )
+                if record.name in by_name:
+                    emit_applied(by_name[record.name], record.content)
+
+        if response.posts:
+            # Records that vanished from the zone may still be stored.
+            self.storage.upsert_services(
+                self.service_name,
+                [
+                    (record.name, record.content, record.id)
+                    for record in response.posts
+                    if record.name and record.content
+                ],
+            )
+            self._mark_verified(response.posts)
+            for record in response.posts:
+                if record.name:
+                    self.storage.clear_missing(self.service_name, record.name)
+                logging.info(
+                    "CloudFlare DNS: Created %s with IP: %s.",
+                    record.name,
+                    record.content,
+                )
+                if record.name in by_name:
+                    emit_applied(by_name[record.name], record.content)
+
+    def _mark_verified(self, records: Iterable[RecordResponse]) -> None:
+        """Stores TTL and proxied flag of records returned by the API."""
+        self.storage.mark_verified(
+            self.service_name,
+            [
+                (record.name, effective_ttl(record.ttl), record.proxied)
+                for record in records
+                if record.name
+            ],
+        )
+
+    def _new_record_params(
+        self, record_name: str, ip_address: str
+    ) -> RecordParam:
+        """
+        Returns the parameters for a new A or AAAA record for ip_address.
+        """
+
+        version = ipaddress.ip_address(ip_address).version
+        return cast(
+            RecordParam,
+            {
+                "type": "A" if version == 4 else "AAAA",
+                "name": record_name,
+                "content": ip_address,
+                "ttl": 1,
+                "proxied": self.proxied,
+                "comment": f"Created on {datetime.now()} by py_ddns.",
+            },
+        )
+
+    @cf_error_handler
+    def _create_record(
+        self,
+        record_name: str,
+        ip_address: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[RecordResponse]:
+        """
+        Creates a missing record and removes it from the negative cache.
+        """
+
+        logging.info(
+            "CloudFlare DNS: Creating missing record %s with IP: %s.",
+            record_name,
+            ip_address,
+        )
+        with span("cloudflare.create", record=record_name):
+            record = self.cf_client.dns.records.create(
+                zone_id=self.zone_id,
+                timeout=self._timeout(deadline),
+                **self._new_record_params(record_name, ip_address),
+            )
+        self.storage.clear_missing(self.service_name, record_name)
+        return record
+
+    @cf_error_handler
+    @traced("cloudflare.obtain_record")
     def _obtain_record(
-        self, record_name: str
-    ) -> Optional[Tuple[str, datetime, Optional[str]]]:
+        self, record_name: str, deadline: Optional[Deadline] = None
+    ) -> Optional[Record]:
         """
         Obtains requested record by name, ex: example.com
 
@@ -111,9 +546,7 @@ class CloudflareDNS(DDNSClient):
         logging.debug(
             "CloudFlare DNS: Obtaining %s from the database.", record_name
         )
-        check_storage: Tuple[str, datetime, str] = (
-            self.storage.retrieve_record(record_name)
-        )
+        check_storage = self.storage.retrieve_record(record_name)
 
         if check_storage is not None:
             logging.debug(
@@ -121,33 +554,57 @@ class CloudflareDNS(DDNSClient):
             )
             return check_storage
 
-        result = self.cf_client.dns.records.list(zone_id=self.zone_id).result
-        logging.debug("CloudFlare DNS: Retrieved from cloudflare: %s", result)
-        records: dict[str, RecordResponse] = {
-            record.name or "domain": record for record in result
-        }
+        if self.storage.is_missing(
+            self.service_name, record_name, self.negative_cache_ttl
+        ):
+            logging.debug(
+                "CloudFlare DNS: %s is cached as missing, skipping lookup.",
+                record_name,
+            )
+            return None
 
-        domain_record = records.get(record_name)
+        domain_record: Optional[RecordResponse] = next(
+            (
+                record
+                for record in self._iter_zone_records(deadline)
+                if record.name == record_name and record.type == "A"
+            ),
+            None,
+        )
+
+        if domain_record is None and self.auto_create:
+            domain_record = self._create_record(
+                record_name, self.get_ipv4(deadline), deadline
+            )
 
         if domain_record is None:
-            logging.debug("CloudFlare DNS: Domain Record is None")
-            return domain_record
+            logging.warning(
+                "CloudFlare DNS: %s not found in zone, caching for %.0fs.",
+                record_name,
+                self.negative_cache_ttl,
+            )
+            self.storage.mark_missing(self.service_name, record_name)
+            return None
 
         self.storage.add_service(
             self.service_name,
-            domain_record.name,
-            domain_record.content,
+            record_name,
+            domain_record.content or "",
             domain_record.id,
         )
+        self._mark_verified([domain_record])
         logging.info("CloudFlare DNS:  Added Service to database")
         return self.storage.retrieve_record(record_name)
 
     @cf_error_handler
-    def check_cloudflare_ip(self, record_name: str) -> Optional[str]:
+    def check_cloudflare_ip(
+        self, record_name: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
         """
         Checks the A record IP address in cloudflare utilizing the API
 
-        This is recommended if you have a proxied connection.
+        This is recommended if you have a proxied connection. A record that
+        was verified within its TTL is answered from the database.
         """
 
         if record_name is None:
@@ -159,20 +616,42 @@ class CloudflareDNS(DDNSClient):
         response = self.storage.retrieve_record(record_name)
 
         if not response:
-            response = self._obtain_record(record_name)
+            response = self._obtain_record(record_name, deadline)
 
-        record_id = response[2]
-        api_res = self.cf_client.dns.records.get(
-            zone_id=self.zone_id, dns_record_id=record_id
-        )
+        if not response:
+            logging.error(
+                "CloudFlare DNS: No record found for %s.", record_name
+            )
+            return None
+
+        if (response.trusted_until() or 0) > time.time():
+            return response.ip
+
+        record_id = response.record_id
+        if record_id is None:
+            logging.error(
+                "CloudFlare DNS: No record id stored for %s.", record_name
+            )
+            return None
+
+        with span("cloudflare.get", record=record_name):
+            api_res = self.cf_client.dns.records.get(
+                zone_id=self.zone_id,
+                dns_record_id=record_id,
+                timeout=self._timeout(deadline),
+            )
 
         if not api_res:
             logging.error("Cloudflare DNS: API call failed.")
             return None
 
+        if api_res.content == response.ip:
+            self._mark_verified([api_res])
         return api_res.content
 
-    def cloudflare_dns_lookup(self, record_name: str) -> str:
+    def cloudflare_dns_lookup(
+        self, record_name: str, deadline: Optional[Deadline] = None
+    ) -> str:
         """
         Performs a DNS lookup for the record name for Cloudflare.
 
@@ -181,12 +660,18 @@ class CloudflareDNS(DDNSClient):
         logging.debug(
             "CloudFlare DNS: Performing DNS lookup for %s", record_name
         )
-        return socket.gethostbyname(record_name)
+        return resolve_host(record_name, deadline)
 
-    def check_and_update_dns(self, record_name: Optional[str] = None) -> None:
+    def check_and_update_dns(
+        self,
+        record_name: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> None:
         """
         Compares the actual Cloudflare A record with the local database record.
         If they are different, updates Cloudflare with the current IP address.
+
+        Runs a single-record plan/apply cycle, so the record is looked up once.
         """
         record_name = record_name or self.config.get(
             self.service_name, "record_name"
@@ -195,65 +680,21 @@ class CloudflareDNS(DDNSClient):
         if not record_name:
             raise ValueError("CloudFlare DNS: Record name cannot be None")
 
-        logging.debug(
-            "CloudFlare DNS: Checking current IP for %s", record_name
-        )
-        cloudflare_ip = self.check_cloudflare_ip(record_name)
-        logging.debug(
-            "CloudFlare DNS: Current IP for %s is %s",
-            record_name,
-            cloudflare_ip,
-        )
-
-        record: Optional[Tuple[str, datetime, str]] = self._obtain_record(
-            record_name
-        )
-
-        if not record:
-            logging.error(
-                "CloudFlare DNS: No record found for %s.", record_name
-            )
-            return
-
-        current_ip = self.get_ipv4()
-        db_ip = record[0]
-        logging.debug("CloudFlare DNS: IP from database is %s", db_ip)
-
-        if current_ip != db_ip:
-            logging.info(
-                "CloudFlare DNS: Local IP has changed from %s to %s,"
-                "updating Cloudflare.",
-                db_ip,
-                current_ip,
-            )
-            self.update_dns(current_ip, record_name)
-            return
-
-        if db_ip != cloudflare_ip:
-            logging.info(
-                "CloudFlare DNS: A record has changed from %s to %s for %s,"
-                "updating Cloudflare",
-                db_ip,
-                cloudflare_ip,
-                record_name,
-            )
-            self.update_dns(current_ip, record_name)
-            return
-
-        logging.info(
-            "CloudFlare DNS: No update needed for %s - IP is still %s",
-            record_name,
-            db_ip,
-        )
-        return
+        Reconciler(
+            [self], record_names={self.service_name: (record_name,)}
+        ).run(deadline=deadline)
 
     @cf_error_handler
     def update_dns(
-        self, ip_address: str, record_name: Optional[str] = None
+        self,
+        ip_address: str,
+        record_name: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
     ) -> None:
         """
         Updates IP address for specified record
         Automatically infers record_name if it is defined in the ddns.ini file.
+        Every API call is bounded by the time left in deadline.
         """
         record_name = record_name or self.config.get(
             self.service_name, "record_name"
@@ -268,9 +709,7 @@ class CloudflareDNS(DDNSClient):
             ip_address,
         )
 
-        record: Optional[Tuple[str, datetime, str]] = self._obtain_record(
-            record_name
-        )
+        record = self._obtain_record(record_name, deadline)
 
         if not record:
             logging.error(
@@ -278,18 +717,33 @@ class CloudflareDNS(DDNSClient):
             )
             return
 
-        record_id: str = record[2]
+        record_id = record.record_id
 
-        comment = f"Updated on {datetime.now()} by py_ddns."
-        response = self.cf_client.dns.records.update(
-            content=ip_address,
-            zone_id=self.zone_id,
-            type="A",
-            proxied=True,
-            name=record_name or NOT_GIVEN,
-            dns_record_id=record_id,
-            comment=comment,
+        self.storage.enqueue_changes(
+            self.service_name, [(record_name, ip_address, "update", record_id)]
         )
+        comment = f"Updated on {datetime.now()} by py_ddns."
+        try:
+            with span("cloudflare.update", record=record_name):
+                response = self.cf_client.dns.records.update(
+                    content=ip_address,
+                    zone_id=self.zone_id,
+                    type="A",
+                    proxied=(
+                        self.proxied
+                        if record.proxied is None
+                        else record.proxied
+                    ),
+                    name=record_name or NOT_GIVEN,
+                    dns_record_id=record_id,
+                    comment=comment,
+                    timeout=self._timeout(deadline),
+                )
+        except APIError as err:
+            self.storage.fail_changes(
+                self.service_name, [record_name], str(err)
+            )
+            raise
 
         if response is None:
             logging.error(
@@ -300,8 +754,20 @@ class CloudflareDNS(DDNSClient):
         self.storage.update_ip(
             self.service_name, record_name, response.content
         )
+        self._mark_verified([response])
+        self.storage.complete_changes(
+            self.service_name, [(record_name, ip_address)]
+        )
         logging.info(
             "CloudFlare DNS: Updated %s to new IP: %s.",
             record_name,
             ip_address,
         )
+        emit(
+            "record_updated",
+            self.service_name,
+            record_name,
+            old_ip=record.ip,
+            new_ip=response.content,
+            reason="update",
+        )
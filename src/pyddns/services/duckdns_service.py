@@ -7,16 +7,50 @@ with the DuckDNS API to update DNS records based on the current public IPv4
 address.
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 import logging
 import socket
-from typing import Optional, Tuple
-from datetime import datetime
+import time
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import requests
 
-from pyddns.config import Config
+from pyddns.config import Config, ConfigSnapshot
 from pyddns.storage import Storage
 from pyddns.client import DDNSClient
+from pyddns.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    call_within,
+    resolve_host,
+)
+from pyddns.events import emit
+from pyddns.record import Record
+from pyddns.tracing import span
+from pyddns.reconcile import (
+    DeferredState,
+    RecordChange,
+    RecordState,
+    Reconciler,
+    dedupe_changes,
+    emit_applied,
+)
+
+# DuckDNS serves its records with a fixed TTL. The API does not report it.
+DUCKDNS_TTL = 60
+
+
+class DuckDNSError(Exception):
+    """Raised when DuckDNS answers an update with anything but OK."""
 
 
 class DuckDNS(DDNSClient):
@@ -27,6 +61,8 @@ class DuckDNS(DDNSClient):
     for domains hosted on DuckDNS."
     """
 
+    api_errors = (requests.RequestException, DuckDNSError, OSError)
+
     def __init__(self, token: Optional[str] = None):
         logging.debug("DuckDNS: Initializing DuckDNS client.")
         self.url = "https://www.duckdns.org/update"
@@ -35,10 +71,262 @@ class DuckDNS(DDNSClient):
         self.config = Config()
         self.storage = Storage()
         self.token = token or self.config.get(self.service_name, "token")
+        self._explicit_token = token
+        self.config.subscribe(self._on_config_change)
+
+    def _on_config_change(
+        self, snapshot: ConfigSnapshot, changed: FrozenSet[str]
+    ) -> None:
+        """Applies a reloaded Duckdns section, keeping an explicit token."""
+
+        provider = snapshot.providers.get(self.service_name)
+        if self.service_name not in changed or provider is None:
+            return
+
+        self.token = self._explicit_token or provider.options["token"]
+
+    def record_names(self) -> Tuple[str, ...]:
+        """Returns the normalized domains configured in the Duckdns section."""
+        return tuple(
+            self._parse_domain_name(name)
+            for name in self.config.get_list(self.service_name, "domains")
+        )
+
+    def _lookup_or_none(
+        self, record_name: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        """
+        Resolves a DuckDNS domain, returning None if it does not resolve.
+
+        Raises:
+            OSError: If the resolver failed or timed out, which says nothing
+                about the domain.
+        """
+        try:
+            return self.check_duckdns_ip(record_name, deadline)
+        except socket.gaierror as err:
+            if err.errno == socket.EAI_AGAIN:
+                raise
+            logging.warning(
+                "DuckDNS: DNS lookup for %s failed: %s", record_name, err
+            )
+            return None
+
+    def _resolve_all(
+        self, names: Iterable[str], deadline: Optional[Deadline] = None
+    ) -> Dict[str, "Future[Optional[str]]"]:
+        """
+        Resolves the domains concurrently and returns the finished lookups
+        by domain, see _lookup_or_none.
+        """
+
+        names = tuple(dict.fromkeys(names))
+        if not names:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(8, len(names))) as pool:
+            return {
+                name: pool.submit(self._lookup_or_none, name, deadline)
+                for name in names
+            }
+
+    def seed(
+        self,
+        record_names: Optional[Iterable[str]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> int:
+        """
+        Imports the configured (or given) domains into the database.
+
+        DuckDNS has no listing API, so domains are resolved concurrently.
+        Domains that do not resolve, or whose lookup fails or times out,
+        are skipped and the others imported.
+        """
+
+        if record_names is None:
+            names = self.record_names()
+        else:
+            names = tuple(self._parse_domain_name(n) for n in record_names)
+        if not names:
+            return 0
+
+        rows = []
+        for name, future in self._resolve_all(names, deadline).items():
+            try:
+                ip_address = future.result()
+            except OSError as err:
+                logging.warning("DuckDNS: Not seeding %s: %s", name, err)
+                continue
+            if ip_address is not None:
+                rows.append((name, ip_address, None))
+        return self.storage.upsert_services(self.service_name, rows)
+
+    def fetch_state(
+        self,
+        record_names: Iterable[str],
+        deadline: Optional[Deadline] = None,
+        dry_run: bool = False,
+    ) -> Tuple[RecordState, ...]:
+        """
+        Returns the state of the given domains.
+
+        Uses a single database query and resolves all domains concurrently.
+        Domains verified within their TTL are not resolved again, domains
+        whose lookup times out or hits a resolver failure are deferred.
+        With dry_run set, the verified domains are not written back.
+        """
+
+        names = tuple(self._parse_domain_name(name) for name in record_names)
+        if not names:
+            return ()
+
+        stored = self.storage.retrieve_records(names)
+        now = time.time()
+        futures = self._resolve_all(
+            (
+                name
+                for name in names
+                if name not in stored
+                or (stored[name].trusted_until() or 0) <= now
+            ),
+            deadline,
+        )
+
+        states: List[RecordState] = []
+        verified = []
+        for name in names:
+            record = stored.get(name)
+            if name not in futures:
+                provider_ip = record.ip if record else None
+            else:
+                try:
+                    provider_ip = futures[name].result()
+                except OSError as err:
+                    if not isinstance(err, DeadlineExceeded):
+                        logging.warning(
+                            "DuckDNS: Resolver failed for %s, deferring it: "
+                            "%s",
+                            name,
+                            err,
+                        )
+                    states.append(
+                        DeferredState(
+                            service=self.service_name, record_name=name
+                        )
+                    )
+                    continue
+                if record is not None and provider_ip == record.ip:
+                    verified.append((name, DUCKDNS_TTL, False))
+
+            states.append(
+                RecordState(
+                    service=self.service_name,
+                    record_name=name,
+                    db_ip=record.ip if record else None,
+                    provider_ip=provider_ip,
+                    stored=record is not None,
+                    last_updated=record.last_updated if record else None,
+                )
+            )
+
+        if verified and not dry_run:
+            self.storage.mark_verified(self.service_name, verified)
+        return tuple(states)
+
+    def apply_changes(
+        self,
+        changes: Iterable[RecordChange],
+        deadline: Optional[Deadline] = None,
+    ) -> None:
+        """
+        Applies all changes, with one API call per distinct target IP.
+
+        The DuckDNS update API accepts a comma separated list of domains.
+        """
+
+        by_ip: Dict[str, List[RecordChange]] = {}
+        for change in dedupe_changes(changes):
+            by_ip.setdefault(change.new_ip, []).append(change)
+
+        for ip_address, grouped in by_ip.items():
+            domains = [change.record_name for change in grouped]
+            ipv4 = self._call_update_api(domains, ip_address, deadline)
+            self.storage.update_ips(
+                self.service_name, [(domain, ipv4) for domain in domains]
+            )
+            logging.info(
+                "DuckDNS: Updated %s to %s.", ", ".join(domains), ipv4
+            )
+            for change in grouped:
+                emit_applied(change, ipv4)
+
+    def _call_update_api(
+        self,
+        domains: Sequence[str],
+        ip_address: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[str]:
+        """
+        Calls the DuckDNS update API for one or more domains.
+
+        Returns the IPv4 address reported back by DuckDNS.
+
+        Raises:
+            DuckDNSError: If DuckDNS does not answer OK, e.g. for a bad token
+                or an unknown domain.
+        """
+
+        payload = {
+            "domains": ",".join(f"{domain}.duckdns.org" for domain in domains),
+            "token": self.token,
+            "ip": ip_address,
+            "verbose": "true",
+        }
+
+        try:
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(
+                    "DuckDNS: Making API call to %s with parameters %s",
+                    self.url,
+                    {**payload, "token": "********"},
+                )
+            timeout = deadline.timeout(10) if deadline else 10
+            with span("http.get", url=self.url, domains=len(domains)):
+                response = call_within(
+                    partial(
+                        requests.get, self.url, params=payload, timeout=timeout
+                    ),
+                    deadline,
+                    "DuckDNS update",
+                )
+            response.raise_for_status()
 
-    def _obtain_record(
-        self, record_name: str
-    ) -> Optional[Tuple[str, datetime, Optional[str]]]:
+            logging.debug(
+                "DuckDNS: Received %s from DuckDNS API.", response.text
+            )
+            status, ipv4, _, _ = self._parse_api_response(response.text)
+            if status != "OK":
+                raise DuckDNSError(
+                    f"DuckDNS: Update of {', '.join(domains)} "
+                    f"answered {status or 'nothing'}."
+                )
+            return ipv4
+
+        except (requests.RequestException, DuckDNSError) as err:
+            logging.error("DuckDNS: API Call %s", err)
+            self._emit_error(domains, err)
+            raise
+
+    def _emit_error(self, domains: Sequence[str], err: Exception) -> None:
+        """Emits an "error" event for a failed update of domains."""
+        emit(
+            "error",
+            self.service_name,
+            ", ".join(domains),
+            reason="update",
+            error=str(err),
+        )
+
+    def _obtain_record(self, record_name: str) -> Optional[Record]:
         """
         Obtains database record for the domain name.
         If not found, obtains the current IP for the
@@ -56,9 +344,7 @@ class DuckDNS(DDNSClient):
             raise ValueError("DuckDNS: Record name cannot be None")
 
         logging.debug("DuckDNS: Obtaining %s from the database.", record_name)
-        check_storage: Tuple[str, datetime, Optional[str]] = (
-            self.storage.retrieve_record(record_name)
-        )
+        check_storage = self.storage.retrieve_record(record_name)
 
         if check_storage is not None:
             logging.debug("DuckDNS: Retrieved %s from database", check_storage)
@@ -91,10 +377,13 @@ class DuckDNS(DDNSClient):
     ) -> Tuple[str, Optional[str], Optional[str], str]:
         """
         Helper Method that parses the verbose response from the DuckDNS API.
+
+        A failed update is answered with a bare KO, the missing lines are
+        returned as empty.
         """
-        responses = response.splitlines()
+        responses = response.splitlines() + [""] * 4
 
-        status = responses[0]  # OK or ERROR
+        status = responses[0]  # OK or KO
         ipv4 = responses[1] or None  # IPv4 address
         ipv6 = responses[2] or None  # IPv6 address
         update_status = responses[3]  # UPDATED or NOCHANGE
@@ -108,19 +397,29 @@ class DuckDNS(DDNSClient):
         )
         return status, ipv4, ipv6, update_status
 
-    def check_duckdns_ip(self, record_name: str) -> str:
+    def dns_name(self, record_name: str) -> str:
+        """Returns the duckdns.org hostname of the domain."""
+        return f"{self._parse_domain_name(record_name)}.duckdns.org"
+
+    def check_duckdns_ip(
+        self, record_name: str, deadline: Optional[Deadline] = None
+    ) -> str:
         """
         Performs a DNS lookup for record name for DuckDNS
         """
         logging.debug("DuckDNS: Performing DNS lookup for %s", record_name)
-        return socket.gethostbyname(
-            f"{self._parse_domain_name(record_name)}.duckdns.org"
-        )
+        return resolve_host(self.dns_name(record_name), deadline)
 
-    def check_and_update_dns(self, record_name: Optional[str] = None) -> None:
+    def check_and_update_dns(
+        self,
+        record_name: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> None:
         """
         Compares the actual DuckDNS A record with the local database record.
         If they are different, updates DuckDNS with the current IP address.
+
+        Runs a single-record plan/apply cycle, so the record is looked up once.
         """
         record_name = record_name or self.config.get(
             self.service_name, "domains"
@@ -130,52 +429,21 @@ class DuckDNS(DDNSClient):
         if not record_name:
             raise ValueError("DuckDNS: Record name cannot be None")
 
-        logging.debug("DuckDNS: Checking current IP for %s", record_name)
-        duck_ip = self.check_duckdns_ip(record_name)
-        logging.debug("DuckDNS: Current IP for %s is %s", record_name, duck_ip)
-
-        record = self._obtain_record(record_name)
-
-        if not record:
-            logging.error("DuckDNS: No record found for %s.", record_name)
-            return
-
-        current_ip = self.get_ipv4()
-        db_ip = record[0]
-        logging.debug("DuckDNS: IP from database is %s", db_ip)
-
-        if current_ip != db_ip:
-            logging.info(
-                "IP has changed from %s to %s, updating DuckDNS.",
-                current_ip,
-                db_ip,
-            )
-            self.update_dns(current_ip, record_name)
-            return
-
-        if db_ip != duck_ip:
-            logging.info(
-                "DuckDNS: A record has changed from %s to %s for %s",
-                db_ip,
-                duck_ip,
-                record_name,
-            )
-            self.update_dns(current_ip, record_name)
-            return
-
-        logging.info(
-            "DuckDNS: No update needed for %s - IP is still %s",
-            record_name,
-            db_ip,
-        )
+        Reconciler(
+            [self], record_names={self.service_name: (record_name,)}
+        ).run(deadline=deadline)
 
     def update_dns(
-        self, ip_address: str, record_name: Optional[str] = None
+        self,
+        ip_address: str,
+        record_name: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
     ) -> None:
         """
         Updates the IP address for DuckDNS in the database.
         This method assumes that the IP address has already
-        been verified to be different.
+        been verified to be different. The API call is bounded by the time
+        left in deadline.
         """
         record_name = record_name or self.config.get(
             self.service_name, "domains"
@@ -185,38 +453,30 @@ class DuckDNS(DDNSClient):
         if not record_name:
             raise ValueError("DuckDNS: Record name cannot be None")
 
-        payload = {
-            "domains": f"{record_name}.duckdns.org",
-            "token": self.token,
-            "ip": ip_address,
-            "verbose": "true",
-        }
-
+        previous = self.storage.retrieve_record(record_name)
+        self.storage.enqueue_changes(
+            self.service_name, [(record_name, ip_address, "update", None)]
+        )
         try:
-            logging.debug(
-                "DuckDNS: Making API call to %s with parameters %s",
-                self.url,
-                payload,
-            )
-            response = requests.get(self.url, params=payload, timeout=10)
-            response.raise_for_status()
-
-            ipv4 = self._parse_api_response(response.text)[1]
-            logging.debug(
-                "DuckDNS: Received %s from DuckDNS API.", response.text
+            ipv4 = self._call_update_api(
+                (record_name,), ip_address, deadline
             )
-
-            self.storage.update_ip(
-                self.service_name, self._parse_domain_name(record_name), ipv4
+        except (requests.RequestException, DuckDNSError) as err:
+            self.storage.fail_changes(
+                self.service_name, [record_name], str(err)
             )
-            logging.info("DuckDNS: Updated %s to %s.", ip_address, ipv4)
-
-        except requests.HTTPError as err:
-            logging.error("DuckDNS: API Call %s", err)
-            raise
-        except requests.ConnectionError as err:
-            logging.error("DuckDNS: API Call %s", err)
-            raise
-        except Exception as err:
-            logging.error("DuckDNS: API Call %s", err)
             raise
+
+        self.storage.update_ip(self.service_name, record_name, ipv4)
+        self.storage.complete_changes(
+            self.service_name, [(record_name, ip_address)]
+        )
+        logging.info("DuckDNS: Updated %s to %s.", ip_address, ipv4)
+        emit(
+            "record_updated",
+            self.service_name,
+            record_name,
+            old_ip=previous.ip if previous else None,
+            new_ip=ipv4,
+            reason="update",
+        )
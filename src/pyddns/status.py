@@ -0,0 +1,367 @@
+"""
+Status Module
+
+Provides a read-only status API for the daemon. The reconcile loop publishes
+an immutable `StatusSnapshot` after every cycle by swapping a single
+reference, and `StatusServer` serves it as JSON over local HTTP or a Unix
+socket. Serving a request never touches SQLite or a provider.
+"""
+
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
+
+from pyddns.reconcile import ReconcilePlan
+
+RECENT_CYCLES = 20
+
+
+@dataclass(frozen=True)
+class RecordStatus:
+    """
+    Last known state of a single record.
+
+    state is one of "ok", "updated", "held", "deferred" or "missing".
+    """
+
+    service: str
+    name: str
+    state: str
+    ip: Optional[str] = None
+    last_updated: Optional[str] = None
+    checked_at: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class ErrorStatus:
+    """The error of the most recent failed cycle."""
+
+    message: str
+    at: float
+
+
+@dataclass(frozen=True)
+class StatusSnapshot:
+    """Immutable view of the daemon state served by `StatusServer`."""
+
+    started_at: float
+    public_ip: Optional[str] = None
+    cycles: int = 0
+    last_cycle_at: Optional[float] = None
+    recent_cycle_seconds: Tuple[float, ...] = ()
+    last_error: Optional[ErrorStatus] = None
+    records: Mapping[Tuple[str, str], RecordStatus] = field(
+        default_factory=lambda: MappingProxyType({})
+    )
+
+    def is_stale(self, now: float, max_age: Optional[float]) -> bool:
+        """
+        Returns True if no cycle finished within max_age seconds. Before
+        the first cycle the age counts from started_at.
+        """
+        if max_age is None:
+            return False
+        return now - (self.last_cycle_at or self.started_at) > max_age
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the snapshot as JSON serializable data."""
+
+        recent = self.recent_cycle_seconds
+        error = self.last_error
+        return {
+            "public_ip": self.public_ip,
+            "started_at": self.started_at,
+            "cycles": self.cycles,
+            "last_cycle_at": self.last_cycle_at,
+            "cycle_seconds": {
+                "last": recent[-1] if recent else None,
+                "avg": sum(recent) / len(recent) if recent else None,
+                "max": max(recent) if recent else None,
+            },
+            "last_error": error.message if error else None,
+            "last_error_at": error.at if error else None,
+            "records": [
+                {
+                    "service": record.service,
+                    "name": record.name,
+                    "state": record.state,
+                    "ip": record.ip,
+                    "last_updated": record.last_updated,
+                    "checked_at": record.checked_at,
+                }
+                for record in self.records.values()
+            ],
+        }
+
+    @cached_property
+    def body(self) -> bytes:
+        """The encoded JSON document, rendered once per snapshot."""
+        return json.dumps(self.to_dict(), separators=(",", ":")).encode()
+
+
+class StatusBoard:
+    """
+    Holds the current `StatusSnapshot`.
+
+    Writers build a new snapshot and replace the reference under a lock.
+    Readers just read the reference, so they never block and never see a
+    half-updated state.
+
+    The board is unhealthy once no cycle finished for max_age seconds, None
+    keeps it healthy.
+    """
+
+    def __init__(
+        self, clock: Any = time.time, max_age: Optional[float] = None
+    ) -> None:
+        self.clock = clock
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot = StatusSnapshot(started_at=clock())
+
+    def healthy(self) -> bool:
+        """Returns False if the cycles stalled for longer than max_age."""
+        return not self._snapshot.is_stale(self.clock(), self.max_age)
+
+    @property
+    def snapshot(self) -> StatusSnapshot:
+        """The latest published snapshot."""
+        return self._snapshot
+
+    def record_cycle(self, plan: ReconcilePlan, duration: float) -> None:
+        """Publishes the outcome of a reconcile cycle."""
+
+        now = self.clock()
+        updates: Dict[Tuple[str, str], RecordStatus] = {}
+
+        for state in plan.unchanged:
+            updates[(state.service, state.record_name)] = RecordStatus(
+                state.service,
+                state.record_name,
+                "ok",
+                state.provider_ip or state.db_ip,
+                state.last_updated,
+                now,
+            )
+        for state in plan.missing:
+            updates[(state.service, state.record_name)] = RecordStatus(
+                state.service, state.record_name, "missing", checked_at=now
+            )
+        for change in plan.held:
+            updates[(change.service, change.record_name)] = RecordStatus(
+                change.service,
+                change.record_name,
+                "held",
+                change.state.provider_ip or change.state.db_ip,
+                change.state.last_updated,
+                now,
+            )
+        for change in plan.changes:
+            updates[(change.service, change.record_name)] = RecordStatus(
+                change.service,
+                change.record_name,
+                "updated",
+                change.new_ip,
+                time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now)),
+                now,
+            )
+        for state in plan.deferred:
+            key = (state.service, state.record_name)
+            previous = self._snapshot.records.get(key)
+            updates[key] = RecordStatus(
+                state.service,
+                state.record_name,
+                "deferred",
+                previous.ip if previous else None,
+                previous.last_updated if previous else None,
+                previous.checked_at if previous else None,
+            )
+
+        with self._lock:
+            current = self._snapshot
+            records = dict(current.records)
+            records.update(updates)
+            self._snapshot = replace(
+                current,
+                public_ip=plan.current_ip,
+                cycles=current.cycles + 1,
+                last_cycle_at=now,
+                recent_cycle_seconds=(
+                    current.recent_cycle_seconds + (duration,)
+                )[-RECENT_CYCLES:],
+                records=MappingProxyType(records),
+            )
+
+    def record_ip(self, ip_address: str, duration: float) -> None:
+        """Publishes a tick that only checked the public IP."""
+
+        with self._lock:
+            current = self._snapshot
+            self._snapshot = replace(
+                current,
+                public_ip=ip_address,
+                cycles=current.cycles + 1,
+                last_cycle_at=self.clock(),
+                recent_cycle_seconds=(
+                    current.recent_cycle_seconds + (duration,)
+                )[-RECENT_CYCLES:],
+            )
+
+    def record_error(self, error: BaseException) -> None:
+        """Publishes the error of a failed cycle."""
+
+        with self._lock:
+            self._snapshot = replace(
+                self._snapshot,
+                last_error=ErrorStatus(
+                    str(error) or type(error).__name__, self.clock()
+                ),
+            )
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    board: StatusBoard
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serves /health and /status."""
+
+        status = 200
+        if self.path == "/health":
+            body = b'{"status":"ok"}'
+            if not self.board.healthy():
+                status, body = 503, b'{"status":"stale"}'
+        elif self.path == "/status":
+            body = self.board.snapshot.body
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address.
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # pylint: disable=redefined-builtin
+        logging.debug("Status: " + format, *args)
+
+
+class _IPv6HTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_INET6
+
+
+class _UnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+class StatusServer:
+    """
+    Serves a `StatusBoard` on a TCP address or a Unix socket path.
+
+    GET /health returns 200, or 503 once the board went stale, and GET
+    /status the latest snapshot.
+    """
+
+    def __init__(
+        self,
+        board: StatusBoard,
+        address: Optional[Tuple[str, int]] = None,
+        socket_path: Optional[str] = None,
+    ) -> None:
+        if (address is None) == (socket_path is None):
+            raise ValueError(
+                "Status: Exactly one of address or socket_path is required."
+            )
+        self.board = board
+        self.address = address
+        self.socket_path = socket_path
+        self._server: Optional[
+            Union[ThreadingHTTPServer, _UnixHTTPServer]
+        ] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StatusServer":
+        """Starts serving in a daemon thread."""
+
+        handler = type(
+            "StatusHandler", (_StatusHandler,), {"board": self.board}
+        )
+        if self.socket_path is not None:
+            _remove_socket(self.socket_path)
+            self._server = _UnixHTTPServer(self.socket_path, handler)
+            where = self.socket_path
+        else:
+            assert self.address is not None
+            server_class = (
+                _IPv6HTTPServer if ":" in self.address[0]
+                else ThreadingHTTPServer
+            )
+            self._server = server_class(self.address, handler)
+            self._server.daemon_threads = True
+            host, port = self._server.server_address[:2]
+            self.address = (str(host), int(port))
+            where = f"http://{self.address[0]}:{self.address[1]}"
+            if ":" in self.address[0]:
+                where = f"http://[{self.address[0]}]:{self.address[1]}"
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="pyddns-status",
+            daemon=True,
+        )
+        self._thread.start()
+        logging.info("Status: Serving on %s.", where)
+        return self
+
+    def stop(self) -> None:
+        """Stops the server and removes the socket file."""
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.socket_path is not None:
+            _remove_socket(self.socket_path)
+
+
+def _remove_socket(path: str) -> None:
+    """
+    Removes a socket left at path. Any other file is kept, binding to it
+    then fails instead of deleting it.
+    """
+
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if stat.S_ISSOCK(mode):
+        os.unlink(path)
+
+
+def parse_listen(value: str) -> Tuple[str, int]:
+    """Parses a HOST:PORT, [IPV6]:PORT or PORT listen address."""
+
+    host, _, port = value.rpartition(":")
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+    return (host or "127.0.0.1", int(port))
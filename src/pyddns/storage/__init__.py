@@ -0,0 +1,30 @@
+"""
+Storage Package
+
+Provides the storage of pyddns: domain records, flap events, the negative
+cache and the outbox. `Storage` is the process wide entry point and
+delegates to a `StorageBackend`. `SQLiteBackend` keeps the data in a SQLite
+file, or in memory only, and `DictBackend` in plain dicts.
+"""
+
+from pyddns.storage.base import (
+    DuplicateRecordError,
+    Journal,
+    RecordStore,
+    StorageBackend,
+)
+from pyddns.storage.facade import BACKENDS, Storage, open_backend
+from pyddns.storage.memory import DictBackend
+from pyddns.storage.sqlite import SQLiteBackend
+
+__all__ = [
+    "BACKENDS",
+    "DictBackend",
+    "DuplicateRecordError",
+    "Journal",
+    "RecordStore",
+    "SQLiteBackend",
+    "Storage",
+    "StorageBackend",
+    "open_backend",
+]
@@ -0,0 +1,203 @@
+"""
+Storage Backend Interface
+
+Defines the operations every storage backend implements. `RecordStore`
+covers the domain records and the negative cache, `Journal` the flap events
+and the outbox. `StorageBackend` combines both.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pyddns.record import Record
+
+
+class DuplicateRecordError(ValueError):
+    """Raised when adding a domain record that is already stored."""
+
+
+class RecordStore(ABC):
+    """Stores the domain records and the names missing at the provider."""
+
+    @abstractmethod
+    def create_tables(self) -> None:
+        """Creates the tables (or structures) of the backend if missing."""
+
+    @abstractmethod
+    def drop_tables(self) -> None:
+        """Removes all stored data."""
+
+    @abstractmethod
+    def add_service(
+        self,
+        service_name: str,
+        domain_name: str,
+        current_ip: str,
+        record_id: Optional[str] = None,
+    ) -> None:
+        """
+        Adds a single domain record.
+
+        Raises:
+            DuplicateRecordError: If the domain name is already stored.
+        """
+
+    @abstractmethod
+    def add_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> None:
+        """
+        Adds (domain_name, current_ip, record_id) rows at once, all or none.
+
+        Raises:
+            DuplicateRecordError: If one of the domain names is already
+                stored.
+        """
+
+    @abstractmethod
+    def upsert_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> int:
+        """
+        Inserts or refreshes (domain_name, current_ip, record_id) rows.
+        Returns the number of rows written.
+        """
+
+    @abstractmethod
+    def update_ip(
+        self, service_name: str, domain_name: str, current_ip: Optional[str]
+    ) -> None:
+        """
+        Updates the IP address of a domain record. None keeps the stored
+        address and only refreshes last_updated.
+        """
+
+    @abstractmethod
+    def update_ips(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[str]]],
+    ) -> None:
+        """Updates (domain_name, current_ip) rows at once."""
+
+    @abstractmethod
+    def retrieve_record(self, domain_name: str) -> Optional[Record]:
+        """Returns the record of domain_name, if stored."""
+
+    @abstractmethod
+    def retrieve_records(
+        self, domain_names: Iterable[str]
+    ) -> Dict[str, Record]:
+        """Returns the stored records of domain_names by domain name."""
+
+    @abstractmethod
+    def mark_verified(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[int], Optional[bool]]],
+        verified_at: Optional[float] = None,
+    ) -> None:
+        """Records (domain_name, ttl, proxied) rows as just verified."""
+
+    @abstractmethod
+    def iter_records(
+        self, service_name: Optional[str] = None, batch_size: int = 500
+    ) -> Iterator[Record]:
+        """Streams the stored records, optionally of one service only."""
+
+    @abstractmethod
+    def export_snapshot(self, path: str) -> int:
+        """Writes the domain records to path as JSON lines."""
+
+    @abstractmethod
+    def import_snapshot(self, path: str) -> int:
+        """Loads a JSON lines snapshot written by export_snapshot."""
+
+    @abstractmethod
+    def mark_missing(self, service_name: str, domain_name: str) -> None:
+        """Caches the domain name as missing at the provider."""
+
+    @abstractmethod
+    def is_missing(
+        self, service_name: str, domain_name: str, ttl: float
+    ) -> bool:
+        """Returns True if the domain was cached as missing within ttl."""
+
+    @abstractmethod
+    def clear_missing(self, service_name: str, domain_name: str) -> None:
+        """Removes the domain name from the negative cache."""
+
+
+class Journal(ABC):
+    """Keeps the flap events and the outbox of unconfirmed changes."""
+
+    @abstractmethod
+    def record_flap(
+        self, previous_ip: str, observed_ip: str, held_for: float
+    ) -> None:
+        """Records an IP that was replaced before it was stable."""
+
+    @abstractmethod
+    def retrieve_flap_events(
+        self, limit: int = 100
+    ) -> List[Tuple[str, str, float, str]]:
+        """Returns the most recent flap events, newest first."""
+
+    @abstractmethod
+    def enqueue_changes(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, str, Optional[str]]],
+    ) -> None:
+        """Journals (domain_name, new_ip, reason, record_id) in the outbox."""
+
+    @abstractmethod
+    def pending_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, Optional[str], int]]:
+        """Returns the live outbox rows of a service, oldest first."""
+
+    @abstractmethod
+    def complete_changes(
+        self, service_name: str, rows: Iterable[Tuple[str, str]]
+    ) -> None:
+        """Removes sent (domain_name, new_ip) rows from the outbox."""
+
+    @abstractmethod
+    def fail_changes(
+        self, service_name: str, domain_names: Iterable[str], error: str
+    ) -> None:
+        """Records a failed attempt for the given outbox rows."""
+
+    @abstractmethod
+    def mark_dead(
+        self, service_name: str, domain_names: Iterable[str]
+    ) -> None:
+        """Stops replaying the given outbox rows."""
+
+    @abstractmethod
+    def dead_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """
+        Returns (domain_name, new_ip, reason, attempts, last_error) rows that
+        were given up on.
+        """
+
+
+class StorageBackend(RecordStore, Journal):
+    """
+    Operations every storage backend implements.
+
+    Records are returned as `Record` objects. Timestamps are UTC strings in
+    the SQLite CURRENT_TIMESTAMP format, except verified_at, which is in
+    epoch seconds. Implementations must be safe to use from several threads.
+    """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Releases the resources of the backend."""
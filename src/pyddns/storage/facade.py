@@ -0,0 +1,259 @@
+"""
+Storage Facade
+
+Provides `Storage`, the process wide entry point to the storage of pyddns.
+It opens a backend by name, or takes one that is passed in, and forwards
+every call to it.
+"""
+
+import logging
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pyddns.record import Record
+from pyddns.storage.base import Journal, StorageBackend
+from pyddns.storage.memory import DictBackend
+from pyddns.storage.sqlite import SQLiteBackend
+
+BACKENDS = ("file", "memory", "dict")
+
+_FACTORIES: Dict[str, Callable[[str], StorageBackend]] = {
+    "file": SQLiteBackend,
+    "memory": lambda _: SQLiteBackend(":memory:"),
+    "dict": lambda _: DictBackend(),
+}
+
+
+def open_backend(
+    backend: str = "file", filename: str = "py_ddns.db"
+) -> StorageBackend:
+    """
+    Opens a storage backend by name: "file" (SQLite database at filename),
+    "memory" (SQLite in memory) or "dict" (plain dicts in memory).
+    """
+
+    try:
+        factory = _FACTORIES[backend]
+    except KeyError:
+        raise ValueError(
+            f"Storage: Unknown backend {backend!r}, "
+            f"expected one of {', '.join(BACKENDS)}."
+        ) from None
+    return factory(filename)
+
+
+class _JournalFacade(Journal):
+    """Forwards the `Journal` operations to the backend."""
+
+    backend: StorageBackend
+
+    def record_flap(
+        self, previous_ip: str, observed_ip: str, held_for: float
+    ) -> None:
+        """See `Journal.record_flap`."""
+        self.backend.record_flap(previous_ip, observed_ip, held_for)
+
+    def retrieve_flap_events(
+        self, limit: int = 100
+    ) -> List[Tuple[str, str, float, str]]:
+        """See `Journal.retrieve_flap_events`."""
+        return self.backend.retrieve_flap_events(limit)
+
+    def enqueue_changes(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, str, Optional[str]]],
+    ) -> None:
+        """See `Journal.enqueue_changes`."""
+        self.backend.enqueue_changes(service_name, rows)
+
+    def pending_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, Optional[str], int]]:
+        """See `Journal.pending_changes`."""
+        return self.backend.pending_changes(service_name)
+
+    def complete_changes(
+        self, service_name: str, rows: Iterable[Tuple[str, str]]
+    ) -> None:
+        """See `Journal.complete_changes`."""
+        self.backend.complete_changes(service_name, rows)
+
+    def fail_changes(
+        self, service_name: str, domain_names: Iterable[str], error: str
+    ) -> None:
+        """See `Journal.fail_changes`."""
+        self.backend.fail_changes(service_name, domain_names, error)
+
+    def mark_dead(
+        self, service_name: str, domain_names: Iterable[str]
+    ) -> None:
+        """See `Journal.mark_dead`."""
+        self.backend.mark_dead(service_name, domain_names)
+
+    def dead_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """See `Journal.dead_changes`."""
+        return self.backend.dead_changes(service_name)
+
+
+class Storage(_JournalFacade, StorageBackend):
+    """
+    Process wide storage shared by all clients.
+
+    Storage() always returns the same instance. The backend is opened by the
+    first call and reopened when a later call names another backend or
+    filename; calls without arguments keep the current one. A
+    `StorageBackend` instance passed as backend is used as is.
+    """
+
+    _instance: Optional["Storage"] = None
+    options: Optional[Tuple[str, str]]
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(Storage, cls).__new__(cls)
+            cls._instance.options = None
+        return cls._instance
+
+    def __init__(
+        self,
+        filename: Optional[str] = None,
+        backend: Union[str, StorageBackend, None] = None,
+    ) -> None:
+        current = self.options
+        if isinstance(backend, StorageBackend):
+            self._use(
+                backend,
+                (
+                    type(backend).__name__,
+                    filename or (current[1] if current else "py_ddns.db"),
+                ),
+            )
+            return
+
+        options = (
+            backend or (current[0] if current else "file"),
+            filename or (current[1] if current else "py_ddns.db"),
+        )
+        if options != current:
+            self._use(open_backend(*options), options)
+
+    def _use(self, backend: StorageBackend, options: Tuple[str, str]) -> None:
+        if self.options is not None and backend is not self.backend:
+            self.backend.close()
+        self.backend = backend
+        self.options = options
+        logging.debug("Storage: Opened %s backend.", options[0])
+
+    def close(self) -> None:
+        """Closes the backend. The next Storage() call opens it again."""
+        if self.options is not None:
+            self.backend.close()
+            self.options = None
+
+    def create_tables(self) -> None:
+        """See `RecordStore.create_tables`."""
+        self.backend.create_tables()
+
+    def drop_tables(self) -> None:
+        """See `RecordStore.drop_tables`."""
+        self.backend.drop_tables()
+
+    def add_service(
+        self,
+        service_name: str,
+        domain_name: str,
+        current_ip: str,
+        record_id: Optional[str] = None,
+    ) -> None:
+        """See `RecordStore.add_service`."""
+        self.backend.add_service(
+            service_name, domain_name, current_ip, record_id
+        )
+
+    def add_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> None:
+        """See `RecordStore.add_services`."""
+        self.backend.add_services(service_name, rows)
+
+    def upsert_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> int:
+        """See `RecordStore.upsert_services`."""
+        return self.backend.upsert_services(service_name, rows)
+
+    def update_ip(
+        self, service_name: str, domain_name: str, current_ip: Optional[str]
+    ) -> None:
+        """See `RecordStore.update_ip`."""
+        self.backend.update_ip(service_name, domain_name, current_ip)
+
+    def update_ips(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[str]]],
+    ) -> None:
+        """See `RecordStore.update_ips`."""
+        self.backend.update_ips(service_name, rows)
+
+    def retrieve_record(self, domain_name: str) -> Optional[Record]:
+        """See `RecordStore.retrieve_record`."""
+        return self.backend.retrieve_record(domain_name)
+
+    def retrieve_records(
+        self, domain_names: Iterable[str]
+    ) -> Dict[str, Record]:
+        """See `RecordStore.retrieve_records`."""
+        return self.backend.retrieve_records(domain_names)
+
+    def mark_verified(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[int], Optional[bool]]],
+        verified_at: Optional[float] = None,
+    ) -> None:
+        """See `RecordStore.mark_verified`."""
+        self.backend.mark_verified(service_name, rows, verified_at)
+
+    def iter_records(
+        self, service_name: Optional[str] = None, batch_size: int = 500
+    ) -> Iterator[Record]:
+        """See `RecordStore.iter_records`."""
+        return self.backend.iter_records(service_name, batch_size)
+
+    def export_snapshot(self, path: str) -> int:
+        """See `RecordStore.export_snapshot`."""
+        return self.backend.export_snapshot(path)
+
+    def import_snapshot(self, path: str) -> int:
+        """See `RecordStore.import_snapshot`."""
+        return self.backend.import_snapshot(path)
+
+    def mark_missing(self, service_name: str, domain_name: str) -> None:
+        """See `RecordStore.mark_missing`."""
+        self.backend.mark_missing(service_name, domain_name)
+
+    def is_missing(
+        self, service_name: str, domain_name: str, ttl: float
+    ) -> bool:
+        """See `RecordStore.is_missing`."""
+        return self.backend.is_missing(service_name, domain_name, ttl)
+
+    def clear_missing(self, service_name: str, domain_name: str) -> None:
+        """See `RecordStore.clear_missing`."""
+        self.backend.clear_missing(service_name, domain_name)
@@ -0,0 +1,496 @@
+"""
+In-Memory Storage Backend
+
+Provides `DictBackend`, a storage backend that keeps everything in plain
+dicts. Nothing touches the disk, which suits ephemeral containers that
+rebuild their state from the provider on every start.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from pyddns.record import Record
+from pyddns.storage.base import DuplicateRecordError, Journal, StorageBackend
+
+
+def _timestamp() -> str:
+    """Returns the current UTC time in the SQLite CURRENT_TIMESTAMP format."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+
+def _replace(record: Record, **changes: Any) -> Record:
+    values: Dict[str, Any] = {
+        "service": record.service,
+        "name": record.name,
+        "ip": record.ip,
+        "last_updated": record.last_updated,
+        "record_id": record.record_id,
+        "ttl": record.ttl,
+        "proxied": record.proxied,
+        "verified_at": record.verified_at,
+    }
+    values.update(changes)
+    return Record(**values)
+
+
+class _DictJournal(Journal):
+    """Flap events and outbox of `DictBackend`."""
+
+    lock: threading.RLock
+    _flap_events: List[Tuple[str, str, float, str]]
+    _outbox: Dict[Tuple[str, str], Dict[str, Any]]
+
+    def record_flap(
+        self, previous_ip: str, observed_ip: str, held_for: float
+    ) -> None:
+        """Records an IP that was replaced before it was stable."""
+
+        with self.lock:
+            self._flap_events.append(
+                (previous_ip, observed_ip, held_for, _timestamp())
+            )
+
+    def retrieve_flap_events(
+        self, limit: int = 100
+    ) -> List[Tuple[str, str, float, str]]:
+        """Returns the most recent flap events, newest first."""
+
+        with self.lock:
+            return self._flap_events[::-1][:limit]
+
+    def enqueue_changes(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, str, Optional[str]]],
+    ) -> None:
+        """
+        Journals (domain_name, new_ip, reason, record_id) rows. A newer
+        change replaces a pending or dead one for the same record, and a new
+        value starts over without failed attempts.
+        """
+
+        now = _timestamp()
+        with self.lock:
+            for domain_name, new_ip, reason, record_id in rows:
+                key = (service_name, domain_name)
+                entry = self._outbox.get(key)
+                if entry is None:
+                    entry = self._outbox[key] = {
+                        "record_id": None,
+                        "attempts": 0,
+                        "last_error": None,
+                    }
+                elif entry["new_ip"] != new_ip:
+                    entry["attempts"] = 0
+                entry.update(
+                    new_ip=new_ip,
+                    reason=reason,
+                    record_id=record_id or entry["record_id"],
+                    dead=False,
+                    queued_at=now,
+                )
+
+    def pending_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, Optional[str], int]]:
+        """
+        Returns (domain_name, new_ip, reason, record_id, attempts) rows that
+        are still waiting, oldest first. Dead rows are left out.
+        """
+
+        with self.lock:
+            entries = sorted(
+                (entry["queued_at"], domain_name, entry)
+                for (service, domain_name), entry in self._outbox.items()
+                if service == service_name and not entry["dead"]
+            )
+            return [
+                (
+                    domain_name,
+                    entry["new_ip"],
+                    entry["reason"],
+                    entry["record_id"],
+                    entry["attempts"],
+                )
+                for _, domain_name, entry in entries
+            ]
+
+    def complete_changes(
+        self, service_name: str, rows: Iterable[Tuple[str, str]]
+    ) -> None:
+        """
+        Removes sent (domain_name, new_ip) rows. A row that was replaced by
+        a newer value in the meantime is kept.
+        """
+
+        with self.lock:
+            for domain_name, new_ip in rows:
+                key = (service_name, domain_name)
+                entry = self._outbox.get(key)
+                if entry is not None and entry["new_ip"] == new_ip:
+                    del self._outbox[key]
+
+    def fail_changes(
+        self, service_name: str, domain_names: Iterable[str], error: str
+    ) -> None:
+        """Records a failed attempt for the given outbox rows."""
+
+        names = list(domain_names)
+        with self.lock:
+            for domain_name in names:
+                entry = self._outbox.get((service_name, domain_name))
+                if entry is not None:
+                    entry["attempts"] += 1
+                    entry["last_error"] = error
+        logging.warning(
+            "Storage: Kept %d %s change(s) in the outbox: %s",
+            len(names),
+            service_name,
+            error,
+        )
+
+    def mark_dead(
+        self, service_name: str, domain_names: Iterable[str]
+    ) -> None:
+        """Stops replaying the given outbox rows."""
+
+        with self.lock:
+            for domain_name in domain_names:
+                entry = self._outbox.get((service_name, domain_name))
+                if entry is not None:
+                    entry["dead"] = True
+
+    def dead_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """
+        Returns (domain_name, new_ip, reason, attempts, last_error) rows that
+        were given up on, oldest first.
+        """
+
+        with self.lock:
+            entries = sorted(
+                (entry["queued_at"], domain_name, entry)
+                for (service, domain_name), entry in self._outbox.items()
+                if service == service_name and entry["dead"]
+            )
+            return [
+                (
+                    domain_name,
+                    entry["new_ip"],
+                    entry["reason"],
+                    entry["attempts"],
+                    entry["last_error"],
+                )
+                for _, domain_name, entry in entries
+            ]
+
+
+class DictBackend(_DictJournal, StorageBackend):
+    """
+    In-memory storage backend, behaving like `SQLiteBackend`.
+
+    Domain records are kept as `Record` objects keyed by domain name, in
+    insertion order. All state is lost when the process exits.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self._domains: Dict[str, Record] = {}
+        self._created_at: Dict[str, str] = {}
+        self._flap_events: List[Tuple[str, str, float, str]] = []
+        self._missing: Dict[Tuple[str, str], float] = {}
+        self._outbox: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def close(self) -> None:
+        """Drops all data."""
+        self.drop_tables()
+
+    def create_tables(self) -> None:
+        """Nothing to create, the dicts exist from the start."""
+
+    def drop_tables(self) -> None:
+        """Removes all stored data."""
+
+        with self.lock:
+            self._domains.clear()
+            self._created_at.clear()
+            self._flap_events.clear()
+            self._missing.clear()
+            self._outbox.clear()
+
+    def add_service(
+        self,
+        service_name: str,
+        domain_name: str,
+        current_ip: str,
+        record_id: Optional[str] = None,
+    ) -> None:
+        """
+        Adds a domain record.
+
+        Raises:
+            DuplicateRecordError: If the domain name is already stored.
+        """
+
+        self.add_services(service_name, [(domain_name, current_ip, record_id)])
+
+    def add_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> None:
+        """
+        Adds (domain_name, current_ip, record_id) rows, all or none.
+
+        Raises:
+            DuplicateRecordError: If one of the domain names is already
+                stored.
+        """
+
+        rows = list(rows)
+        now = _timestamp()
+        with self.lock:
+            names = [domain_name for domain_name, _, _ in rows]
+            duplicates = set(names) & self._domains.keys()
+            if duplicates or len(set(names)) != len(names):
+                raise DuplicateRecordError(
+                    f"Storage: {', '.join(sorted(duplicates or names))} "
+                    "already stored."
+                )
+            for domain_name, current_ip, record_id in rows:
+                self._domains[domain_name] = Record(
+                    service_name, domain_name, current_ip, now, record_id
+                )
+                self._created_at[domain_name] = now
+
+    def upsert_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> int:
+        """
+        Inserts or refreshes (domain_name, current_ip, record_id) rows.
+        Returns the number of rows written.
+        """
+
+        count = 0
+        now = _timestamp()
+        with self.lock:
+            for domain_name, current_ip, record_id in rows:
+                record = self._domains.get(domain_name)
+                if record is None:
+                    self._domains[domain_name] = Record(
+                        service_name, domain_name, current_ip, now, record_id
+                    )
+                    self._created_at[domain_name] = now
+                else:
+                    self._domains[domain_name] = _replace(
+                        record,
+                        service=service_name,
+                        ip=current_ip,
+                        record_id=record_id or record.record_id,
+                    )
+                count += 1
+        logging.info("Storage: Seeded %d %s record(s).", count, service_name)
+        return count
+
+    def update_ip(
+        self,
+        service_name: str,
+        domain_name: str,
+        current_ip: Optional[str],
+    ) -> None:
+        """
+        Updates the IP address of a domain record. The record has to be
+        verified again after an update.
+        """
+
+        self.update_ips(service_name, [(domain_name, current_ip)])
+
+    def update_ips(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[str]]],
+    ) -> None:
+        """Updates (domain_name, current_ip) rows."""
+
+        now = _timestamp()
+        with self.lock:
+            for domain_name, current_ip in rows:
+                record = self._domains.get(domain_name)
+                if record is None:
+                    continue
+                self._domains[domain_name] = _replace(
+                    record,
+                    service=service_name or record.service,
+                    ip=current_ip or record.ip,
+                    last_updated=now,
+                    verified_at=None,
+                )
+
+    def retrieve_record(self, domain_name: str) -> Optional[Record]:
+        """Returns the record of domain_name, if stored."""
+        return self._domains.get(domain_name)
+
+    def retrieve_records(
+        self, domain_names: Iterable[str]
+    ) -> Dict[str, Record]:
+        """Returns the stored records of domain_names by domain name."""
+
+        with self.lock:
+            return {
+                name: self._domains[name]
+                for name in domain_names
+                if name in self._domains
+            }
+
+    def mark_verified(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[int], Optional[bool]]],
+        verified_at: Optional[float] = None,
+    ) -> None:
+        """
+        Records (domain_name, ttl, proxied) rows as just verified. None keeps
+        the stored value.
+        """
+
+        checked = time.time() if verified_at is None else verified_at
+        with self.lock:
+            for domain_name, ttl, proxied in rows:
+                record = self._domains.get(domain_name)
+                if record is None or record.service != service_name:
+                    continue
+                self._domains[domain_name] = _replace(
+                    record,
+                    ttl=record.ttl if ttl is None else ttl,
+                    proxied=record.proxied if proxied is None else proxied,
+                    verified_at=checked,
+                )
+
+    def iter_records(
+        self, service_name: Optional[str] = None, batch_size: int = 500
+    ) -> Iterator[Record]:
+        """
+        Streams the stored records in insertion order, optionally of one
+        service only. The lock is only held while a batch is collected.
+        """
+
+        with self.lock:
+            names = list(self._domains)
+
+        for start in range(0, len(names), batch_size):
+            with self.lock:
+                batch = [
+                    self._domains[name]
+                    for name in names[start : start + batch_size]
+                    if name in self._domains
+                ]
+            for record in batch:
+                if service_name is None or record.service == service_name:
+                    yield record
+
+    def mark_missing(self, service_name: str, domain_name: str) -> None:
+        """Caches the domain name as missing at the provider."""
+
+        with self.lock:
+            self._missing[(service_name, domain_name)] = time.time()
+
+    def is_missing(
+        self, service_name: str, domain_name: str, ttl: float
+    ) -> bool:
+        """Returns True if the domain was cached as missing within ttl."""
+
+        checked_at = self._missing.get((service_name, domain_name))
+        return checked_at is not None and checked_at > time.time() - ttl
+
+    def clear_missing(self, service_name: str, domain_name: str) -> None:
+        """Removes the domain name from the negative cache."""
+
+        with self.lock:
+            self._missing.pop((service_name, domain_name), None)
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes every domain record to path as JSON lines, in the format of
+        `SQLiteBackend.export_snapshot`. Returns the number of rows written.
+        """
+
+        with self.lock:
+            records = list(self._domains.values())
+            created_at = dict(self._created_at)
+
+        with open(path, "w", encoding="utf-8") as snapshot:
+            for record in records:
+                row = {
+                    "service": record.service,
+                    "domain_name": record.name,
+                    "record_id": record.record_id,
+                    "current_ip": record.ip,
+                    "last_updated": record.last_updated,
+                    "created_at": created_at.get(record.name),
+                    "ttl": record.ttl,
+                    "proxied": record.proxied,
+                    "verified_at": record.verified_at,
+                }
+                snapshot.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+        logging.info(
+            "Storage: Exported %d record(s) to %s.", len(records), path
+        )
+        return len(records)
+
+    def import_snapshot(self, path: str) -> int:
+        """
+        Loads a JSON lines snapshot, replacing records for the same domain
+        names. Returns the number of rows imported.
+        """
+
+        with open(path, "r", encoding="utf-8") as snapshot:
+            rows = [json.loads(line) for line in snapshot if line.strip()]
+
+        now = _timestamp()
+        with self.lock:
+            for row in rows:
+                name = row["domain_name"]
+                previous = self._domains.get(name)
+                record = Record(
+                    row["service"],
+                    name,
+                    row["current_ip"],
+                    row.get("last_updated") or now,
+                    row.get("record_id"),
+                    ttl=row.get("ttl"),
+                    proxied=row.get("proxied"),
+                    verified_at=row.get("verified_at"),
+                )
+                if previous is not None:
+                    record = _replace(
+                        previous,
+                        service=record.service,
+                        ip=record.ip,
+                        last_updated=record.last_updated,
+                        record_id=record.record_id,
+                        ttl=record.ttl,
+                        proxied=record.proxied,
+                        verified_at=record.verified_at,
+                    )
+                else:
+                    self._created_at[name] = row.get("created_at") or now
+                self._domains[name] = record
+
+        logging.info(
+            "Storage: Imported %d record(s) from %s.", len(rows), path
+        )
+        return len(rows)
@@ -0,0 +1,749 @@
+"""
+SQLite Storage Backend
+
+Provides `SQLiteBackend`, which keeps the records in a SQLite database file,
+or in memory only for a database of ":memory:".
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+import time
+from typing import (
+    Optional,
+    Callable,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+)
+
+from pyddns.record import Record
+from pyddns.storage.base import DuplicateRecordError, Journal, StorageBackend
+from pyddns.tracing import span
+
+
+def handle_sqlite_error(func: Callable) -> Callable:
+    """
+    Decorator utilized to handle all errors involving the SQLite Database.
+
+    Also serializes access to the shared connection, so that records can
+    be planned from worker threads.
+    """
+
+    name = f"sqlite.{func.__name__}"
+
+    def wrapper(self, *args, **kwargs) -> Any:
+
+        try:
+
+            with self.lock, span(name):
+                return func(self, *args, **kwargs)
+
+        except sqlite3.Error as err:
+            logging.error("SQLite Error: %s", err)
+            raise
+        except sqlite3.DatabaseError as err:
+            logging.error("SQLite Database Error: %s", err)
+            raise
+        except sqlite3.DataError as err:
+            logging.error("SQLite Data Error: %s", err)
+            raise
+        except sqlite3.IntegrityError as err:
+            logging.error("SQLite Integrity Error: %s", err)
+            raise
+
+    return wrapper
+
+
+class _SQLiteJournal(Journal):
+    """Flap events and outbox of `SQLiteBackend`."""
+
+    lock: threading.RLock
+    connection: sqlite3.Connection
+    cursor: sqlite3.Cursor
+
+    @handle_sqlite_error
+    def record_flap(
+        self, previous_ip: str, observed_ip: str, held_for: float
+    ) -> None:
+        """
+        Records an IP that was replaced before it was considered stable.
+        """
+
+        sql = """
+        INSERT INTO flap_events(previous_ip, observed_ip, held_for)
+        VALUES(?, ?, ?)
+        """
+        self.cursor.execute(sql, (previous_ip, observed_ip, held_for))
+        self.connection.commit()
+
+    @handle_sqlite_error
+    def retrieve_flap_events(
+        self, limit: int = 100
+    ) -> List[Tuple[str, str, float, str]]:
+        """
+        Retrieves the most recent flap events, newest first, as
+        (previous_ip, observed_ip, held_for, occurred_at) tuples.
+        """
+
+        sql = """
+        SELECT previous_ip, observed_ip, held_for, occurred_at
+        FROM flap_events
+        ORDER BY id DESC
+        LIMIT ?
+        """
+        self.cursor.execute(sql, (limit,))
+        return self.cursor.fetchall()
+
+    @handle_sqlite_error
+    def enqueue_changes(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, str, Optional[str]]],
+    ) -> None:
+        """
+        Journals (domain_name, new_ip, reason, record_id) rows in the outbox
+        before they are sent. A newer change replaces a pending or dead one
+        for the same record, so the outbox only holds the latest value. A new
+        value starts over without failed attempts.
+        """
+
+        sql = """
+        INSERT INTO outbox(service, domain_name, new_ip, reason, record_id)
+        VALUES(?, ?, ?, ?, ?)
+        ON CONFLICT(service, domain_name) DO UPDATE SET
+            attempts = CASE
+                WHEN new_ip = excluded.new_ip THEN attempts ELSE 0
+            END,
+            new_ip = excluded.new_ip,
+            reason = excluded.reason,
+            record_id = COALESCE(excluded.record_id, record_id),
+            dead = 0,
+            queued_at = CURRENT_TIMESTAMP
+        """
+        params = [
+            (service_name, domain_name, new_ip, reason, record_id)
+            for domain_name, new_ip, reason, record_id in rows
+        ]
+        with self.connection:
+            self.cursor.executemany(sql, params)
+
+    @handle_sqlite_error
+    def pending_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, Optional[str], int]]:
+        """
+        Returns (domain_name, new_ip, reason, record_id, attempts) rows that
+        are still waiting in the outbox, oldest first. Dead rows are left
+        out.
+        """
+
+        sql = """
+        SELECT domain_name, new_ip, reason, record_id, attempts
+        FROM outbox
+        WHERE service = ? AND dead = 0
+        ORDER BY queued_at, domain_name
+        """
+        self.cursor.execute(sql, (service_name,))
+        return self.cursor.fetchall()
+
+    @handle_sqlite_error
+    def complete_changes(
+        self, service_name: str, rows: Iterable[Tuple[str, str]]
+    ) -> None:
+        """
+        Removes sent (domain_name, new_ip) rows from the outbox. A row that
+        was replaced by a newer value in the meantime is kept.
+        """
+
+        sql = """
+        DELETE FROM outbox
+        WHERE service = ? AND domain_name = ? AND new_ip = ?
+        """
+        params = [
+            (service_name, domain_name, new_ip) for domain_name, new_ip in rows
+        ]
+        with self.connection:
+            self.cursor.executemany(sql, params)
+
+    @handle_sqlite_error
+    def fail_changes(
+        self, service_name: str, domain_names: Iterable[str], error: str
+    ) -> None:
+        """Records a failed attempt for the given outbox rows."""
+
+        sql = """
+        UPDATE outbox
+        SET attempts = attempts + 1, last_error = ?
+        WHERE service = ? AND domain_name = ?
+        """
+        params = [(error, service_name, name) for name in domain_names]
+        with self.connection:
+            self.cursor.executemany(sql, params)
+        logging.warning(
+            "SQLite: Kept %d %s change(s) in the outbox: %s",
+            len(params),
+            service_name,
+            error,
+        )
+
+    @handle_sqlite_error
+    def mark_dead(
+        self, service_name: str, domain_names: Iterable[str]
+    ) -> None:
+        """
+        Stops replaying the given outbox rows. They are kept with their last
+        error until a newer change for the record replaces them.
+        """
+
+        sql = """
+        UPDATE outbox SET dead = 1 WHERE service = ? AND domain_name = ?
+        """
+        params = [(service_name, name) for name in domain_names]
+        with self.connection:
+            self.cursor.executemany(sql, params)
+
+    @handle_sqlite_error
+    def dead_changes(
+        self, service_name: str
+    ) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """
+        Returns (domain_name, new_ip, reason, attempts, last_error) rows that
+        were given up on, oldest first.
+        """
+
+        sql = """
+        SELECT domain_name, new_ip, reason, attempts, last_error
+        FROM outbox
+        WHERE service = ? AND dead = 1
+        ORDER BY queued_at, domain_name
+        """
+        self.cursor.execute(sql, (service_name,))
+        return self.cursor.fetchall()
+
+
+class SQLiteBackend(_SQLiteJournal, StorageBackend):
+    """
+    A class to manage SQLite database operations for DDNS services.
+
+    This class handles the creation, updating, and retrieval of domain records
+    in a SQLite database. A database of ":memory:" keeps them in memory only.
+    """
+
+    def __init__(self, filename: str = "py_ddns.db"):
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.cursor = self.connection.cursor()
+
+        self.create_tables()
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.lock:
+            self.connection.close()
+
+    @handle_sqlite_error
+    def create_tables(self) -> None:
+        """Method to create all SQLite tables utilized by pyddns"""
+
+        sql = """
+        CREATE TABLE IF NOT EXISTS domains (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service TEXT NOT NULL,
+            domain_name TEXT NOT NULL UNIQUE,
+            record_id TEXT DEFAULT NULL,
+            current_ip TEXT NOT NULL,
+            last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ttl INTEGER DEFAULT NULL,
+            proxied INTEGER DEFAULT NULL,
+            verified_at REAL DEFAULT NULL,
+            UNIQUE(service, domain_name)
+        )
+        """
+        self.cursor.execute(sql)
+
+        # Databases created by earlier versions lack the columns below.
+        self.cursor.execute("PRAGMA table_info(domains)")
+        columns = {row[1] for row in self.cursor.fetchall()}
+        for column, definition in (
+            ("ttl", "INTEGER DEFAULT NULL"),
+            ("proxied", "INTEGER DEFAULT NULL"),
+            ("verified_at", "REAL DEFAULT NULL"),
+        ):
+            if column not in columns:
+                self.cursor.execute(
+                    f"ALTER TABLE domains ADD COLUMN {column} {definition}"
+                )
+                logging.info("SQLite: Added column %s to domains.", column)
+
+        sql = """
+        CREATE TABLE IF NOT EXISTS flap_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            previous_ip TEXT NOT NULL,
+            observed_ip TEXT NOT NULL,
+            held_for REAL NOT NULL,
+            occurred_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+        self.cursor.execute(sql)
+
+        sql = """
+        CREATE TABLE IF NOT EXISTS missing_records (
+            service TEXT NOT NULL,
+            domain_name TEXT NOT NULL,
+            checked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(service, domain_name)
+        )
+        """
+        self.cursor.execute(sql)
+
+        sql = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            service TEXT NOT NULL,
+            domain_name TEXT NOT NULL,
+            new_ip TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            record_id TEXT DEFAULT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT DEFAULT NULL,
+            queued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            dead INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(service, domain_name)
+        )
+        """
+        self.cursor.execute(sql)
+
+        self.cursor.execute("PRAGMA table_info(outbox)")
+        if "dead" not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute(
+                "ALTER TABLE outbox ADD COLUMN dead INTEGER NOT NULL DEFAULT 0"
+            )
+            logging.info("SQLite: Added column dead to outbox.")
+        self.connection.commit()
+        logging.debug(
+            "SQLite: Successfully verified that all tables are present."
+        )
+
+    @handle_sqlite_error
+    def drop_tables(self) -> None:
+        """Method to drop all SQLite tables utilized by pyddns"""
+
+        logging.warning(
+            "one or more database tables have been requested to be dropped."
+        )
+
+        sql = """
+        DROP TABLE IF EXISTS domains;
+        DROP TABLE IF EXISTS flap_events;
+        DROP TABLE IF EXISTS missing_records;
+        DROP TABLE IF EXISTS outbox;
+        """
+        self.cursor.executescript(sql)
+        self.connection.commit()
+
+        logging.info("database tables have sucessfully been dropped.")
+
+    @handle_sqlite_error
+    def add_service(
+        self,
+        service_name: str,
+        domain_name: str,
+        current_ip: str,
+        record_id: Optional[str] = None,
+    ) -> None:
+        """
+        Adds a service to the SQLite database and sets a created_at timestamp
+
+        Raises:
+            DuplicateRecordError: If the domain name is already stored.
+        """
+
+        self._insert_domains(
+            [(service_name, domain_name, current_ip, record_id)]
+        )
+        logging.debug(
+            "SQLite: Adding service: %s, Domain: %s, IP: %s",
+            service_name,
+            domain_name,
+            current_ip,
+        )
+        logging.info("SQLite: Sucessfully added %s to database.", service_name)
+
+    @handle_sqlite_error
+    def add_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> None:
+        """
+        Adds (domain_name, current_ip, record_id) rows in a single transaction
+
+        Raises:
+            DuplicateRecordError: If one of the domain names is already
+                stored.
+        """
+
+        params = [
+            (service_name, domain_name, current_ip, record_id)
+            for domain_name, current_ip, record_id in rows
+        ]
+        self._insert_domains(params)
+        logging.info(
+            "SQLite: Sucessfully added %d %s record(s) to database.",
+            len(params),
+            service_name,
+        )
+
+    def _insert_domains(
+        self, params: List[Tuple[str, str, str, Optional[str]]]
+    ) -> None:
+        """
+        Inserts (service, domain_name, current_ip, record_id) rows and
+        commits them, or none of them.
+        """
+
+        sql = """
+        INSERT INTO domains(service, domain_name, current_ip, record_id)
+        VALUES(?, ?, ?, ?)
+        """
+        try:
+            self.cursor.executemany(sql, params)
+        except sqlite3.IntegrityError as err:
+            self.connection.rollback()
+            if "UNIQUE" not in str(err):
+                raise
+            names = ", ".join(sorted({row[1] for row in params}))
+            raise DuplicateRecordError(
+                f"Storage: {names} already stored."
+            ) from err
+        self.connection.commit()
+
+    @handle_sqlite_error
+    def upsert_services(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, str, Optional[str]]],
+    ) -> int:
+        """
+        Inserts or refreshes (domain_name, current_ip, record_id) rows in a
+        single transaction. Returns the number of rows written.
+        """
+
+        sql = """
+        INSERT INTO domains(service, domain_name, current_ip, record_id)
+        VALUES(?, ?, ?, ?)
+        ON CONFLICT(domain_name) DO UPDATE SET
+            service = excluded.service,
+            current_ip = excluded.current_ip,
+            record_id = COALESCE(excluded.record_id, record_id)
+        """
+        params = (
+            (service_name, domain_name, current_ip, record_id)
+            for domain_name, current_ip, record_id in rows
+        )
+        with self.connection:
+            self.cursor.executemany(sql, params)
+        count = self.cursor.rowcount
+        logging.info("SQLite: Seeded %d %s record(s).", count, service_name)
+        return count
+
+    @handle_sqlite_error
+    def update_ip(
+        self, service_name: str, domain_name: str, current_ip: Optional[str]
+    ) -> None:
+        """
+        Updated the domain name's IP address in the SQLite database.
+
+        The record has to be verified again after an update.
+        """
+
+        sql = """
+        UPDATE domains
+        SET service = COALESCE(?, service),
+            current_ip = COALESCE(?, current_ip),
+            last_updated = CURRENT_TIMESTAMP,
+            verified_at = NULL
+         WHERE domain_name = ?
+        """
+        self.cursor.execute(sql, (service_name, current_ip, domain_name))
+        self.connection.commit()
+        logging.info(
+            "SQLite: Updated %s on %s to %s",
+            domain_name,
+            service_name,
+            current_ip,
+        )
+
+    @handle_sqlite_error
+    def retrieve_record(self, domain_name: str) -> Optional[Record]:
+        """
+        Retrieves IP address, last_updated, and record_id from SQLite database
+        """
+
+        sql = """
+        SELECT service, domain_name, current_ip, last_updated, record_id,
+               ttl, proxied, verified_at
+        FROM domains
+        WHERE domain_name = ?
+        """
+        self.cursor.execute(sql, (domain_name,))
+        response = self.cursor.fetchone()
+
+        if not response:
+            return None
+
+        return Record.from_row(response)
+
+    @handle_sqlite_error
+    def update_ips(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[str]]],
+    ) -> None:
+        """Updates (domain_name, current_ip) rows in a single transaction."""
+
+        sql = """
+        UPDATE domains
+        SET service = COALESCE(?, service),
+            current_ip = COALESCE(?, current_ip),
+            last_updated = CURRENT_TIMESTAMP,
+            verified_at = NULL
+         WHERE domain_name = ?
+        """
+        params = [
+            (service_name, current_ip, domain_name)
+            for domain_name, current_ip in rows
+        ]
+        self.cursor.executemany(sql, params)
+        self.connection.commit()
+        logging.info(
+            "SQLite: Updated %d %s record(s).", len(params), service_name
+        )
+
+    @handle_sqlite_error
+    def retrieve_records(
+        self, domain_names: Iterable[str]
+    ) -> Dict[str, Record]:
+        """
+        Retrieves IP address, last_updated, and record_id for many domains
+        with a single query, keyed by domain name.
+        """
+
+        names = list(domain_names)
+        records: Dict[str, Record] = {}
+
+        # Stay below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds.
+        for start in range(0, len(names), 500):
+            chunk = names[start : start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            sql = f"""
+            SELECT service, domain_name, current_ip, last_updated, record_id,
+                   ttl, proxied, verified_at
+            FROM domains
+            WHERE domain_name IN ({placeholders})
+            """
+            self.cursor.execute(sql, chunk)
+            for row in self.cursor.fetchall():
+                records[row[1]] = Record.from_row(row)
+
+        return records
+
+    @handle_sqlite_error
+    def mark_verified(
+        self,
+        service_name: str,
+        rows: Iterable[Tuple[str, Optional[int], Optional[bool]]],
+        verified_at: Optional[float] = None,
+    ) -> None:
+        """
+        Records that (domain_name, ttl, proxied) rows were just checked
+        against the provider, along with the TTL and proxied flag it
+        reported. None keeps the stored value.
+        """
+
+        sql = """
+        UPDATE domains
+        SET ttl = COALESCE(?, ttl),
+            proxied = COALESCE(?, proxied),
+            verified_at = ?
+        WHERE service = ? AND domain_name = ?
+        """
+        checked = time.time() if verified_at is None else verified_at
+        params = [
+            (
+                ttl,
+                None if proxied is None else int(proxied),
+                checked,
+                service_name,
+                domain_name,
+            )
+            for domain_name, ttl, proxied in rows
+        ]
+        with self.connection:
+            self.cursor.executemany(sql, params)
+
+    def iter_records(
+        self, service_name: Optional[str] = None, batch_size: int = 500
+    ) -> Iterator[Record]:
+        """
+        Streams the stored records, optionally of one service only, without
+        loading the whole table into memory.
+
+        Rows are fetched batch_size at a time on a cursor of their own, the
+        connection lock is only held while a batch is read.
+        """
+
+        sql = """
+        SELECT service, domain_name, current_ip, last_updated, record_id,
+               ttl, proxied, verified_at
+        FROM domains
+        WHERE ? IS NULL OR service = ?
+        ORDER BY id
+        """
+        with self.lock:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(sql, (service_name, service_name))
+            except sqlite3.Error as err:
+                cursor.close()
+                logging.error("SQLite Error: %s", err)
+                raise
+
+        try:
+            while True:
+                with self.lock, span("sqlite.iter_records"):
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield Record.from_row(row)
+        finally:
+            cursor.close()
+
+    @handle_sqlite_error
+    def mark_missing(self, service_name: str, domain_name: str) -> None:
+        """
+        Records that the domain name was confirmed missing at the provider.
+        """
+
+        sql = """
+        INSERT OR REPLACE INTO missing_records(service, domain_name)
+        VALUES(?, ?)
+        """
+        self.cursor.execute(sql, (service_name, domain_name))
+        self.connection.commit()
+        logging.debug(
+            "SQLite: Cached %s as missing on %s.", domain_name, service_name
+        )
+
+    @handle_sqlite_error
+    def is_missing(
+        self, service_name: str, domain_name: str, ttl: float
+    ) -> bool:
+        """
+        Returns True if the domain name was confirmed missing within the last
+        ttl seconds.
+        """
+
+        sql = """
+        SELECT 1 FROM missing_records
+        WHERE service = ? AND domain_name = ?
+          AND checked_at > datetime('now', ?)
+        """
+        self.cursor.execute(
+            sql, (service_name, domain_name, f"-{float(ttl)} seconds")
+        )
+        return self.cursor.fetchone() is not None
+
+    @handle_sqlite_error
+    def clear_missing(self, service_name: str, domain_name: str) -> None:
+        """Removes the domain name from the negative cache."""
+
+        sql = """
+        DELETE FROM missing_records WHERE service = ? AND domain_name = ?
+        """
+        self.cursor.execute(sql, (service_name, domain_name))
+        self.connection.commit()
+
+    @handle_sqlite_error
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes every domain row to path as JSON lines, including the TTL
+        verification fields. Returns the number of rows written.
+        """
+
+        sql = """
+        SELECT service, domain_name, record_id, current_ip, last_updated,
+               created_at, ttl, proxied, verified_at
+        FROM domains
+        ORDER BY id
+        """
+        self.cursor.execute(sql)
+        columns = [column[0] for column in self.cursor.description]
+
+        count = 0
+        with open(path, "w", encoding="utf-8") as snapshot:
+            while rows := self.cursor.fetchmany(1000):
+                for row in rows:
+                    record = dict(zip(columns, row))
+                    if record["proxied"] is not None:
+                        record["proxied"] = bool(record["proxied"])
+                    snapshot.write(
+                        json.dumps(record, separators=(",", ":")) + "\n"
+                    )
+                    count += 1
+
+        logging.info("SQLite: Exported %d record(s) to %s.", count, path)
+        return count
+
+    @handle_sqlite_error
+    def import_snapshot(self, path: str) -> int:
+        """
+        Loads a JSON lines snapshot written by export_snapshot in a single
+        transaction, replacing rows for the same domain names.
+        Returns the number of rows imported.
+        """
+
+        sql = """
+        INSERT INTO domains(service, domain_name, record_id, current_ip,
+                            last_updated, created_at, ttl, proxied,
+                            verified_at)
+        VALUES(:service, :domain_name, :record_id, :current_ip,
+               COALESCE(:last_updated, CURRENT_TIMESTAMP),
+               COALESCE(:created_at, CURRENT_TIMESTAMP),
+               :ttl, :proxied, :verified_at)
+        ON CONFLICT(domain_name) DO UPDATE SET
+            service = excluded.service,
+            record_id = excluded.record_id,
+            current_ip = excluded.current_ip,
+            last_updated = excluded.last_updated,
+            ttl = excluded.ttl,
+            proxied = excluded.proxied,
+            verified_at = excluded.verified_at
+        """
+
+        with open(path, "r", encoding="utf-8") as snapshot:
+            rows = [
+                {
+                    "record_id": None,
+                    "last_updated": None,
+                    "created_at": None,
+                    "ttl": None,
+                    "proxied": None,
+                    "verified_at": None,
+                    **json.loads(line),
+                }
+                for line in snapshot
+                if line.strip()
+            ]
+
+        with self.connection:
+            self.cursor.executemany(sql, rows)
+
+        logging.info("SQLite: Imported %d record(s) from %s.", len(rows), path)
+        return len(rows)
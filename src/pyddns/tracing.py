@@ -0,0 +1,312 @@
+"""
+Tracing Module
+
+Provides lightweight span instrumentation for the hot paths of pyddns and
+opt-in profiling. Spans are handed to a pluggable exporter, either the log
+based `LogExporter` or the `OpenTelemetryExporter`. While no exporter is
+installed `span` returns a shared no-op context manager, so instrumented
+code pays for little more than a function call.
+"""
+
+from abc import ABC, abstractmethod
+import contextlib
+import contextvars
+import cProfile
+from dataclasses import dataclass, field
+import functools
+import logging
+import os
+import time
+import tracemalloc
+from types import TracebackType
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    Optional,
+    Type,
+    TypeVar,
+)
+
+EXPORTERS = ("none", "log", "otel")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass(frozen=True)
+class Span:
+    """
+    A finished, timed operation.
+
+    Attributes:
+        name: Operation name, e.g. "cloudflare.batch".
+        start_time: Wall clock start in seconds since the epoch.
+        duration: Duration in seconds.
+        parent: Name of the enclosing span, if any.
+        attributes: Extra key/value pairs describing the operation.
+        error: Repr of the exception that ended the span, if any.
+    """
+
+    name: str
+    start_time: float
+    duration: float
+    parent: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class SpanExporter(ABC):
+    """Receives every finished span."""
+
+    @abstractmethod
+    def export(self, finished: Span) -> None:
+        """Exports a finished span. Must be thread safe."""
+
+    def shutdown(self) -> None:
+        """Flushes and releases resources."""
+
+
+class LogExporter(SpanExporter):
+    """Writes one log line per span."""
+
+    def __init__(self, level: int = logging.INFO) -> None:
+        self.level = level
+
+    def export(self, finished: Span) -> None:
+        logging.log(
+            self.level,
+            "Trace: %s took %.1fms%s%s%s",
+            finished.name,
+            finished.duration * 1000,
+            f" in {finished.parent}" if finished.parent else "",
+            "".join(f" {k}={v}" for k, v in finished.attributes.items()),
+            f" error={finished.error}" if finished.error else "",
+        )
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """
+    Re-emits spans through the OpenTelemetry API, so they reach whatever
+    tracer provider the host process configured.
+
+    Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, tracer: Any = None) -> None:
+        if tracer is None:
+            try:
+                # pylint: disable=import-outside-toplevel
+                from opentelemetry import trace
+            except ImportError as err:
+                raise ImportError(
+                    "The otel trace exporter requires opentelemetry-api."
+                ) from err
+            tracer = trace.get_tracer("pyddns")
+        self.tracer = tracer
+
+    def export(self, finished: Span) -> None:
+        start_ns = int(finished.start_time * 1e9)
+        otel_span = self.tracer.start_span(
+            finished.name,
+            start_time=start_ns,
+            attributes=finished.attributes,
+        )
+        if finished.parent:
+            otel_span.set_attribute("pyddns.parent", finished.parent)
+        if finished.error:
+            otel_span.set_attribute("error", True)
+            otel_span.set_attribute("exception.message", finished.error)
+        otel_span.end(end_time=start_ns + int(finished.duration * 1e9))
+
+
+@dataclass
+class _Tracing:
+    """
+    The installed exporter, None while tracing is disabled, and the
+    fallback used while the trace_exporter option is "none".
+    """
+
+    exporter: Optional[SpanExporter] = None
+    fallback: Optional[Callable[[], SpanExporter]] = None
+
+
+_tracing = _Tracing()
+_current: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "pyddns_span", default=None
+)
+_NOOP: ContextManager[None] = contextlib.nullcontext()
+
+
+class _ActiveSpan:
+    __slots__ = ("exporter", "name", "attributes", "start", "token")
+
+    def __init__(
+        self, exporter: SpanExporter, name: str, attributes: Dict[str, Any]
+    ) -> None:
+        self.exporter = exporter
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+        self.token: Optional[contextvars.Token] = None
+
+    def __enter__(self) -> None:
+        self.token = _current.set(self.name)
+        self.start = time.perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        duration = time.perf_counter() - self.start
+        if self.token is not None:
+            _current.reset(self.token)
+        try:
+            self.exporter.export(
+                Span(
+                    name=self.name,
+                    start_time=time.time() - duration,
+                    duration=duration,
+                    parent=_current.get(),
+                    attributes=self.attributes,
+                    error=repr(exc) if exc is not None else None,
+                )
+            )
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logging.debug("Trace: Exporter failed: %s", err)
+
+
+def span(name: str, **attributes: Any) -> ContextManager[None]:
+    """
+    Times the enclosed block as a span named name.
+
+        with span("cloudflare.batch", records=3):
+            ...
+    """
+
+    exporter = _tracing.exporter
+    if exporter is None:
+        return _NOOP
+    return _ActiveSpan(exporter, name, attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator that wraps every call of a function in a span."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            exporter = _tracing.exporter
+            if exporter is None:
+                return func(*args, **kwargs)
+            with _ActiveSpan(exporter, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Installs exporter, or disables tracing if None."""
+
+    previous, _tracing.exporter = _tracing.exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    """Returns the installed exporter, if any."""
+    return _tracing.exporter
+
+
+def set_fallback_exporter(
+    factory: Optional[Callable[[], SpanExporter]],
+) -> None:
+    """
+    Makes configure_tracing("none") install an exporter built by factory
+    instead of disabling tracing, e.g. for --profile. An exporter selected
+    by the trace_exporter option still takes precedence.
+    """
+
+    _tracing.fallback = factory
+    if _tracing.exporter is None and factory is not None:
+        set_exporter(factory())
+
+
+def configure_tracing(name: str) -> None:
+    """
+    Installs the exporter named by the trace_exporter option, see
+    EXPORTERS. An exporter of the same type that is already installed is
+    kept. "none" installs the fallback exporter, if any.
+    """
+
+    factories: Dict[str, Optional[Callable[[], SpanExporter]]] = {
+        "none": _tracing.fallback,
+        "log": LogExporter,
+        "otel": OpenTelemetryExporter,
+    }
+    factory = factories[name]
+    if factory is None:
+        set_exporter(None)
+    elif type(_tracing.exporter) is not factory:  # pylint: disable=C0123
+        set_exporter(factory())
+
+
+class Profiler:
+    """
+    Captures a cProfile and a tracemalloc snapshot per cycle.
+
+    For cycle n, directory/cycle-n.prof (load with pstats) and
+    directory/cycle-n.heap (load with tracemalloc.Snapshot.load) are
+    written. Profiling stops after cycles cycles.
+    """
+
+    def __init__(self, cycles: int, directory: str = ".") -> None:
+        self.cycles = cycles
+        self.directory = directory
+        self.completed = 0
+        self._owns_tracemalloc = False
+
+    @property
+    def active(self) -> bool:
+        """Returns True while cycles remain to be profiled."""
+        return self.completed < self.cycles
+
+    @contextlib.contextmanager
+    def cycle(self) -> Iterator[None]:
+        """Profiles the enclosed cycle if any profiled cycles remain."""
+
+        if not self.active:
+            yield
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        index = self.completed + 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            base = os.path.join(self.directory, f"cycle-{index}")
+            profile.dump_stats(f"{base}.prof")
+            tracemalloc.take_snapshot().dump(f"{base}.heap")
+            self.completed = index
+            if self._owns_tracemalloc and not self.active:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+            logging.info(
+                "Profile: Wrote %s.prof and %s.heap (%d/%d).",
+                base,
+                base,
+                index,
+                self.cycles,
+            )
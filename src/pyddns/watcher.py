@@ -0,0 +1,168 @@
+"""
+Config Watcher Module
+
+Watches the configuration file and hot-reloads `Config` when it changes.
+On Linux the watcher uses inotify through ctypes, elsewhere (or if inotify
+is unavailable) it falls back to polling the file's modification time.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Optional, Tuple
+
+from pyddns.config import Config
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify_libc() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        libc.inotify_init1  # pylint: disable=pointless-statement
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class ConfigWatcher:
+    """
+    Background thread that calls `Config.reload` when the file changes.
+
+    The parent directory is watched rather than the file itself, so that
+    editors that replace the file on save are detected as well. A change is
+    only reloaded once the file has stopped changing for settle_time seconds.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        poll_interval: float = 2.0,
+        use_inotify: bool = True,
+        settle_time: float = 0.1,
+    ) -> None:
+        self.config = config
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.use_inotify = use_inotify
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.mode = "stopped"
+
+    def start(self) -> "ConfigWatcher":
+        """Starts watching in a daemon thread."""
+
+        fd = self._open_inotify() if self.use_inotify else None
+        self.mode = "inotify" if fd is not None else "polling"
+        target = self._watch_inotify if fd is not None else self._watch_poll
+        args: Tuple = (fd,) if fd is not None else ()
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=target, args=args, name="pyddns-config", daemon=True
+        )
+        self._thread.start()
+        logging.info(
+            "Config: Watching %s for changes (%s).",
+            self.config.config_file,
+            self.mode,
+        )
+        return self
+
+    def stop(self) -> None:
+        """Stops the watcher thread."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+        self._thread = None
+        self.mode = "stopped"
+
+    def _reload(self) -> None:
+        # Wait for the writer to finish, so a half-written file is not read.
+        last = self._stat()
+        while not self._stop.wait(self.settle_time):
+            current = self._stat()
+            if current == last:
+                break
+            last = current
+
+        try:
+            self.config.reload()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logging.error("Config: Reload failed: %s", err)
+
+    def _open_inotify(self) -> Optional[int]:
+        libc = _inotify_libc()
+        if libc is None:
+            return None
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+
+        directory = os.path.dirname(os.path.abspath(self.config.config_file))
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _watch_inotify(self, fd: int) -> None:
+        name = os.path.basename(self.config.config_file).encode()
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], self.poll_interval)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                if name in self._event_names(data):
+                    self._reload()
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _event_names(data: bytes) -> set:
+        names = set()
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            names.add(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+        return names
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.config.config_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _watch_poll(self) -> None:
+        last = self._stat()
+        while not self._stop.wait(self.poll_interval):
+            current = self._stat()
+            if current is not None and current != last:
+                self._reload()
+                last = self._stat()
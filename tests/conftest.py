@@ -1,5 +1,6 @@
 import os
 import pytest
+from pyddns.storage import BACKENDS, Storage
 
 
 @pytest.fixture(autouse=True)
@@ -10,6 +11,7 @@ def setup_and_teardown_per_test():
 
     yield  # This allows each test to run before cleanup
 
+    Storage().close()
     files = ["py_ddns.ini", "py_ddns.db", "py_ddns.log"]
     for file in files:
         try:
@@ -17,3 +19,10 @@ def setup_and_teardown_per_test():
                 os.remove(file)
         except Exception as e:
             print(f"Error occurred while trying to remove {file}: {e}")
+
+
+@pytest.fixture(params=BACKENDS)
+def storage_backend(request):
+    """Runs a test against every storage backend."""
+    Storage(backend=request.param)
+    return request.param
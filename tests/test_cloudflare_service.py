@@ -1,7 +1,20 @@
+import socket
+import threading
+import time
 import pytest
 from unittest.mock import MagicMock
+from pyddns.deadline import Deadline, DeadlineExceeded
+from cloudflare import APIError
+from pyddns.reconcile import RecordChange, RecordState, Reconciler
 from pyddns.services.cloudflare_service import CloudflareDNS
 
+pytestmark = pytest.mark.usefixtures("storage_backend")
+
+
+def _page(records, more=False):
+    """A page of a zone listing as returned by the SDK."""
+    return MagicMock(result=records, **{"has_next_page.return_value": more})
+
 
 def test_cloudflare_dns_initialization():
     with pytest.raises(KeyError):
@@ -24,11 +37,276 @@ def test_cloudflare_dns_update():
 def test_cloudflare_dns_obtain_record():
     client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
     client.cf_client = MagicMock()
-    client.cf_client.dns.records.list = MagicMock(
-        return_value=MagicMock(result=[])
-    )
+    client.cf_client.dns.records.list = MagicMock(return_value=_page([]))
 
     record = client._obtain_record("test.example.com")
     assert (
         record is None
     ), "_obtain_record should return None if no records are found!"
+
+
+def test_cloudflare_dns_negative_cache():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.cf_client = MagicMock()
+    client.cf_client.dns.records.list = MagicMock(return_value=_page([]))
+
+    assert client._obtain_record("missing.example.com") is None
+    assert client._obtain_record("missing.example.com") is None
+    client.cf_client.dns.records.list.assert_called_once()
+
+    assert client.check_cloudflare_ip("missing.example.com") is None
+
+
+def test_cloudflare_dns_auto_create():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.auto_create = True
+    client.get_ipv4 = MagicMock(return_value="127.0.0.1")
+    client.cf_client = MagicMock()
+    client.cf_client.dns.records.list = MagicMock(return_value=_page([]))
+    client.cf_client.dns.records.create = MagicMock(
+        return_value=MagicMock(
+            id="new-id", content="127.0.0.1", type="A"
+        )
+    )
+    client.cf_client.dns.records.create.return_value.name = "new.example.com"
+
+    record = client._obtain_record("new.example.com")
+
+    assert record[0] == "127.0.0.1"
+    assert record[2] == "new-id"
+    client.cf_client.dns.records.create.assert_called_once()
+    assert (
+        client.cf_client.dns.records.create.call_args.kwargs["type"] == "A"
+    )
+
+
+def test_cloudflare_dns_seed():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.storage = MagicMock()
+    client.cf_client = MagicMock()
+    records = [
+        MagicMock(type="A", content="127.0.0.1", id="1"),
+        MagicMock(type="TXT", content="text", id="2"),
+    ]
+    records[0].name = "a.example.com"
+    records[1].name = "a.example.com"
+    client.cf_client.dns.records.list = MagicMock(return_value=_page(records))
+
+    client.seed()
+
+    client.cf_client.dns.records.list.assert_called_once()
+    client.storage.upsert_services.assert_called_once_with(
+        "Cloudflare", [("a.example.com", "127.0.0.1", "1")]
+    )
+
+
+def test_cloudflare_dns_trusts_records_within_ttl():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.cf_client = MagicMock()
+    listed = MagicMock(
+        type="A", content="127.0.0.1", id="id-ttl", ttl=1, proxied=False
+    )
+    listed.name = "ttl.example.com"
+    client.cf_client.dns.records.list = MagicMock(return_value=_page([listed]))
+    client.storage.add_service(
+        "Cloudflare", "ttl.example.com", "127.0.0.1", "id-ttl"
+    )
+
+    (state,) = client.fetch_state(["ttl.example.com"])
+    assert state.provider_ip == "127.0.0.1"
+    record = client.storage.retrieve_record("ttl.example.com")
+    assert (record.ttl, record.proxied) == (300, False)
+
+    # Verified within the TTL, no listing and no API call needed.
+    (state,) = client.fetch_state(["ttl.example.com"])
+    assert state.provider_ip == "127.0.0.1"
+    assert state.record_id == "id-ttl"
+    assert client.check_cloudflare_ip("ttl.example.com") == "127.0.0.1"
+    client.cf_client.dns.records.list.assert_called_once()
+    client.cf_client.dns.records.get.assert_not_called()
+
+    # The stored proxied flag is kept on updates.
+    client.cf_client.dns.records.update.return_value = MagicMock(
+        content="127.0.0.2", ttl=1, proxied=False
+    )
+    client.cf_client.dns.records.update.return_value.name = "ttl.example.com"
+    client.update_dns("127.0.0.2", "ttl.example.com")
+    kwargs = client.cf_client.dns.records.update.call_args.kwargs
+    assert kwargs["proxied"] is False
+
+
+def test_cloudflare_dns_reconcile_uses_negative_cache():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.get_ipv4 = MagicMock(return_value="127.0.0.1")
+    client.cf_client = MagicMock()
+    client.cf_client.dns.records.list = MagicMock(return_value=_page([]))
+
+    for _ in range(3):
+        client.check_and_update_dns("typo.example.com")
+
+    client.cf_client.dns.records.list.assert_called_once()
+    assert client.storage.is_missing(
+        "Cloudflare", "typo.example.com", client.negative_cache_ttl
+    )
+    client.cf_client.dns.records.batch.assert_not_called()
+
+    # Once the cache expires, the zone is listed again.
+    client.negative_cache_ttl = 0
+    client.check_and_update_dns("typo.example.com")
+    assert client.cf_client.dns.records.list.call_count == 2
+
+
+def _listed(name, content, record_id):
+    record = MagicMock(
+        type="A", content=content, id=record_id, ttl=1, proxied=False
+    )
+    record.name = name
+    return record
+
+
+def test_cloudflare_dns_vanished_record_is_missing():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.get_ipv4 = MagicMock(return_value="127.0.0.2")
+    client.cf_client = MagicMock()
+    client.cf_client.dns.records.list = MagicMock(
+        return_value=_page(
+            [_listed("kept.example.com", "127.0.0.1", "id-kept")]
+        )
+    )
+    client.storage.add_service(
+        "Cloudflare", "gone.example.com", "127.0.0.2", "id-gone"
+    )
+    client.storage.add_service(
+        "Cloudflare", "kept.example.com", "127.0.0.1", "id-kept"
+    )
+    names = ("gone.example.com", "kept.example.com")
+
+    plan = Reconciler([client], record_names={"Cloudflare": names}).plan()
+
+    (gone,) = plan.missing
+    assert (gone.record_name, gone.record_id) == ("gone.example.com", None)
+    assert [c.record_name for c in plan.changes] == ["kept.example.com"]
+
+    client.auto_create = True
+    plan = Reconciler([client], record_names={"Cloudflare": names}).plan()
+    reasons = {c.record_name: c.reason for c in plan.changes}
+    assert reasons == {
+        "gone.example.com": "create",
+        "kept.example.com": "ip_changed",
+    }
+
+    response = client.cf_client.dns.records.batch.return_value
+    response.patches = [_listed("kept.example.com", "127.0.0.2", "id-kept")]
+    response.posts = [_listed("gone.example.com", "127.0.0.2", "id-new")]
+    client.apply_changes(plan.changes)
+    assert client.storage.retrieve_record("gone.example.com").record_id == (
+        "id-new"
+    )
+
+
+def test_cloudflare_dns_listing_pages_share_the_deadline():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.cf_client = MagicMock()
+    now = [0.0]
+    pages = [
+        _page([_listed(f"{n}.example.com", "127.0.0.1", str(n))], more=True)
+        for n in range(5)
+    ]
+
+    def list_page(**kwargs):
+        # Every page takes 4 of the 10 seconds budget.
+        assert kwargs["timeout"] <= 10 - now[0]
+        now[0] += 4
+        return pages[kwargs["page"] - 1]
+
+    client.cf_client.dns.records.list = MagicMock(side_effect=list_page)
+
+    with pytest.raises(DeadlineExceeded):
+        client.seed(deadline=Deadline(10, clock=lambda: now[0]))
+
+    timeouts = [
+        call.kwargs["timeout"]
+        for call in client.cf_client.dns.records.list.call_args_list
+    ]
+    assert timeouts == [10, 6, 2]
+
+
+def test_cloudflare_dns_update_is_bounded_by_deadline():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.cf_client = MagicMock()
+    client.cf_client.dns.records.list = MagicMock(
+        return_value=_page([_listed("a.example.com", "127.0.0.1", "id-a")])
+    )
+    client.cf_client.dns.records.update = MagicMock(
+        return_value=_listed("a.example.com", "127.0.0.2", "id-a")
+    )
+    client.storage.add_service(
+        "Cloudflare", "a.example.com", "127.0.0.1", "id-a"
+    )
+
+    client.update_dns("127.0.0.2", "a.example.com", Deadline(5))
+
+    timeout = client.cf_client.dns.records.update.call_args.kwargs["timeout"]
+    assert 0 < timeout <= 5
+
+
+def test_cloudflare_dns_hung_api_cannot_overrun_budget():
+    # An endpoint that accepts connections and never answers.
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                accepted.append(server.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.cf_client = client.cf_client.with_options(
+        base_url=f"http://127.0.0.1:{server.getsockname()[1]}"
+    )
+    state = RecordState("Cloudflare", "a.example.com", "1.1.1.1", "1.1.1.1")
+    started = time.monotonic()
+    try:
+        with pytest.raises(APIError):
+            client.apply_changes(
+                [RecordChange(state, "2.2.2.2", "ip_changed")], Deadline(0.5)
+            )
+    finally:
+        server.close()
+        for conn in accepted:
+            conn.close()
+
+    assert time.monotonic() - started < 1.5
+
+
+def test_cloudflare_dns_dry_run_leaves_storage_untouched():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.get_ipv4 = MagicMock(return_value="127.0.0.1")
+    client.cf_client = MagicMock()
+    client.cf_client.dns.records.list = MagicMock(
+        return_value=_page([_listed("a.example.com", "127.0.0.1", "id-a")])
+    )
+    client.storage.add_service(
+        "Cloudflare", "a.example.com", "127.0.0.1", "id-a"
+    )
+    reconciler = Reconciler(
+        [client],
+        record_names={"Cloudflare": ("a.example.com", "gone.example.com")},
+    )
+
+    plan = reconciler.run(dry_run=True)
+
+    assert [s.record_name for s in plan.missing] == ["gone.example.com"]
+    assert not client.storage.is_missing(
+        "Cloudflare", "gone.example.com", 3600
+    )
+    assert client.storage.retrieve_record("a.example.com").verified_at is None
+
+    reconciler.run(dry_run=False)
+    assert client.storage.is_missing("Cloudflare", "gone.example.com", 3600)
+    assert client.storage.retrieve_record("a.example.com").verified_at
@@ -17,3 +17,72 @@ def test_config_get():
 def test_config_file_not_found():
     with pytest.raises(FileNotFoundError):
         Config(config_file="non_existent.ini")
+
+
+def _write_config(contents):
+    with open("py_ddns.ini", "w") as f:
+        f.write(contents)
+
+
+def test_config_snapshot():
+    _write_config(
+        "[Client_settings]\nlogging_level=info\nstable_samples=3\n"
+        "[Duckdns]\ntoken=abc\ndomains=a, b\n"
+    )
+    config = Config(config_file="py_ddns.ini")
+    assert config.snapshot.client.damping.stable_samples == 3
+    assert config.snapshot.providers["Duckdns"].records == ("a", "b")
+
+
+def test_config_snapshot_validation():
+    _write_config("[Client_settings]\nlogging_level=info\n[Cloudflare]\n")
+    with pytest.raises(ValueError):
+        Config(config_file="py_ddns.ini")
+
+    _write_config("[Client_settings]\nlogging_level=info\nstable_samples=x\n")
+    with pytest.raises(ValueError):
+        Config(config_file="py_ddns.ini")
+
+
+def test_config_reload_notifies_changed_sections():
+    _write_config("[Client_settings]\nlogging_level=info\n[Duckdns]\ntoken=a\n")
+    config = Config(config_file="py_ddns.ini")
+    seen = []
+    config.subscribe(lambda snapshot, changed: seen.append(changed))
+
+    _write_config("[Client_settings]\nlogging_level=info\n[Duckdns]\ntoken=b\n")
+    assert config.reload() == {"Duckdns"}
+    assert seen[-1] == {"Duckdns"}
+    assert config.get("Duckdns", "token") == "b"
+
+
+def test_config_reload_keeps_snapshot_on_invalid_file():
+    config = Config(config_file="py_ddns.ini")
+    snapshot = config.snapshot
+
+    _write_config("[Client_settings]\nlogging_level=verbose\n")
+    assert config.reload() == frozenset()
+    assert config.snapshot is snapshot
+
+
+def test_config_snapshot_validates_log_rotation():
+    _write_config("[Client_settings]\nlogging_level=info\nlog_rotation=weekly\n")
+    with pytest.raises(ValueError):
+        Config(config_file="py_ddns.ini")
+
+    _write_config(
+        "[Client_settings]\nlogging_level=info\nlog_rotation=time\n"
+        "log_when=fortnightly\n"
+    )
+    with pytest.raises(ValueError):
+        Config(config_file="py_ddns.ini")
+
+
+def test_config_reload_keeps_snapshot_if_settings_fail(tmp_path):
+    config = Config(config_file="py_ddns.ini")
+    snapshot = config.snapshot
+
+    missing = tmp_path / "missing" / "py_ddns.log"
+    _write_config(f"[Client_settings]\nlogging_level=info\nlog_file={missing}\n")
+    assert config.reload() == frozenset()
+    assert config.snapshot is snapshot
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from pyddns import __main__ as cli
+from pyddns.damping import FlapDamper
+from pyddns.reconcile import RecordState, Reconciler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_damper_requires_consecutive_samples():
+    damper = FlapDamper(stable_samples=3)
+
+    assert damper.observe("1.1.1.1") is None
+    assert damper.observe("1.1.1.1") is None
+    assert damper.observe("1.1.1.1") == "1.1.1.1"
+    assert damper.observe("2.2.2.2") == "1.1.1.1"
+
+
+def test_damper_requires_stable_seconds():
+    clock = FakeClock()
+    damper = FlapDamper(stable_seconds=60, clock=clock)
+
+    assert damper.observe("1.1.1.1") is None
+    clock.now = 61
+    assert damper.observe("1.1.1.1") == "1.1.1.1"
+
+
+def test_damper_records_flaps():
+    storage = MagicMock()
+    damper = FlapDamper(stable_samples=2, storage=storage)
+
+    damper.observe("1.1.1.1")
+    damper.observe("1.1.1.1")
+    damper.observe("2.2.2.2")
+    damper.observe("1.1.1.1")
+
+    storage.record_flap.assert_called_once()
+    assert storage.record_flap.call_args.args[:2] == ("2.2.2.2", "1.1.1.1")
+
+
+def test_damper_coalesce_window():
+    damper = FlapDamper(coalesce_window=300)
+    recent = datetime.now(timezone.utc) - timedelta(seconds=10)
+    old = datetime.now(timezone.utc) - timedelta(seconds=600)
+
+    assert damper.allow_update(None)
+    assert not damper.allow_update(recent.strftime("%Y-%m-%d %H:%M:%S"))
+    assert damper.allow_update(old.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def test_reconciler_holds_unstable_changes():
+    client = MagicMock(service_name="Test", auto_create=False)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.fetch_state.return_value = (
+        RecordState(
+            service="Test",
+            record_name="a",
+            db_ip="1.1.1.1",
+            provider_ip="1.1.1.1",
+            record_id="1",
+            stored=True,
+        ),
+    )
+
+    reconciler = Reconciler(
+        [client], record_names={"Test": ("a",)}, damper=FlapDamper(stable_samples=2)
+    )
+
+    plan = reconciler.run()
+    assert not plan.changes
+    assert len(plan.held) == 1
+    client.apply_changes.assert_not_called()
+
+    plan = reconciler.run()
+    assert len(plan.changes) == 1
+    client.apply_changes.assert_called_once()
+
+
+def test_one_shot_run_is_not_damped():
+    with open("py_ddns.ini", "a") as f:
+        f.write("stable_seconds = 120\n")
+    client = MagicMock(service_name="Test", auto_create=False)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.record_names.return_value = ("a",)
+    client.fetch_state.return_value = (
+        RecordState(
+            service="Test",
+            record_name="a",
+            db_ip="1.1.1.1",
+            provider_ip="1.1.1.1",
+            record_id="1",
+            stored=True,
+        ),
+    )
+
+    with patch.object(cli, "build_clients", return_value=[client]):
+        assert cli.main(["--config", "py_ddns.ini"]) == 0
+
+    client.apply_changes.assert_called_once()
@@ -0,0 +1,97 @@
+import socket
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from pyddns import deadline as deadline_module
+from pyddns.deadline import Deadline, DeadlineExceeded, resolve_host
+from pyddns.reconcile import RecordState, Reconciler
+
+
+def test_deadline_unbounded():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert deadline.timeout(10) == 10
+
+
+def test_deadline_caps_timeout():
+    now = [0.0]
+    deadline = Deadline(5, clock=lambda: now[0])
+    assert deadline.timeout(10) == 5
+    assert deadline.timeout(2) == 2
+
+    now[0] = 6
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(10)
+
+
+def test_resolve_host_times_out(monkeypatch):
+    monkeypatch.setattr(
+        deadline_module.socket,
+        "gethostbyname",
+        lambda host: time.sleep(1) or "127.0.0.1",
+    )
+    with pytest.raises(DeadlineExceeded):
+        resolve_host("slow.example.com", Deadline(0.05))
+
+
+def test_resolve_host_replaces_hung_workers(monkeypatch):
+    release = threading.Event()
+
+    def lookup(host):
+        if host.startswith("hung"):
+            release.wait(5)
+        return "127.0.0.1"
+
+    monkeypatch.setattr(deadline_module.socket, "gethostbyname", lookup)
+    try:
+        for i in range(8):
+            with pytest.raises(DeadlineExceeded):
+                resolve_host(f"hung{i}.example.com", Deadline(0.05))
+
+        assert resolve_host("fast.example.com", Deadline(0.3)) == "127.0.0.1"
+    finally:
+        release.set()
+
+
+def test_resolve_host_passes_errors(monkeypatch):
+    def fail(host):
+        raise socket.gaierror("not found")
+
+    monkeypatch.setattr(deadline_module.socket, "gethostbyname", fail)
+    with pytest.raises(socket.gaierror):
+        resolve_host("missing.example.com", Deadline(1))
+
+
+def _client(name, fetch_state):
+    client = MagicMock(service_name=name, auto_create=False)
+    client.get_ipv4.return_value = "1.1.1.1"
+    client.record_names.return_value = (f"{name}.example.com",)
+    client.fetch_state.side_effect = fetch_state
+    return client
+
+
+def test_reconciler_defers_slow_clients():
+    fast = _client(
+        "fast",
+        lambda names, deadline: (
+            RecordState(
+                service="fast",
+                record_name=names[0],
+                db_ip="1.1.1.1",
+                provider_ip="1.1.1.1",
+                record_id="1",
+                stored=True,
+            ),
+        ),
+    )
+    slow = _client("slow", lambda names, deadline: time.sleep(1) or ())
+
+    start = time.monotonic()
+    plan = Reconciler([fast, slow], budget=0.2).run()
+
+    assert time.monotonic() - start < 0.9
+    assert [s.record_name for s in plan.unchanged] == ["fast.example.com"]
+    assert [s.record_name for s in plan.deferred] == ["slow.example.com"]
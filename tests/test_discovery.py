@@ -0,0 +1,277 @@
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from pyddns.deadline import Deadline, DeadlineExceeded
+from pyddns.discovery import (
+    DiscoveryChain,
+    DiscoveryError,
+    HttpEchoSource,
+    InterfaceSource,
+    IPSource,
+    NatPmpSource,
+    UpnpIgdSource,
+    interface_addresses,
+    is_public_ipv4,
+)
+
+DESCRIPTION = """<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:InternetGatewayDevice:1</deviceType>
+    <serviceList>
+      <service>
+        <serviceType>urn:schemas-upnp-org:service:Layer3Forwarding:1</serviceType>
+        <controlURL>/l3f</controlURL>
+      </service>
+      <service>
+        <serviceType>urn:schemas-upnp-org:service:WANIPConnection:1</serviceType>
+        <controlURL>/ctl/IPConn</controlURL>
+      </service>
+    </serviceList>
+  </device>
+</root>"""
+
+SOAP_RESPONSE = """<?xml version="1.0"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <u:GetExternalIPAddressResponse
+        xmlns:u="urn:schemas-upnp-org:service:WANIPConnection:1">
+      <NewExternalIPAddress>203.0.113.9</NewExternalIPAddress>
+    </u:GetExternalIPAddressResponse>
+  </s:Body>
+</s:Envelope>"""
+
+
+def udp_responder(reply):
+    """Answers a single datagram on localhost with reply(request)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5)
+    received = []
+
+    def serve():
+        try:
+            data, address = sock.recvfrom(4096)
+        except OSError:
+            return
+        received.append(data)
+        sock.sendto(reply(data), address)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return sock, received
+
+
+@pytest.fixture
+def gateway_http():
+    """Serves a stand-in IGD description and control endpoint."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._reply(DESCRIPTION)
+
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            requests_seen.append(
+                (self.path, self.headers["SOAPAction"], self.rfile.read(length))
+            )
+            self._reply(SOAP_RESPONSE)
+
+        def _reply(self, body):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_is_public_ipv4():
+    assert is_public_ipv4("203.0.113.9") is False  # documentation range
+    assert is_public_ipv4("1.1.1.1")
+    assert not is_public_ipv4("192.168.1.10")
+    assert not is_public_ipv4("100.64.0.1")
+    assert not is_public_ipv4("::1")
+    assert not is_public_ipv4("not an ip")
+    assert not is_public_ipv4(None)
+
+
+def test_interface_source_picks_global_address():
+    source = InterfaceSource(lambda: ["127.0.0.1", "10.0.0.2", "8.8.4.4"])
+    assert source.get_ipv4() == "8.8.4.4"
+
+    with pytest.raises(DiscoveryError):
+        InterfaceSource(lambda: ["127.0.0.1", "192.168.1.2"]).get_ipv4()
+
+
+def test_interface_source_does_not_resolve(monkeypatch):
+    def resolve(*args, **kwargs):
+        raise AssertionError("interface discovery must not query DNS")
+
+    monkeypatch.setattr(socket, "getaddrinfo", resolve)
+    monkeypatch.setattr(socket, "gethostbyname", resolve)
+    assert isinstance(interface_addresses(), list)
+
+    with pytest.raises(DeadlineExceeded):
+        InterfaceSource(lambda: ["8.8.4.4"]).get_ipv4(Deadline(0))
+
+
+def test_natpmp_source():
+    reply = struct.pack("!BBHI", 0, 128, 0, 1234) + socket.inet_aton(
+        "1.2.3.4"
+    )
+    sock, received = udp_responder(lambda _: reply)
+    with sock:
+        source = NatPmpSource("127.0.0.1", sock.getsockname()[1])
+        source.timeout = 2
+        assert source.get_ipv4() == "1.2.3.4"
+    assert received == [b"\x00\x00"]
+
+
+def test_natpmp_source_error_result():
+    reply = struct.pack("!BBHI", 0, 128, 3, 0) + bytes(4)
+    sock, _ = udp_responder(lambda _: reply)
+    with sock:
+        source = NatPmpSource("127.0.0.1", sock.getsockname()[1])
+        source.timeout = 2
+        with pytest.raises(DiscoveryError):
+            source.get_ipv4()
+
+
+def test_natpmp_source_timeout():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+        silent.bind(("127.0.0.1", 0))
+        source = NatPmpSource("127.0.0.1", silent.getsockname()[1])
+        source.timeout = 0.05
+        with pytest.raises(DiscoveryError):
+            source.get_ipv4()
+
+
+def test_upnp_source_with_location(gateway_http):
+    base, requests_seen = gateway_http
+    source = UpnpIgdSource(location=f"{base}/rootDesc.xml")
+
+    assert source.get_ipv4() == "203.0.113.9"
+    assert source.get_ipv4() == "203.0.113.9"
+
+    path, action, body = requests_seen[0]
+    assert path == "/ctl/IPConn"
+    assert action == (
+        '"urn:schemas-upnp-org:service:WANIPConnection:1'
+        '#GetExternalIPAddress"'
+    )
+    assert b"GetExternalIPAddress" in body
+    assert len(requests_seen) == 2
+
+
+def test_upnp_source_ssdp_discovery(gateway_http):
+    base, _ = gateway_http
+    sock, received = udp_responder(
+        lambda _: (
+            "HTTP/1.1 200 OK\r\n"
+            f"LOCATION: {base}/rootDesc.xml\r\n"
+            "ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+            "\r\n"
+        ).encode()
+    )
+    with sock:
+        source = UpnpIgdSource(ssdp_address=sock.getsockname())
+        assert source.get_ipv4() == "203.0.113.9"
+    assert received[0].startswith(b"M-SEARCH * HTTP/1.1\r\n")
+
+
+def test_http_echo_source():
+    class Echo(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"9.9.9.9\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Echo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        source = HttpEchoSource(f"http://127.0.0.1:{server.server_port}")
+        assert source.get_ipv4() == "9.9.9.9"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class StubSource(IPSource):
+    def __init__(self, name, result):
+        self.name = name
+        self.result = result
+        self.calls = 0
+
+    def get_ipv4(self, deadline=None):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_chain_prefers_local_sources():
+    local = StubSource("natpmp", "1.2.3.4")
+    echo = StubSource("http", "5.6.7.8")
+    chain = DiscoveryChain([local, echo])
+
+    assert chain.get_ipv4() == "1.2.3.4"
+    assert echo.calls == 0
+
+
+def test_chain_skips_failed_and_private_sources():
+    now = [0.0]
+    interface = StubSource("interface", "192.168.1.2")
+    natpmp = StubSource("natpmp", DiscoveryError("no gateway"))
+    echo = StubSource("http", "5.6.7.8")
+    chain = DiscoveryChain(
+        [interface, natpmp, echo], retry_after=60, clock=lambda: now[0]
+    )
+
+    assert chain.get_ipv4() == "5.6.7.8"
+    assert chain.get_ipv4() == "5.6.7.8"
+    assert (interface.calls, natpmp.calls, echo.calls) == (1, 1, 2)
+
+    now[0] = 61
+    natpmp.result = "1.2.3.4"
+    assert chain.get_ipv4() == "1.2.3.4"
+
+
+def test_chain_raises_last_error():
+    chain = DiscoveryChain(
+        [
+            StubSource("natpmp", DiscoveryError("no gateway")),
+            StubSource("http", DiscoveryError("offline")),
+        ]
+    )
+    with pytest.raises(DiscoveryError, match="offline"):
+        chain.get_ipv4()
+
+
+def test_config_ip_sources():
+    from pyddns.config import Config
+
+    with open("py_ddns.ini", "w") as f:
+        f.write("[Client_settings]\nip_sources = natpmp, http\n")
+    config = Config("py_ddns.ini")
+    assert config.snapshot.client.ip_sources == ("natpmp", "http")
+
+    with open("py_ddns.ini", "w") as f:
+        f.write("[Client_settings]\nip_sources = carrier_pigeon\n")
+    with pytest.raises(ValueError):
+        Config("py_ddns.ini")
@@ -1,7 +1,19 @@
+import socket
+import time
 import pytest
 from unittest.mock import MagicMock
+from pyddns.deadline import Deadline, DeadlineExceeded
+from pyddns.events import get_bus
+from pyddns.reconcile import (
+    DeferredState,
+    RecordChange,
+    RecordState,
+    Reconciler,
+)
 from pyddns.services.duckdns_service import DuckDNS
 
+pytestmark = pytest.mark.usefixtures("storage_backend")
+
 
 def test_duckdns_initialization():
     with pytest.raises(KeyError):
@@ -35,3 +47,137 @@ def test_duckdns_obtain_record():
 
     record = client._obtain_record("test.example.com")
     assert record == "test", "_obtain_record should return the correct record!"
+
+
+def test_duckdns_fetch_state_skips_verified_domains():
+    client = DuckDNS(token="test_token")
+    client.check_duckdns_ip = MagicMock(return_value="127.0.0.1")
+    client.storage.add_service("Duckdns", "fresh", "127.0.0.1")
+    client.storage.add_service("Duckdns", "stale", "127.0.0.1")
+    client.storage.mark_verified("Duckdns", [("fresh", 60, False)])
+
+    states = client.fetch_state(["fresh", "stale.duckdns.org"])
+
+    assert [s.provider_ip for s in states] == ["127.0.0.1", "127.0.0.1"]
+    client.check_duckdns_ip.assert_called_once_with("stale", None)
+    assert client.storage.retrieve_record("stale").ttl == 60
+    assert client.dns_name("stale") == "stale.duckdns.org"
+
+
+def test_duckdns_fetch_state_defers_resolver_failures():
+    client = DuckDNS(token="test_token")
+    errors = {
+        "gone": socket.gaierror(socket.EAI_NONAME, "Unknown name"),
+        "again": socket.gaierror(socket.EAI_AGAIN, "Temporary failure"),
+        "slow": OSError("resolver timed out"),
+    }
+
+    def lookup(name, deadline=None):
+        raise errors[name]
+
+    client.check_duckdns_ip = MagicMock(side_effect=lookup)
+
+    states = client.fetch_state(["gone", "again", "slow"])
+
+    assert [type(s) for s in states] == [
+        RecordState,
+        DeferredState,
+        DeferredState,
+    ]
+    assert states[0].provider_ip is None
+
+
+def test_duckdns_apply_changes_emits_events():
+    client = DuckDNS(token="test_token")
+    client._call_update_api = MagicMock(return_value="10.0.0.2")
+    received = []
+    subscription = get_bus().subscribe(received.extend, timeout=None)
+    try:
+        client.apply_changes(
+            [
+                RecordChange(
+                    RecordState("Duckdns", "home", db_ip="10.0.0.1"),
+                    "10.0.0.2",
+                    "ip_changed",
+                ),
+                RecordChange(
+                    RecordState("Duckdns", "lab", provider_ip="10.0.0.9"),
+                    "10.0.0.2",
+                    "drift",
+                ),
+            ]
+        )
+        assert get_bus().flush(timeout=2)
+    finally:
+        get_bus().unsubscribe(subscription, timeout=1)
+
+    client._call_update_api.assert_called_once()
+    assert [(e.kind, e.record_name, e.old_ip) for e in received] == [
+        ("record_updated", "home", "10.0.0.1"),
+        ("drift_repaired", "lab", "10.0.0.9"),
+    ]
+
+
+def test_duckdns_ko_reply_is_dead_lettered(monkeypatch):
+    client = DuckDNS(token="test_token")
+    client.storage.enqueue_changes(
+        "Duckdns", [("home", "10.0.0.2", "ip_changed", None)]
+    )
+    response = MagicMock(text="KO")
+    monkeypatch.setattr(
+        "pyddns.services.duckdns_service.requests.get",
+        MagicMock(return_value=response),
+    )
+    reconciler = Reconciler([client], max_attempts=2)
+
+    reconciler.replay()
+    assert [
+        (row[0], row[4]) for row in client.storage.pending_changes("Duckdns")
+    ] == [("home", 1)]
+
+    reconciler.replay()
+    reconciler.replay()
+    assert client.storage.pending_changes("Duckdns") == []
+    ((name, new_ip, _, attempts, error),) = client.storage.dead_changes(
+        "Duckdns"
+    )
+    assert (name, new_ip, attempts) == ("home", "10.0.0.2", 2)
+    assert "KO" in error
+
+
+def test_duckdns_update_api_is_bounded_by_deadline(monkeypatch):
+    client = DuckDNS(token="test_token")
+
+    def trickle(*args, **kwargs):
+        # Every read fits in the socket timeout, the request does not.
+        time.sleep(2)
+
+    monkeypatch.setattr(
+        "pyddns.services.duckdns_service.requests.get", trickle
+    )
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        client._call_update_api(["home"], "10.0.0.2", Deadline(0.2))
+    assert time.monotonic() - started < 1
+
+
+def test_duckdns_seed_keeps_domains_that_resolved():
+    client = DuckDNS(token="test_token")
+    answers = {
+        "home": "10.0.0.1",
+        "again": socket.gaierror(socket.EAI_AGAIN, "Temporary failure"),
+        "slow": DeadlineExceeded("DNS lookup for slow timed out."),
+        "lab": "10.0.0.2",
+    }
+
+    def lookup(name, deadline=None):
+        if isinstance(answers[name], Exception):
+            raise answers[name]
+        return answers[name]
+
+    client.check_duckdns_ip = MagicMock(side_effect=lookup)
+
+    assert client.seed(["home", "again", "slow", "lab"]) == 2
+    assert client.storage.retrieve_record("home").ip == "10.0.0.1"
+    assert client.storage.retrieve_record("lab").ip == "10.0.0.2"
+    assert client.storage.retrieve_record("again") is None
@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+import pytest
+from pyddns import events
+from pyddns.config import Config
+from pyddns.events import (
+    Event,
+    EventBus,
+    EventSettings,
+    LogSubscriber,
+    configure_events,
+    emit,
+)
+from pyddns.reconcile import RecordChange, RecordState, emit_applied
+
+
+class Recorder:
+    """Collects batches, optionally holding the first call at a gate."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = gate
+
+    def __call__(self, batch):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append([event.new_ip for event in batch])
+
+
+@pytest.fixture
+def bus():
+    bus = EventBus()
+    yield bus
+    bus.close(timeout=1)
+
+
+def _event(new_ip, kind="record_updated"):
+    return Event(kind, "Test", "a.example.com", new_ip=new_ip)
+
+
+def test_events_are_batched(bus):
+    recorder = Recorder()
+    bus.subscribe(recorder, batch_size=3, batch_wait=0.2, timeout=None)
+
+    for i in range(5):
+        bus.publish(_event(str(i)))
+
+    assert bus.flush(timeout=2)
+    assert [ip for batch in recorder.batches for ip in batch] == list("01234")
+    assert max(len(batch) for batch in recorder.batches) == 3
+
+
+def test_subscription_filters_kinds(bus):
+    recorder = Recorder()
+    bus.subscribe(recorder, kinds=["error"], timeout=None)
+
+    bus.publish(_event("1"))
+    bus.publish(_event("2", kind="error"))
+
+    assert bus.flush(timeout=2)
+    assert recorder.batches == [["2"]]
+
+
+@pytest.mark.parametrize(
+    "policy, expected", [("drop_new", ["1", "2"]), ("drop_oldest", ["4", "5"])]
+)
+def test_full_queue_drops_without_blocking(bus, policy, expected):
+    gate = threading.Event()
+    recorder = Recorder(gate)
+    subscription = bus.subscribe(
+        recorder, queue_size=2, batch_size=10, policy=policy, timeout=None
+    )
+    bus.publish(_event("0"))
+    assert recorder.started.wait(2)
+
+    started = time.monotonic()
+    for i in range(1, 6):
+        bus.publish(_event(str(i)))
+    assert time.monotonic() - started < 0.5
+
+    gate.set()
+    assert bus.flush(timeout=2)
+    assert recorder.batches == [["0"], expected]
+    assert subscription.stats.dropped == 3
+    assert subscription.stats.delivered == 3
+
+
+def test_block_policy_waits_at_most_max_block(bus):
+    gate = threading.Event()
+    recorder = Recorder(gate)
+    subscription = bus.subscribe(
+        recorder, queue_size=1, policy="block", max_block=0.1, timeout=None
+    )
+    bus.publish(_event("0"))
+    assert recorder.started.wait(2)
+    bus.publish(_event("1"))
+
+    started = time.monotonic()
+    bus.publish(_event("2"))
+    assert 0.05 < time.monotonic() - started < 1
+
+    gate.set()
+    assert bus.flush(timeout=2)
+    assert subscription.stats.dropped == 1
+
+
+def test_slow_subscriber_is_abandoned_after_timeout(bus):
+    gate = threading.Event()
+    slow = Recorder(gate)
+    fast = Recorder()
+    subscription = bus.subscribe(slow, timeout=0.1)
+    bus.subscribe(fast, timeout=None)
+
+    bus.publish(_event("0"))
+    assert bus.flush(timeout=2)
+    assert subscription.stats.timed_out == 1
+
+    bus.publish(_event("1"))
+    assert bus.flush(timeout=2)
+    assert subscription.stats.dropped == 1
+    assert fast.batches == [["0"], ["1"]]
+
+    gate.set()
+    time.sleep(0.1)
+    bus.publish(_event("2"))
+    assert bus.flush(timeout=2)
+    assert slow.batches == [["0"], ["2"]]
+
+
+def test_failing_subscriber_keeps_running(bus):
+    calls = []
+
+    def failing(batch):
+        calls.append(batch)
+        raise RuntimeError("boom")
+
+    subscription = bus.subscribe(failing, timeout=None)
+    bus.publish(_event("0"))
+    bus.publish(_event("1"))
+
+    assert bus.flush(timeout=2)
+    assert subscription.stats.failed == 2
+    assert sum(len(batch) for batch in calls) == 2
+
+
+def test_emit_without_subscribers_is_noop():
+    assert events.get_bus().subscriptions == ()
+    emit("record_updated", "Test", "a.example.com", new_ip="127.0.0.1")
+
+
+def test_emit_applied_maps_reasons():
+    received = []
+    bus = events.get_bus()
+    subscription = bus.subscribe(received.extend, timeout=None)
+    state = RecordState(
+        "Test", "a.example.com", db_ip="1.1.1.1", provider_ip="2.2.2.2"
+    )
+    try:
+        emit_applied(RecordChange(state, "3.3.3.3", "drift"), None)
+        emit_applied(RecordChange(state, "3.3.3.3", "ip_changed"), None)
+        assert bus.flush(timeout=2)
+    finally:
+        bus.unsubscribe(subscription, timeout=1)
+
+    assert [(e.kind, e.old_ip, e.new_ip) for e in received] == [
+        ("drift_repaired", "2.2.2.2", "3.3.3.3"),
+        ("record_updated", "1.1.1.1", "3.3.3.3"),
+    ]
+
+
+def test_config_subscribes_event_sinks(caplog):
+    with open("py_ddns.ini", "a") as f:
+        f.write("event_log = true\nevent_policy = drop_new\n")
+
+    try:
+        config = Config("py_ddns.ini")
+        assert config.snapshot.client.events.delivery.policy == "drop_new"
+        (subscription,) = events.get_bus().subscriptions
+        assert subscription.name == LogSubscriber.name
+
+        with caplog.at_level(logging.INFO):
+            emit("ip_changed", "Test", old_ip="1.1.1.1", new_ip="2.2.2.2")
+            assert events.get_bus().flush(timeout=5)
+        assert "Events: ip_changed Test 1.1.1.1 -> 2.2.2.2" in caplog.text
+    finally:
+        configure_events(EventSettings())
+
+    assert events.get_bus().subscriptions == ()
+
+
+def test_config_rejects_unknown_event_policy():
+    with open("py_ddns.ini", "a") as f:
+        f.write("event_policy = sometimes\n")
+
+    with pytest.raises(ValueError):
+        Config("py_ddns.ini")
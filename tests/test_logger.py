@@ -0,0 +1,48 @@
+import json
+import logging
+import pytest
+from pyddns.logger import LogSettings, start_logging, stop_logging
+
+
+def test_logging_is_queued_and_rotated(tmp_path):
+    log_file = tmp_path / "queued.log"
+    try:
+        start_logging(
+            LogSettings(log_file=str(log_file), max_bytes=200, backup_count=2)
+        )
+        for i in range(20):
+            logging.info("Queued message %d", i)
+    finally:
+        stop_logging()
+
+    assert log_file.exists()
+    assert (tmp_path / "queued.log.1").exists()
+    assert "Queued message 19" in log_file.read_text()
+
+
+def test_logging_json_lines(tmp_path):
+    log_file = tmp_path / "json.log"
+    try:
+        start_logging(LogSettings(log_file=str(log_file), json_lines=True))
+        logging.warning("Structured %s", "message")
+    finally:
+        stop_logging()
+
+    entry = json.loads(log_file.read_text().splitlines()[-1])
+    assert entry["level"] == "WARNING"
+    assert entry["message"] == "Structured message"
+
+
+def test_failed_restart_keeps_running_pipeline(tmp_path):
+    log_file = tmp_path / "kept.log"
+    try:
+        start_logging(LogSettings(log_file=str(log_file)))
+        with pytest.raises(OSError):
+            start_logging(
+                LogSettings(log_file=str(tmp_path / "missing" / "new.log"))
+            )
+        logging.warning("Still logging")
+    finally:
+        stop_logging()
+
+    assert "Still logging" in log_file.read_text()
@@ -0,0 +1,85 @@
+import socket
+from unittest.mock import MagicMock
+from pyddns.propagation import PropagationTracker
+from pyddns.reconcile import RecordChange, RecordState
+from pyddns.record import Record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_polls_until_the_new_value_is_visible():
+    clock = FakeClock()
+    answers = {"a.example.com": "1.1.1.1"}
+    lookups = []
+
+    def resolve(hostname, deadline=None):
+        lookups.append(hostname)
+        return answers[hostname]
+
+    tracker = PropagationTracker(
+        poll_interval=30, resolve=resolve, clock=clock
+    )
+    tracker.track("Test", "a", "a.example.com", "2.2.2.2", ttl=10)
+    assert tracker.expected_ip("Test", "a") == "2.2.2.2"
+
+    assert tracker.poll() == []
+    clock.now = 5
+    assert tracker.poll() == []
+    assert len(lookups) == 1
+
+    answers["a.example.com"] = "2.2.2.2"
+    clock.now = 12
+    assert tracker.poll() == [("Test", "a", 12)]
+    assert list(tracker.latencies) == [12]
+    assert tracker.expected_ip("Test", "a") is None
+
+    clock.now = 100
+    assert tracker.poll() == []
+    assert len(lookups) == 2
+
+
+def test_gives_up_and_survives_failed_lookups():
+    clock = FakeClock()
+
+    def resolve(hostname, deadline=None):
+        raise socket.gaierror("no answer")
+
+    tracker = PropagationTracker(
+        poll_interval=5, max_wait=60, resolve=resolve, clock=clock
+    )
+    tracker.track("Test", "a", "a.example.com", "2.2.2.2")
+    assert tracker.poll() == []
+    assert len(tracker) == 1
+
+    clock.now = 61
+    tracker.poll()
+    assert len(tracker) == 0
+
+
+def test_track_changes_skips_proxied_records():
+    client = MagicMock(service_name="Test")
+    client.dns_name.side_effect = lambda name: f"{name}.example.com"
+    client.storage.retrieve_records.return_value = {
+        "a": Record("Test", "a", "1.1.1.1", ttl=60, proxied=False),
+        "b": Record("Test", "b", "1.1.1.1", ttl=1, proxied=True),
+    }
+    tracker = PropagationTracker()
+
+    tracker.track_changes(
+        client,
+        [
+            RecordChange(RecordState("Test", name), "2.2.2.2", "ip_changed")
+            for name in ("a", "b", "c")
+        ],
+    )
+
+    assert tracker.expected_ip("Test", "a") == "2.2.2.2"
+    assert tracker.expected_ip("Test", "b") is None
+    assert tracker.expected_ip("Test", "c") == "2.2.2.2"
+    assert tracker._pending[("Test", "a")].hostname == "a.example.com"
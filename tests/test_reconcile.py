@@ -0,0 +1,265 @@
+from unittest.mock import MagicMock
+import pytest
+from pyddns.propagation import PropagationTracker
+from pyddns.reconcile import (
+    RecordChange,
+    RecordState,
+    ReconcilePlan,
+    Reconciler,
+    dedupe_changes,
+    diff_record,
+)
+from pyddns.services.cloudflare_service import CloudflareDNS
+from pyddns.services.duckdns_service import DuckDNS
+from pyddns.storage import Storage
+
+pytestmark = pytest.mark.usefixtures("storage_backend")
+
+
+def _state(name, db_ip, provider_ip, stored=True):
+    return RecordState(
+        service="Test",
+        record_name=name,
+        db_ip=db_ip,
+        provider_ip=provider_ip,
+        record_id=f"id-{name}",
+        stored=stored,
+    )
+
+
+def test_diff_record():
+    assert diff_record(_state("a", "1.1.1.1", "1.1.1.1"), "1.1.1.1") is None
+
+    change = diff_record(_state("a", "1.1.1.1", "1.1.1.1"), "2.2.2.2")
+    assert change.reason == "ip_changed"
+
+    change = diff_record(_state("a", "1.1.1.1", "3.3.3.3"), "1.1.1.1")
+    assert change.reason == "drift"
+
+    unstored = _state("a", None, "1.1.1.1", stored=False)
+    assert diff_record(unstored, "1.1.1.1") is None
+
+
+def test_dedupe_changes_keeps_last():
+    first = RecordChange(_state("a", "1.1.1.1", "1.1.1.1"), "2.2.2.2", "x")
+    last = RecordChange(_state("a", "1.1.1.1", "1.1.1.1"), "3.3.3.3", "x")
+    assert dedupe_changes([first, last]) == (last,)
+
+
+def test_plan_does_not_apply():
+    client = MagicMock(service_name="Test", auto_create=False)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.record_names.return_value = ("a", "b", "c")
+    client.fetch_state.return_value = (
+        _state("a", "1.1.1.1", "1.1.1.1"),
+        _state("b", "2.2.2.2", "2.2.2.2"),
+        RecordState(service="Test", record_name="c"),
+    )
+
+    plan = Reconciler([client]).run(dry_run=True)
+
+    assert [c.record_name for c in plan.changes] == ["a"]
+    assert [s.record_name for s in plan.unchanged] == ["b"]
+    assert [s.record_name for s in plan.missing] == ["c"]
+    assert "1.1.1.1 -> 2.2.2.2" in plan.render()
+    client.apply_changes.assert_not_called()
+
+
+def test_cloudflare_apply_changes_batches():
+    client = CloudflareDNS(api_token="test_token", zone_id="test_zone")
+    client.cf_client = MagicMock()
+    client.storage = MagicMock()
+
+    changes = [
+        RecordChange(_state(n, "1.1.1.1", "1.1.1.1"), "2.2.2.2", "ip_changed")
+        for n in ("a.example.com", "b.example.com")
+    ]
+    client.apply_changes(changes)
+
+    client.cf_client.dns.records.batch.assert_called_once()
+    patches = client.cf_client.dns.records.batch.call_args.kwargs["patches"]
+    assert [p["name"] for p in patches] == ["a.example.com", "b.example.com"]
+    client.storage.update_ips.assert_called_once()
+
+
+def test_duckdns_apply_changes_groups_by_ip():
+    client = DuckDNS(token="test_token")
+    client.storage = MagicMock()
+    client._call_update_api = MagicMock(return_value="2.2.2.2")
+
+    changes = ReconcilePlan(
+        current_ip="2.2.2.2",
+        changes=tuple(
+            RecordChange(_state(n, "1.1.1.1", "1.1.1.1"), "2.2.2.2", "drift")
+            for n in ("a", "b")
+        ),
+    ).changes
+    client.apply_changes(changes)
+
+    client._call_update_api.assert_called_once_with(["a", "b"], "2.2.2.2", None)
+
+
+def test_failed_apply_is_replayed_in_one_batch():
+    storage = Storage()
+    client = MagicMock(service_name="Test", auto_create=False, storage=storage)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.record_names.return_value = ("a", "b")
+    client.fetch_state.return_value = (
+        _state("a", "1.1.1.1", "1.1.1.1"),
+        _state("b", "1.1.1.1", "1.1.1.1"),
+    )
+    client.apply_changes.side_effect = ConnectionError("offline")
+    reconciler = Reconciler([client])
+
+    plan = reconciler.run()
+    assert plan.changes == ()
+    assert [s.record_name for s in plan.deferred] == ["a", "b"]
+    reconciler.replay()
+
+    pending = storage.pending_changes("Test")
+    assert [(row[0], row[1], row[4]) for row in pending] == [
+        ("a", "2.2.2.2", 2),
+        ("b", "2.2.2.2", 2),
+    ]
+
+    client.apply_changes.reset_mock(side_effect=True)
+    reconciler.replay()
+
+    batch = client.apply_changes.call_args.args[0]
+    assert [(c.record_name, c.new_ip) for c in batch] == [
+        ("a", "2.2.2.2"),
+        ("b", "2.2.2.2"),
+    ]
+    assert batch[0].state.record_id == "id-a"
+    assert storage.pending_changes("Test") == []
+
+
+def test_failing_client_does_not_stop_the_others():
+    storage = Storage()
+    down = MagicMock(service_name="Down", auto_create=False, storage=storage)
+    down.get_ipv4.return_value = "2.2.2.2"
+    down.record_names.return_value = ("a",)
+    down.fetch_state.side_effect = ConnectionError("outage")
+    flaky = MagicMock(service_name="Flaky", auto_create=False, storage=storage)
+    flaky.record_names.return_value = ("b",)
+    flaky.fetch_state.return_value = (
+        RecordState("Flaky", "b", "1.1.1.1", "1.1.1.1", "id-b", True),
+    )
+    flaky.apply_changes.side_effect = ConnectionError("rejected")
+    up = MagicMock(service_name="Up", auto_create=False, storage=storage)
+    up.record_names.return_value = ("c",)
+    up.fetch_state.return_value = (
+        RecordState("Up", "c", "1.1.1.1", "1.1.1.1", "id-c", True),
+    )
+
+    plan = Reconciler([down, flaky, up]).run()
+
+    assert [(s.service, s.record_name) for s in plan.deferred] == [
+        ("Down", "a"),
+        ("Flaky", "b"),
+    ]
+    assert [(c.service, c.record_name) for c in plan.changes] == [("Up", "c")]
+    up.apply_changes.assert_called_once()
+    assert [(row[0], row[4]) for row in storage.pending_changes("Flaky")] == [
+        ("b", 1)
+    ]
+    assert storage.pending_changes("Up") == []
+
+
+def test_failed_replay_does_not_fail_fresh_changes():
+    storage = Storage()
+    storage.enqueue_changes("Test", [("b", "9.9.9.9", "drift", "id-b")])
+    client = MagicMock(service_name="Test", auto_create=False, storage=storage)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.record_names.return_value = ("a",)
+    client.fetch_state.return_value = (_state("a", "1.1.1.1", "1.1.1.1"),)
+    client.apply_changes.side_effect = [ConnectionError("rejected"), None]
+
+    Reconciler([client]).run()
+
+    batches = [call.args[0] for call in client.apply_changes.call_args_list]
+    assert [[c.record_name for c in batch] for batch in batches] == [
+        ["b"],
+        ["a"],
+    ]
+    pending = storage.pending_changes("Test")
+    assert [(row[0], row[4]) for row in pending] == [("b", 1)]
+
+
+def test_outbox_entry_is_dead_after_max_attempts():
+    storage = Storage()
+    storage.enqueue_changes("Test", [("b", "9.9.9.9", "drift", "id-b")])
+    client = MagicMock(service_name="Test", auto_create=False, storage=storage)
+    client.apply_changes.side_effect = ConnectionError("rejected")
+    reconciler = Reconciler([client], max_attempts=2)
+
+    reconciler.replay()
+    reconciler.replay()
+    reconciler.replay()
+
+    assert client.apply_changes.call_count == 2
+    assert storage.pending_changes("Test") == []
+    assert storage.dead_changes("Test") == [
+        ("b", "9.9.9.9", "drift", 2, "rejected")
+    ]
+
+    # A newer value for the record starts over.
+    storage.enqueue_changes("Test", [("b", "8.8.8.8", "drift", None)])
+    assert storage.dead_changes("Test") == []
+    assert [(row[0], row[4]) for row in storage.pending_changes("Test")] == [
+        ("b", 0)
+    ]
+
+
+def test_outbox_entries_superseded_by_plan():
+    storage = Storage()
+    storage.enqueue_changes(
+        "Test",
+        [("a", "9.9.9.9", "ip_changed", "id-a"), ("b", "9.9.9.9", "drift", None)],
+    )
+    client = MagicMock(service_name="Test", auto_create=False, storage=storage)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.record_names.return_value = ("a", "b")
+    client.fetch_state.return_value = (
+        _state("a", "1.1.1.1", "1.1.1.1"),
+        _state("b", "2.2.2.2", "2.2.2.2"),
+    )
+
+    Reconciler([client]).run()
+
+    batch = client.apply_changes.call_args.args[0]
+    assert [(c.record_name, c.new_ip) for c in batch] == [("a", "2.2.2.2")]
+    assert storage.pending_changes("Test") == []
+
+
+def test_propagating_records_are_not_drift():
+    storage = Storage()
+    client = MagicMock(service_name="Test", auto_create=False, storage=storage)
+    client.get_ipv4.return_value = "2.2.2.2"
+    client.record_names.return_value = ("a",)
+    client.dns_name.side_effect = lambda name: name
+    client.fetch_state.return_value = (_state("a", "1.1.1.1", "1.1.1.1"),)
+    tracker = PropagationTracker(resolve=lambda host, deadline=None: "1.1.1.1")
+    reconciler = Reconciler([client], propagation=tracker)
+
+    reconciler.run()
+    assert tracker.expected_ip("Test", "a") == "2.2.2.2"
+
+    # Resolvers still return the old value.
+    client.fetch_state.return_value = (_state("a", "2.2.2.2", "1.1.1.1"),)
+    plan = reconciler.run(dry_run=True)
+    assert plan.changes == ()
+    assert [s.record_name for s in plan.unchanged] == ["a"]
+
+    assert diff_record(plan.unchanged[0], "2.2.2.2").reason == "drift"
+    assert Reconciler([client]).run(dry_run=True).changes
+
+
+def test_replay_with_empty_outbox_is_quiet(caplog):
+    client = MagicMock(service_name="Test", storage=Storage())
+
+    with caplog.at_level("INFO"):
+        Reconciler([client]).replay()
+
+    assert caplog.records == []
+    client.apply_changes.assert_not_called()
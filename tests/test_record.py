@@ -0,0 +1,53 @@
+import pickle
+import sys
+import pytest
+from pyddns.record import Record
+
+
+def test_record_packs_ip_and_interns_service():
+    service = "".join(["Cloud", "flare"])
+    record = Record(service, "a.example.com", "203.0.113.7", "ts", "id-1")
+
+    assert record.ip == "203.0.113.7"
+    assert record._ip == 3405803783
+    assert record.service is sys.intern("Cloudflare")
+    assert not hasattr(record, "__dict__")
+
+
+def test_record_supports_ipv6_and_other_values():
+    assert Record("Test", "a", "2001:db8::1").ip == "2001:db8::1"
+    assert Record("Test", "a", "::ffff:1.2.3.4").ip == "::ffff:102:304"
+    assert Record("Test", "a", "not-an-ip").ip == "not-an-ip"
+    assert Record("Test", "a", "1.2.3.4") != Record("Test", "a", "::1.2.3.4")
+
+
+def test_record_behaves_like_legacy_tuple():
+    record = Record("Test", "a.example.com", "127.0.0.1", "ts", "id-1")
+
+    assert record[0] == "127.0.0.1"
+    assert record[2] == "id-1"
+    ip, last_updated, record_id = record
+    assert (ip, last_updated, record_id) == ("127.0.0.1", "ts", "id-1")
+    assert tuple(record) == ("127.0.0.1", "ts", "id-1")
+    assert record != ("127.0.0.1", "ts", "id-1")
+    assert len(record) == 3
+
+
+def test_record_is_immutable_and_hashable():
+    record = Record("Test", "a", "127.0.0.1")
+    with pytest.raises(AttributeError):
+        record.name = "b"
+    with pytest.raises(AttributeError):
+        del record.name
+
+    assert record == Record("Test", "a", "127.0.0.1")
+    assert len({record, Record("Test", "a", "127.0.0.1")}) == 1
+    assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_record_trusted_until():
+    assert Record("Test", "a", "127.0.0.1").trusted_until() is None
+    assert Record("Test", "a", "127.0.0.1", ttl=60).trusted_until() is None
+    record = Record("Test", "a", "127.0.0.1", ttl=60, verified_at=10.0)
+    assert record.trusted_until() == 70.0
+    assert pickle.loads(pickle.dumps(record)) == record
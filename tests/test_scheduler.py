@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from pyddns.damping import FlapDamper
+from pyddns.reconcile import (
+    DeferredState,
+    ReconcilePlan,
+    RecordChange,
+    RecordState,
+)
+from pyddns.scheduler import CheckScheduler
+from pyddns.storage import Storage
+
+pytestmark = pytest.mark.usefixtures("storage_backend")
+
+
+def make_scheduler(now, **kwargs):
+    storage = Storage()
+    storage.drop_tables()
+    storage.create_tables()
+    return storage, CheckScheduler(storage, clock=lambda: now[0], **kwargs)
+
+
+def plan_for(ip, changes=(), unchanged=(), deferred=()):
+    return ReconcilePlan(
+        current_ip=ip,
+        changes=tuple(changes),
+        unchanged=tuple(unchanged),
+        deferred=tuple(deferred),
+    )
+
+
+def test_scheduler_pops_due_records_in_order():
+    now = [1000.0]
+    _, scheduler = make_scheduler(now)
+
+    scheduler.sync({"Cloudflare": ("a.example.com", "b.example.com")})
+    assert len(scheduler) == 2
+    due = scheduler.pop_due()
+    assert sorted(due["Cloudflare"]) == ["a.example.com", "b.example.com"]
+    assert scheduler.pop_due() == {}
+
+    scheduler.schedule(("Cloudflare", "a.example.com"), 1100.0)
+    scheduler.schedule(("Duckdns", "c"), 1050.0)
+    assert scheduler.next_due() == 1050.0
+    assert scheduler.pop_due() == {}
+
+    now[0] = 1060.0
+    assert scheduler.pop_due() == {"Duckdns": ("c",)}
+    assert scheduler.next_due() == 1100.0
+
+
+def test_scheduler_replaces_and_drops_entries():
+    now = [0.0]
+    _, scheduler = make_scheduler(now)
+
+    scheduler.schedule(("Duckdns", "a"), 10.0)
+    scheduler.schedule(("Duckdns", "a"), 50.0)
+    now[0] = 20.0
+    assert scheduler.pop_due() == {}
+    assert scheduler.next_due() == 50.0
+
+    scheduler.sync({"Duckdns": ("b",)})
+    assert len(scheduler) == 1
+    assert scheduler.pop_due() == {"Duckdns": ("b",)}
+    assert scheduler.next_due() is None
+
+
+def test_scheduler_interval_follows_change_rate():
+    now = [datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()]
+    _, scheduler = make_scheduler(
+        now, min_interval=60, max_interval=3600, change_factor=0.25
+    )
+
+    def ago(seconds):
+        moment = datetime.fromtimestamp(now[0] - seconds, timezone.utc)
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    assert scheduler.interval_for(None) == 60
+    assert scheduler.interval_for(ago(10)) == 60
+    assert scheduler.interval_for(ago(1200)) == 300
+    year = timedelta(days=365).total_seconds()
+    assert scheduler.interval_for(ago(year)) == 3600
+
+
+def test_scheduler_reschedule_uses_storage_timestamps():
+    now = datetime.now(timezone.utc).timestamp() + 7200
+    storage, scheduler = make_scheduler(
+        [now], min_interval=60, max_interval=3600
+    )
+    storage.add_service("Duckdns", "stable", "1.1.1.1")
+    storage.add_service("Duckdns", "moving", "1.1.1.1")
+
+    stable = RecordState("Duckdns", "stable", "1.1.1.1", "1.1.1.1", None, True)
+    moving = RecordState("Duckdns", "moving", "1.1.1.1", "1.1.1.1", None, True)
+    plan = plan_for(
+        "2.2.2.2",
+        changes=[RecordChange(moving, "2.2.2.2", "ip_changed")],
+        unchanged=[stable],
+    )
+    scheduler.reschedule({"Duckdns": ("stable", "moving")}, plan)
+
+    assert scheduler._queue.due[("Duckdns", "moving")] == now + 60
+    assert scheduler._queue.due[("Duckdns", "stable")] > now + 1000
+
+
+def test_scheduler_failed_cycle_retries_at_minimum():
+    now = [0.0]
+    _, scheduler = make_scheduler(now, min_interval=30)
+    scheduler.reschedule({"Duckdns": ("a",)})
+    assert scheduler.next_due() == 30
+
+
+def test_scheduler_ip_change_makes_everything_due():
+    now = [0.0]
+    _, scheduler = make_scheduler(now, min_interval=60)
+    scheduler.schedule(("Duckdns", "a"), 5000.0)
+    scheduler.schedule(("Cloudflare", "b"), 9000.0)
+
+    assert not scheduler.observe_ip("1.1.1.1")
+    assert not scheduler.observe_ip("1.1.1.1")
+    assert scheduler.pop_due() == {}
+
+    assert scheduler.observe_ip("2.2.2.2")
+    assert scheduler.pop_due() == {"Duckdns": ("a",), "Cloudflare": ("b",)}
+
+
+def test_scheduler_deferred_records_stay_hot():
+    now = [0.0]
+    _, scheduler = make_scheduler(now, min_interval=45)
+    deferred = DeferredState("Duckdns", "slow")
+    scheduler.reschedule(
+        {"Duckdns": ("slow",)}, plan_for("1.1.1.1", deferred=[deferred])
+    )
+    assert scheduler.next_due() == 45
+
+
+def test_scheduler_keeps_records_hot_while_damper_settles():
+    now = datetime.now(timezone.utc).timestamp() + 7200
+    damper = FlapDamper(stable_samples=3, clock=lambda: now)
+    storage, scheduler = make_scheduler(
+        [now], min_interval=60, max_interval=3600, damper=damper
+    )
+    storage.add_service("Duckdns", "stable", "1.1.1.1")
+    stable = RecordState("Duckdns", "stable", "1.1.1.1", "1.1.1.1", None, True)
+    checked = {"Duckdns": ("stable",)}
+
+    # Until the first IP settles, and again after it moves, the damper
+    # holds the old IP and the record is planned as unchanged.
+    for ip in ("1.1.1.1", "1.1.1.1", "1.1.1.1", "2.2.2.2"):
+        damper.observe(ip)
+        scheduler.reschedule(checked, plan_for(ip, unchanged=[stable]))
+        due = scheduler._queue.due[("Duckdns", "stable")]
+        assert (due == now + 60) == damper.settling
+    assert damper.settling
+
+
+def test_scheduler_reads_timestamps_of_the_same_service():
+    now = datetime.now(timezone.utc).timestamp() + 7200
+    storage, scheduler = make_scheduler(
+        [now], min_interval=60, max_interval=3600
+    )
+    storage.add_service("Cloudflare", "home", "1.1.1.1")
+    home = RecordState("Duckdns", "home", "1.1.1.1", "1.1.1.1", None, True)
+
+    # The stored row belongs to Cloudflare, not to the DuckDNS domain.
+    scheduler.reschedule(
+        {"Duckdns": ("home",)}, plan_for("1.1.1.1", unchanged=[home])
+    )
+    assert scheduler.next_due() == now + 60
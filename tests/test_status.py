@@ -0,0 +1,192 @@
+import http.client
+import json
+import socket
+import threading
+import pytest
+from pyddns.__main__ import health_max_age, parse_args
+from pyddns.reconcile import (
+    DeferredState,
+    ReconcilePlan,
+    RecordChange,
+    RecordState,
+)
+from pyddns.status import (
+    StatusBoard,
+    StatusServer,
+    parse_listen,
+)
+
+
+def _plan():
+    ok = RecordState("Duckdns", "ok", "1.1.1.1", "1.1.1.1", None, True, "ts")
+    moved = RecordState("Duckdns", "moved", "1.1.1.1", "1.1.1.1", None, True)
+    return ReconcilePlan(
+        current_ip="2.2.2.2",
+        changes=(RecordChange(moved, "2.2.2.2", "ip_changed"),),
+        unchanged=(ok,),
+        missing=(RecordState("Cloudflare", "gone"),),
+        deferred=(DeferredState("Cloudflare", "slow"),),
+    )
+
+
+def test_board_publishes_new_snapshots():
+    board = StatusBoard(clock=lambda: 1000.0)
+    first = board.snapshot
+
+    board.record_cycle(_plan(), 0.5)
+    snapshot = board.snapshot
+
+    assert snapshot is not first
+    assert first.cycles == 0 and first.records == {}
+    assert snapshot.public_ip == "2.2.2.2"
+    assert snapshot.cycles == 1
+    states = {name: r.state for (_, name), r in snapshot.records.items()}
+    assert states == {
+        "ok": "ok",
+        "moved": "updated",
+        "gone": "missing",
+        "slow": "deferred",
+    }
+    assert snapshot.records[("Duckdns", "moved")].ip == "2.2.2.2"
+    assert snapshot.records[("Duckdns", "ok")].last_updated == "ts"
+
+
+def test_board_keeps_history_and_errors():
+    board = StatusBoard(clock=lambda: 5.0)
+    board.record_cycle(_plan(), 0.25)
+    board.record_ip("3.3.3.3", 0.75)
+    board.record_error(ConnectionError("offline"))
+
+    data = board.snapshot.to_dict()
+    assert data["public_ip"] == "3.3.3.3"
+    assert data["cycles"] == 2
+    assert data["cycle_seconds"] == {"last": 0.75, "avg": 0.5, "max": 0.75}
+    assert data["last_error"] == "offline"
+    assert data["last_error_at"] == 5.0
+    # Records survive ticks that only check the IP.
+    assert len(data["records"]) == 4
+
+
+def test_health_reports_stale_cycles():
+    now = [100.0]
+    board = StatusBoard(clock=lambda: now[0], max_age=60)
+    server = StatusServer(board, address=("127.0.0.1", 0)).start()
+    try:
+        host, port = server.address
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+
+        now[0] = 150.0
+        conn.request("GET", "/health")
+        response = conn.getresponse()
+        assert response.status == 200
+        response.read()
+
+        now[0] = 161.0
+        conn.request("GET", "/health")
+        response = conn.getresponse()
+        assert response.status == 503
+        assert json.loads(response.read()) == {"status": "stale"}
+
+        board.record_ip("2.2.2.2", 0.1)
+        conn.request("GET", "/health")
+        assert conn.getresponse().status == 200
+    finally:
+        server.stop()
+
+
+def test_server_over_tcp():
+    board = StatusBoard()
+    board.record_cycle(_plan(), 0.1)
+    server = StatusServer(board, address=("127.0.0.1", 0)).start()
+    try:
+        host, port = server.address
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/health")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read()) == {"status": "ok"}
+
+        conn.request("GET", "/status")
+        status = json.loads(conn.getresponse().read())
+        assert status["public_ip"] == "2.2.2.2"
+
+        conn.request("GET", "/nope")
+        assert conn.getresponse().status == 404
+        conn.close()
+    finally:
+        server.stop()
+
+
+def test_server_over_unix_socket(tmp_path):
+    path = str(tmp_path / "status.sock")
+    board = StatusBoard()
+    server = StatusServer(board, socket_path=path).start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(path)
+            sock.sendall(b"GET /status HTTP/1.0\r\n\r\n")
+            data = b""
+            while chunk := sock.recv(4096):
+                data += chunk
+        head, _, body = data.partition(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.0 200")
+        assert json.loads(body)["cycles"] == 0
+    finally:
+        server.stop()
+    assert not (tmp_path / "status.sock").exists()
+
+
+def test_readers_never_see_partial_snapshots():
+    board = StatusBoard()
+    stop = threading.Event()
+    seen = []
+
+    def read():
+        while not stop.is_set():
+            snapshot = board.snapshot
+            seen.append((snapshot.cycles, len(snapshot.recent_cycle_seconds)))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for _ in range(200):
+        board.record_ip("1.1.1.1", 0.01)
+    stop.set()
+    reader.join()
+
+    assert all(count == min(cycles, 20) for cycles, count in seen)
+
+
+def test_status_server_requires_one_endpoint():
+    with pytest.raises(ValueError):
+        StatusServer(StatusBoard())
+    assert parse_listen("8080") == ("127.0.0.1", 8080)
+    assert parse_listen("0.0.0.0:9000") == ("0.0.0.0", 9000)
+    assert parse_listen("[::1]:8080") == ("::1", 8080)
+
+
+def test_server_keeps_files_that_are_not_sockets(tmp_path):
+    path = tmp_path / "status.sock"
+    path.write_text("not a socket")
+    with pytest.raises(OSError):
+        StatusServer(StatusBoard(), socket_path=str(path)).start()
+    assert path.read_text() == "not a socket"
+
+
+def test_health_allows_a_full_cycle_budget():
+    assert health_max_age(10, 60) == 80
+    assert health_max_age(10, None) == 20
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["--status-listen", "8080"],
+        ["--status-socket", "pyddns.sock"],
+        ["--dry-run", "--interval", "60"],
+    ],
+)
+def test_cli_rejects_ignored_options(argv):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+    assert parse_args(["--interval", "60", "--status-listen", "8080"])
@@ -1,4 +1,14 @@
-from pyddns.storage import Storage
+import sqlite3
+import pytest
+from pyddns.storage import (
+    DictBackend,
+    DuplicateRecordError,
+    SQLiteBackend,
+    Storage,
+    open_backend,
+)
+
+pytestmark = pytest.mark.usefixtures("storage_backend")
 
 
 def test_storage_singleton():
@@ -7,9 +17,13 @@ def test_storage_singleton():
     assert storage1 is storage2, "Storage is not a singleton!"
 
 
-def test_storage_create_tables():
+def test_storage_create_tables(storage_backend):
     storage = Storage(filename="py_ddns.db")
-    assert storage.cursor is not None, "Cursor is not initialized!"
+    if storage_backend == "dict":
+        assert isinstance(storage.backend, DictBackend)
+    else:
+        assert isinstance(storage.backend, SQLiteBackend)
+        assert storage.backend.cursor is not None, "Cursor is not initialized!"
 
 
 def test_storage_add_and_retrieve():
@@ -26,3 +40,250 @@ def test_storage_update_ip():
     storage.update_ip("TestService2", "test2.example.com", "127.0.0.2")
     record = storage.retrieve_record("test2.example.com")
     assert record[0] == "127.0.0.2", "IP address was not updated!"
+
+
+def test_storage_bulk_add_update_and_retrieve():
+    storage = Storage(filename="py_ddns.db")
+    storage.add_services(
+        "TestService",
+        [("a.example.com", "127.0.0.1", "1"), ("b.example.com", "127.0.0.1", None)],
+    )
+    storage.update_ips("TestService", [("b.example.com", "127.0.0.2")])
+    records = storage.retrieve_records(
+        ["a.example.com", "b.example.com", "missing.example.com"]
+    )
+    assert set(records) == {"a.example.com", "b.example.com"}
+    assert records["a.example.com"][2] == "1"
+    assert records["b.example.com"][0] == "127.0.0.2"
+
+
+def test_storage_flap_events():
+    storage = Storage(filename="py_ddns.db")
+    storage.record_flap("127.0.0.1", "127.0.0.2", 5.0)
+    events = storage.retrieve_flap_events()
+    assert events[0][:3] == ("127.0.0.1", "127.0.0.2", 5.0)
+
+
+def test_storage_negative_cache():
+    storage = Storage(filename="py_ddns.db")
+    assert not storage.is_missing("TestService", "gone.example.com", 60)
+
+    storage.mark_missing("TestService", "gone.example.com")
+    assert storage.is_missing("TestService", "gone.example.com", 60)
+
+    storage.clear_missing("TestService", "gone.example.com")
+    assert not storage.is_missing("TestService", "gone.example.com", 60)
+
+
+def test_storage_upsert_services():
+    storage = Storage(filename="py_ddns.db")
+    storage.add_service("TestService", "seed.example.com", "127.0.0.1", "1")
+    count = storage.upsert_services(
+        "TestService",
+        [("seed.example.com", "127.0.0.2", None), ("new.example.com", "127.0.0.3", "2")],
+    )
+    assert count == 2
+    assert storage.retrieve_record("seed.example.com")[0] == "127.0.0.2"
+    assert storage.retrieve_record("seed.example.com")[2] == "1"
+    assert storage.retrieve_record("new.example.com")[0] == "127.0.0.3"
+
+
+def test_storage_snapshot_round_trip(tmp_path):
+    storage = Storage(filename="py_ddns.db")
+    storage.add_service("TestService", "snap.example.com", "127.0.0.1", "1")
+    storage.mark_verified(
+        "TestService", [("snap.example.com", 300, True)], verified_at=1000.0
+    )
+    path = str(tmp_path / "snapshot.jsonl")
+
+    assert storage.export_snapshot(path) >= 1
+
+    storage.update_ip("TestService", "snap.example.com", "127.0.0.9")
+    storage.mark_verified(
+        "TestService", [("snap.example.com", 60, False)], verified_at=2000.0
+    )
+    for fresh in (False, True):
+        if fresh:
+            storage.drop_tables()
+            storage.create_tables()
+        assert storage.import_snapshot(path) >= 1
+        record = storage.retrieve_record("snap.example.com")
+        assert record[0] == "127.0.0.1"
+        assert (record.ttl, record.proxied, record.verified_at) == (
+            300,
+            True,
+            1000.0,
+        )
+
+
+def test_storage_rejects_duplicate_records():
+    storage = Storage(filename="py_ddns.db")
+    storage.add_service("TestService", "dup.example.com", "127.0.0.1")
+
+    with pytest.raises(DuplicateRecordError):
+        storage.add_service("TestService", "dup.example.com", "127.0.0.2")
+    with pytest.raises(DuplicateRecordError):
+        storage.add_services(
+            "TestService",
+            [
+                ("new.example.com", "127.0.0.3", None),
+                ("dup.example.com", "127.0.0.3", None),
+            ],
+        )
+
+    assert storage.retrieve_record("dup.example.com").ip == "127.0.0.1"
+    assert storage.retrieve_record("new.example.com") is None
+
+
+def test_storage_outbox_collapses_and_completes():
+    storage = Storage(filename="py_ddns.db")
+    storage.enqueue_changes(
+        "TestService",
+        [
+            ("a.example.com", "127.0.0.2", "ip_changed", "1"),
+            ("b.example.com", "127.0.0.2", "ip_changed", None),
+        ],
+    )
+    storage.enqueue_changes(
+        "TestService", [("a.example.com", "127.0.0.3", "drift", None)]
+    )
+    storage.fail_changes("TestService", ["a.example.com"], "offline")
+
+    pending = {row[0]: row for row in storage.pending_changes("TestService")}
+    assert pending["a.example.com"] == (
+        "a.example.com", "127.0.0.3", "drift", "1", 1
+    )
+    assert len(pending) == 2
+
+    # A stale completion does not remove the newer value.
+    storage.complete_changes(
+        "TestService",
+        [("a.example.com", "127.0.0.2"), ("b.example.com", "127.0.0.2")],
+    )
+    assert [row[0] for row in storage.pending_changes("TestService")] == [
+        "a.example.com"
+    ]
+
+
+def test_storage_iter_records_streams_in_batches():
+    storage = Storage(filename="py_ddns.db")
+    storage.add_services(
+        "TestService",
+        [(f"{i}.example.com", f"127.0.0.{i}", str(i)) for i in range(1, 6)],
+    )
+    storage.add_service("Other", "other.example.com", "127.0.1.1")
+
+    records = list(storage.iter_records("TestService", batch_size=2))
+    assert [r.name for r in records] == [
+        f"{i}.example.com" for i in range(1, 6)
+    ]
+    assert records[4].ip == "127.0.0.5"
+    assert records[4].record_id == "5"
+    assert {r.service for r in storage.iter_records()} == {
+        "TestService",
+        "Other",
+    }
+
+    # Abandoning the generator releases its cursor and the lock.
+    stream = storage.iter_records(batch_size=1)
+    next(stream)
+    stream.close()
+    storage.update_ip("Other", "other.example.com", "127.0.1.2")
+    assert storage.retrieve_record("other.example.com").ip == "127.0.1.2"
+
+
+def test_storage_verification_and_migration(tmp_path, storage_backend):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        """
+        CREATE TABLE domains (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service TEXT NOT NULL,
+            domain_name TEXT NOT NULL UNIQUE,
+            record_id TEXT DEFAULT NULL,
+            current_ip TEXT NOT NULL,
+            last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    connection.execute(
+        "INSERT INTO domains(service, domain_name, current_ip) "
+        "VALUES('TestService', 'old.example.com', '127.0.0.1')"
+    )
+    connection.commit()
+    connection.close()
+
+    try:
+        storage = Storage(filename=path, backend="file")
+        record = storage.retrieve_record("old.example.com")
+        assert record.ip == "127.0.0.1"
+        assert record.trusted_until() is None
+
+        storage.mark_verified(
+            "TestService", [("old.example.com", 300, True)], verified_at=100.0
+        )
+        record = storage.retrieve_record("old.example.com")
+        assert (record.ttl, record.proxied) == (300, True)
+        assert record.trusted_until() == 400.0
+
+        # None keeps the stored TTL, an update has to be verified again.
+        storage.mark_verified("TestService", [("old.example.com", None, None)])
+        assert storage.retrieve_record("old.example.com").ttl == 300
+        storage.update_ip("TestService", "old.example.com", "127.0.0.2")
+        assert storage.retrieve_record("old.example.com").verified_at is None
+    finally:
+        Storage(filename="py_ddns.db", backend=storage_backend)
+
+
+def test_storage_verification(storage_backend):
+    storage = Storage()
+    storage.add_service("TestService", "ttl.example.com", "127.0.0.1")
+    storage.mark_verified(
+        "Other", [("ttl.example.com", 60, False)], verified_at=100.0
+    )
+    assert storage.retrieve_record("ttl.example.com").verified_at is None
+
+    storage.mark_verified(
+        "TestService", [("ttl.example.com", 60, False)], verified_at=100.0
+    )
+    record = storage.retrieve_records(["ttl.example.com"])["ttl.example.com"]
+    assert (record.ttl, record.proxied, record.trusted_until()) == (
+        60,
+        False,
+        160.0,
+    )
+    storage.update_ips("TestService", [("ttl.example.com", None)])
+    record = storage.retrieve_record("ttl.example.com")
+    assert (record.ip, record.verified_at) == ("127.0.0.1", None)
+
+
+def test_storage_reopens_only_on_new_options(storage_backend):
+    storage = Storage()
+    backend = storage.backend
+    storage.add_service("TestService", "keep.example.com", "127.0.0.1")
+
+    assert Storage() is storage and storage.backend is backend
+    assert Storage().retrieve_record("keep.example.com") is not None
+
+    other = "dict" if storage_backend != "dict" else "memory"
+    Storage(backend=other)
+    assert storage.backend is not backend
+    assert storage.retrieve_record("keep.example.com") is None
+
+    with pytest.raises(ValueError):
+        open_backend("redis")
+
+
+def test_storage_uses_backend_passed_in():
+    backend = DictBackend()
+    storage = Storage(backend=backend)
+    assert storage.backend is backend
+
+    storage.add_service("TestService", "passed.example.com", "127.0.0.1")
+    assert Storage().retrieve_record("passed.example.com").ip == "127.0.0.1"
+    assert backend.retrieve_record("passed.example.com") is not None
+
+    Storage(backend="memory")
+    assert isinstance(storage.backend, SQLiteBackend)
@@ -0,0 +1,166 @@
+import logging
+import pstats
+import tracemalloc
+import pytest
+from pyddns import tracing
+from pyddns.storage import Storage
+from pyddns.tracing import (
+    LogExporter,
+    OpenTelemetryExporter,
+    Profiler,
+    SpanExporter,
+    configure_tracing,
+    set_exporter,
+    set_fallback_exporter,
+    span,
+    traced,
+)
+
+
+class ListExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter():
+    exporter = ListExporter()
+    set_exporter(exporter)
+    yield exporter
+    set_exporter(None)
+
+
+def test_span_is_noop_when_disabled():
+    set_exporter(None)
+    assert span("a") is span("b")
+
+    @traced("noop")
+    def add(a, b):
+        return a + b
+
+    assert add(1, 2) == 3
+
+
+def test_span_records_nesting_attributes_and_errors(exporter):
+    with span("outer", records=2):
+        with span("inner"):
+            pass
+
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("boom")
+
+    inner, outer, failing = exporter.spans
+    assert (inner.name, inner.parent) == ("inner", "outer")
+    assert outer.parent is None
+    assert outer.attributes == {"records": 2}
+    assert outer.duration >= inner.duration
+    assert failing.error == "ValueError('boom')"
+
+
+def test_traced_decorator(exporter):
+    @traced("work")
+    def work():
+        return 42
+
+    assert work() == 42
+    assert [s.name for s in exporter.spans] == ["work"]
+
+
+def test_storage_queries_are_traced(exporter):
+    Storage().retrieve_record("example.com")
+    assert "sqlite.retrieve_record" in [s.name for s in exporter.spans]
+
+
+def test_log_exporter(caplog):
+    set_exporter(LogExporter())
+    try:
+        with caplog.at_level(logging.INFO):
+            with span("cloudflare.batch", patches=3):
+                pass
+    finally:
+        set_exporter(None)
+    assert "Trace: cloudflare.batch took" in caplog.text
+    assert "patches=3" in caplog.text
+
+
+def test_opentelemetry_exporter():
+    class FakeSpan:
+        def __init__(self):
+            self.attributes = {}
+            self.end_time = None
+
+        def set_attribute(self, key, value):
+            self.attributes[key] = value
+
+        def end(self, end_time=None):
+            self.end_time = end_time
+
+    class FakeTracer:
+        def __init__(self):
+            self.started = []
+
+        def start_span(self, name, start_time=None, attributes=None):
+            otel_span = FakeSpan()
+            otel_span.attributes.update(attributes or {})
+            self.started.append((name, start_time, otel_span))
+            return otel_span
+
+    tracer = FakeTracer()
+    set_exporter(OpenTelemetryExporter(tracer))
+    try:
+        with span("dns.lookup", host="example.com"):
+            pass
+    finally:
+        set_exporter(None)
+
+    name, start_time, otel_span = tracer.started[0]
+    assert name == "dns.lookup"
+    assert otel_span.attributes == {"host": "example.com"}
+    assert otel_span.end_time >= start_time
+
+
+def test_configure_tracing():
+    configure_tracing("log")
+    exporter = tracing.get_exporter()
+    assert isinstance(exporter, LogExporter)
+    configure_tracing("log")
+    assert tracing.get_exporter() is exporter
+    configure_tracing("none")
+    assert tracing.get_exporter() is None
+
+
+def test_fallback_exporter_survives_reloads():
+    set_fallback_exporter(LogExporter)
+    try:
+        exporter = tracing.get_exporter()
+        assert isinstance(exporter, LogExporter)
+        configure_tracing("none")
+        assert tracing.get_exporter() is exporter
+    finally:
+        set_fallback_exporter(None)
+    configure_tracing("none")
+    assert tracing.get_exporter() is None
+
+
+def test_profiler_writes_snapshots(tmp_path):
+    profiler = Profiler(2, str(tmp_path))
+    while profiler.active:
+        with profiler.cycle():
+            sum(range(1000))
+
+    with profiler.cycle():
+        pass
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "cycle-1.heap",
+        "cycle-1.prof",
+        "cycle-2.heap",
+        "cycle-2.prof",
+    ]
+    pstats.Stats(str(tmp_path / "cycle-1.prof"))
+    tracemalloc.Snapshot.load(str(tmp_path / "cycle-2.heap"))
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,25 @@
+import threading
+import time
+import pytest
+from pyddns.config import Config
+from pyddns.watcher import ConfigWatcher
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_config_watcher_reloads_on_change(use_inotify):
+    config = Config(config_file="py_ddns.ini")
+    reloaded = threading.Event()
+    config.subscribe(lambda snapshot, changed: reloaded.set())
+
+    watcher = ConfigWatcher(
+        config, poll_interval=0.05, use_inotify=use_inotify
+    ).start()
+    try:
+        time.sleep(0.1)
+        with open("py_ddns.ini", "w") as f:
+            f.write("[Client_settings]\nlogging_level=info\n[Duckdns]\ntoken=a\n")
+        assert reloaded.wait(timeout=5), "Config was not reloaded!"
+    finally:
+        watcher.stop()
+
+    assert config.has_section("Duckdns")